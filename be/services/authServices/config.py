@@ -31,6 +31,13 @@ class Config:
     # Supabase
     SUPABASE_URL = os.getenv('SUPABASE_URL')
     SUPABASE_KEY = os.getenv('SUPABASE_KEY')
+    # Access tokens are verified locally (see shared/shared_auth/token_verifier.py)
+    SUPABASE_JWT_SECRET = os.getenv('SUPABASE_JWT_SECRET')
+    SUPABASE_JWT_AUDIENCE = os.getenv('SUPABASE_JWT_AUDIENCE', 'authenticated')
+    TOKEN_VERIFIER = os.getenv('TOKEN_VERIFIER', 'supabase')  # 'stub' for tests
+    TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+    TOKEN_CACHE_TTL_SECONDS = int(os.getenv('TOKEN_CACHE_TTL_SECONDS', 300))
+    JWKS_MIN_REFRESH_SECONDS = int(os.getenv('JWKS_MIN_REFRESH_SECONDS', 60))
     
     # Frontend URL for CORS
     FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:3000')
@@ -2,6 +2,7 @@ import os
 from flask import Flask, jsonify
 from config import config
 from extensions import db, jwt, bcrypt, cors, migrate, setup_logging, init_supabase
+from shared_auth.token_verifier import init_token_verifier
 
 def create_app(config_name='default'):
     app = Flask(__name__)
@@ -14,6 +15,7 @@ def create_app(config_name='default'):
     
     # Initialize extensions
     init_supabase(app)
+    init_token_verifier(app)
     db.init_app(app)
     jwt.init_app(app) # Still needed if we want to decode JWTs independently, or we can just verify via Supabase
     bcrypt.init_app(app)
@@ -6,6 +6,7 @@ from flask_jwt_extended import (
     unset_jwt_cookies
 )
 from supabase_auth.errors import AuthApiError
+from shared_auth.token_verifier import get_token_verifier
 import requests
 import os
 
@@ -177,6 +178,11 @@ def logout():
         supabase.auth.sign_out()
     except:
         pass # Ignore errors on logout
+
+    # Stop accepting the token here right away (other processes: until exp)
+    token = request.cookies.get('access_token_cookie')
+    if token:
+        get_token_verifier().revoke(token)
         
     response = jsonify({"message": "Logout successful"})
     # Clear cookies
@@ -232,9 +238,10 @@ def get_profile():
         return jsonify({"message": "Unauthorized"}), 401
         
     try:
-        res = supabase.auth.get_user(token)
-        user = res.user
-        
+        user = get_token_verifier().verify_user(token)
+        if not user:
+            return jsonify({"message": "Invalid token"}), 401
+
         return jsonify({
             "user": {
                 "id": user.id,
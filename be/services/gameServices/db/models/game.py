@@ -5,6 +5,19 @@ from sqlalchemy.dialects.postgresql import UUID
 
 class Game(db.Model):
     __tablename__ = 'games'
+    # Per-player lookups (active list, keyset-paged history). Partial so each
+    # index only holds the rows its query can match; one per player column
+    # because the routes query each column separately rather than OR them.
+    __table_args__ = (
+        db.Index('ix_games_player1_active', 'player1_id', 'started_at',
+                 postgresql_where=db.text("status = 'active'")),
+        db.Index('ix_games_player2_active', 'player2_id', 'started_at',
+                 postgresql_where=db.text("status = 'active'")),
+        db.Index('ix_games_player1_completed', 'player1_id', 'finished_at', 'id',
+                 postgresql_where=db.text("status = 'completed'")),
+        db.Index('ix_games_player2_completed', 'player2_id', 'finished_at', 'id',
+                 postgresql_where=db.text("status = 'completed'")),
+    )
 
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     player1_id = db.Column(UUID(as_uuid=True), nullable=False)
@@ -14,6 +27,8 @@ class Game(db.Model):
     
     # Store board state snapshot for persistence (optional, could just be final state)
     final_board_state = db.Column(db.JSON, nullable=True)
+    # Ordered moves, 7 bytes each (see state/move_log.py)
+    move_log = db.Column(db.LargeBinary, nullable=True)
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     started_at = db.Column(db.DateTime, nullable=True)
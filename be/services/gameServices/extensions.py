@@ -1,5 +1,20 @@
+import threading
+import redis
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from config import Config
 
 db = SQLAlchemy()
 migrate = Migrate()
+
+_event_bus = None
+_event_bus_lock = threading.Lock()
+
+def get_event_bus():
+    """Process-wide event bus client; publishers share its connection pool."""
+    global _event_bus
+    if _event_bus is None:
+        with _event_bus_lock:
+            if _event_bus is None:
+                _event_bus = redis.from_url(Config.EVENT_BUS_REDIS_URL)
+    return _event_bus
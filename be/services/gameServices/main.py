@@ -23,11 +23,25 @@ def create_app(config_class=Config):
     # Setup Logging
     logging.basicConfig(level=logging.INFO)
 
+    # Preload Lua scripts so moves only ever send EVALSHA. Scripts register
+    # at import, so import every module that has some before loading.
+    import timeout_manager  # noqa: F401
+    import persister  # noqa: F401
+    from state.redis_store import get_redis
+    from state.scripts import scripts
+    try:
+        scripts.load_all(get_redis())
+    except Exception as e:
+        # Not fatal: scripts are loaded on first NOSCRIPT instead
+        app.logger.warning(f"Failed to preload Lua scripts: {e}")
+
     # CORS configuration with credentials support
     # Required because frontend uses withCredentials: true
     from flask_cors import CORS
     frontend_url = os.getenv('FRONTEND_URL', 'http://localhost:4028')
-    CORS(app, resources={r"/*": {"origins": frontend_url}}, supports_credentials=True)
+    # X-Next-Cursor carries the keyset cursor for /games/recent paging
+    CORS(app, resources={r"/*": {"origins": frontend_url}}, supports_credentials=True,
+         expose_headers=['X-Next-Cursor'])
 
     return app
 
@@ -37,8 +51,13 @@ app = create_app()
 from timeout_manager import TimeoutManager
 timeout_manager = TimeoutManager(app)
 
+# Initialize write-behind persister for finished games
+from persister import GamePersister
+game_persister = GamePersister(app)
+
 if __name__ == '__main__':
-    # Start background thread
+    # Start background threads
     timeout_manager.start()
+    game_persister.start()
     
     app.run(host='0.0.0.0', port=Config.PORT)
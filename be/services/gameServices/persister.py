@@ -0,0 +1,243 @@
+import os
+import json
+import socket
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import redis
+from sqlalchemy import update
+
+from extensions import db, get_event_bus
+from db.models.game import Game
+from state import bitboard
+from state.redis_store import KEY_FINISHED, get_redis
+
+logger = logging.getLogger("GamePersister")
+
+GROUP = "persister"
+BATCH_SIZE = 200
+BLOCK_MS = 1000
+# Entries a consumer read but never acked (it crashed, or the DB write
+# failed) are taken over once they have been pending this long.
+RETRY_IDLE_MS = 30000
+# Set (on the event bus, in the same MULTI as the publishes) once a game's
+# follow-up events are out. Kept longer than an entry can sit pending.
+KEY_FOLLOWUPS_SENT = "games:followups_sent:{game_id}"
+FOLLOWUPS_SENT_TTL_SECONDS = 7 * 86400
+# Entries that cannot be parsed are moved here (with the error) and acked
+KEY_FINISHED_DEAD = "games:finished:dead"
+DEAD_STREAM_MAXLEN = 10000
+ERROR_BACKOFF_SECONDS = 0.5
+MAX_ERROR_BACKOFF_SECONDS = 30.0
+
+
+def parse_entry(fields):
+    """
+    A ``games:finished`` entry as the persister uses it. Raises (KeyError,
+    ValueError, ...) for an entry that can never be written.
+    """
+    game = {k.decode(): v for k, v in fields.items()}
+    game_id = str(uuid.UUID(game['game_id'].decode()))
+    winner_id = game['winner_id'].decode()
+    return {
+        'game_id': game_id,
+        'status': game['status'].decode(),
+        'reason': game['reason'].decode(),
+        'winner_id': str(uuid.UUID(winner_id)) if winner_id else None,
+        'player1_id': game['player1_id'].decode(),
+        'player2_id': game['player2_id'].decode() or None,
+        'finished_at': datetime.utcfromtimestamp(int(game['finished_at'])),
+        'x': bitboard.unpack(game['x']),
+        'o': bitboard.unpack(game['o']),
+        'moves': game.get('moves') or None,
+    }
+
+class GamePersister:
+    """
+    Write-behind for finished games.
+
+    The scripts that end a game append it to the ``games:finished`` stream;
+    this thread reads the stream through a consumer group (one consumer per
+    process, so replicas share the work), writes each batch to ``games``
+    (final board and move log included) with a single executemany UPDATE,
+    then sends the follow-up events (stats sync, dashboards) and acks.
+
+    Delivery is at-least-once, so every step is idempotent and tracked on its
+    own: a row that already has ``finished_at`` set is not written again, and
+    a game whose ``games:followups_sent`` marker exists does not get its
+    follow-up events again. The marker is set in the same MULTI/EXEC as the
+    publishes, so they happen together or not at all. Entries are acked only
+    once both steps are done; if either fails, the entry is redelivered and
+    whichever step is missing is retried.
+
+    An entry that cannot be parsed is moved to ``games:finished:dead`` and
+    acked, so it can't hold back the rest of its batch. Any other failure
+    (Redis or Postgres down) backs off before the next attempt.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.running = False
+        self.redis_client = get_redis()
+        self.event_bus = get_event_bus()
+        self.consumer = f"{socket.gethostname()}:{os.getpid()}"
+
+    def start(self):
+        self.running = True
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+        logger.info("GamePersister thread started.")
+
+    def _run(self):
+        try:
+            self.redis_client.xgroup_create(KEY_FINISHED, GROUP, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+        backoff = ERROR_BACKOFF_SECONDS
+        while self.running:
+            with self.app.app_context():
+                try:
+                    # Retry stale pending entries first, then read new ones.
+                    claimed = self.redis_client.xautoclaim(
+                        KEY_FINISHED, GROUP, self.consumer, min_idle_time=RETRY_IDLE_MS, count=BATCH_SIZE)
+                    entries = claimed[1]
+                    if not entries:
+                        resp = self.redis_client.xreadgroup(
+                            GROUP, self.consumer, {KEY_FINISHED: '>'}, count=BATCH_SIZE, block=BLOCK_MS)
+                        entries = resp[0][1] if resp else []
+                    if entries:
+                        self._persist(entries)
+                    backoff = ERROR_BACKOFF_SECONDS
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Error persisting finished games (retrying in {backoff}s): {e}")
+                    # Redis or Postgres is down: don't spin on it
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, MAX_ERROR_BACKOFF_SECONDS)
+
+    def _persist(self, entries):
+        finished = {}
+        entry_ids = []
+        dead = []
+        for entry_id, fields in entries:
+            if not fields:
+                entry_ids.append(entry_id)
+                continue  # Trimmed from the stream while pending
+            try:
+                game = parse_entry(fields)
+            except (KeyError, ValueError, TypeError, AttributeError) as e:
+                dead.append((entry_id, fields, e))
+                continue
+            entry_ids.append(entry_id)
+            finished[game['game_id']] = game
+        if dead:
+            # Entries that can never be written must not hold up the rest
+            self._dead_letter(dead)
+
+        if finished:
+            ids = [uuid.UUID(game_id) for game_id in finished]
+            already_persisted = {
+                str(game_id) for (game_id,) in
+                db.session.query(Game.id).filter(Game.id.in_(ids), Game.finished_at.isnot(None))
+            }
+            todo = {game_id: game for game_id, game in finished.items() if game_id not in already_persisted}
+
+            if todo:
+                rows = []
+                for game_id, game in todo.items():
+                    rows.append({
+                        'id': uuid.UUID(game_id),
+                        'status': game['status'],
+                        'finished_at': game['finished_at'],
+                        'final_board_state': bitboard.render(game['x'], game['o']),
+                        'winner_id': uuid.UUID(game['winner_id']) if game['winner_id'] else None,
+                        'move_log': game['moves'],
+                    })
+                # Bulk UPDATE by primary key: one executemany round trip.
+                db.session.execute(update(Game), rows)
+                db.session.commit()
+                logger.info(f"Persisted {len(rows)} finished games.")
+
+            # Follow-ups for every game that has not had them yet, including
+            # ones persisted by an earlier attempt whose publish failed.
+            game_ids = list(finished)
+            sent = self.event_bus.mget([KEY_FOLLOWUPS_SENT.format(game_id=g) for g in game_ids])
+            unsent = {g: finished[g] for g, marker in zip(game_ids, sent) if marker is None}
+            if unsent:
+                self._publish_followups(unsent)
+
+        if entry_ids:
+            self.redis_client.xack(KEY_FINISHED, GROUP, *entry_ids)
+
+    def _dead_letter(self, dead):
+        """Move unparseable entries to ``games:finished:dead`` and ack them, in one MULTI."""
+        pipe = self.redis_client.pipeline(transaction=True)
+        for entry_id, fields, error in dead:
+            logger.error(f"Dead-lettering finished-game entry {entry_id}: {error!r}")
+            pipe.xadd(KEY_FINISHED_DEAD, dict(fields, entry_id=entry_id, error=repr(error)),
+                      maxlen=DEAD_STREAM_MAXLEN, approximate=True)
+        pipe.xack(KEY_FINISHED, GROUP, *[entry_id for entry_id, _, _ in dead])
+        pipe.execute()
+
+    def _publish_followups(self, games):
+        pipe = self.event_bus.pipeline(transaction=True)
+        for game_id, game in games.items():
+            pipe.set(KEY_FOLLOWUPS_SENT.format(game_id=game_id), 1, ex=FOLLOWUPS_SENT_TTL_SECONDS)
+            # Timeouts and abandonment have never fed stats or dashboards.
+            if game['reason'] != 'move':
+                continue
+            player1_id = game['player1_id']
+            player2_id = game['player2_id']
+            winner_id = game['winner_id']
+
+            # Update User Stats (ELO, Wins, Losses)
+            player1_outcome = 'draw'
+            player2_outcome = 'draw'
+            player1_elo_change = 0
+            player2_elo_change = 0
+
+            if winner_id:
+                if player1_id == winner_id:
+                    player1_outcome = 'win'
+                    player2_outcome = 'loss'
+                    player1_elo_change = 15
+                    player2_elo_change = -10
+                else:
+                    player1_outcome = 'loss'
+                    player2_outcome = 'win'
+                    player1_elo_change = -10
+                    player2_elo_change = 15
+
+            # Domain Event for Stats Sync
+            domain_event = {
+                'event_type': 'GAME_COMPLETED',
+                'payload': {
+                    'game_id': game_id,
+                    'finished_at': game['finished_at'].isoformat(),
+                    'player1_id': player1_id,
+                    'player1_outcome': player1_outcome,
+                    'player1_elo_change': player1_elo_change,
+                    'player2_id': player2_id,
+                    'player2_outcome': player2_outcome,
+                    'player2_elo_change': player2_elo_change
+                }
+            }
+            pipe.publish('domain_events', json.dumps(domain_event))
+
+            # Notify both users to update their dashboard
+            for user_id in (player1_id, player2_id):
+                if user_id:
+                    message = {
+                        'event': 'dashboard_update',
+                        'data': {'type': 'game_ended', 'game_id': game_id},
+                        'room': user_id,
+                        'published_at': time.time(),
+                    }
+                    pipe.publish('game_updates', json.dumps(message))
+        pipe.execute()
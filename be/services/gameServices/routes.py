@@ -1,19 +1,31 @@
 from flask import Blueprint, request, jsonify, current_app
-from extensions import db
+from extensions import db, get_event_bus
 from db.models.game import Game
-from state.redis_store import create_game, get_state, apply_move
-import redis
+from sqlalchemy import any_, bindparam, insert, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+from state.redis_store import (
+    create_game, create_games, get_state, get_fields, get_fields_many, get_moves, apply_move,
+    active_games_for_user, STATE_FIELDS,
+)
+from state import move_log
 import json
+import time
 import uuid
 from datetime import datetime
 
 game_bp = Blueprint('games', __name__)
 
-def get_redis_client():
-    return redis.from_url(current_app.config['REDIS_URL'])
+MAX_MOVES_PAGE = 200
+MAX_BATCH_GAMES = 200
+MAX_RECENT_PAGE = 100
+MAX_RECENT_OFFSET = 100  # ?offset= is deprecated; deeper pages must use the cursor
+MAX_BULK_GAMES = 500
+# Bulk game ids are uuid5(BULK_KEY_NAMESPACE, key) for requests that send a key
+BULK_KEY_NAMESPACE = uuid.UUID('5b0e3c1e-7f4a-4d1c-9a59-2f7c0e6d8b41')
 
 def get_event_bus_client():
-    return redis.from_url(current_app.config['EVENT_BUS_REDIS_URL'])
+    return get_event_bus()
 
 def publish_game_update(game_id, event_type, data):
     """
@@ -24,7 +36,8 @@ def publish_game_update(game_id, event_type, data):
         message = {
             'event': event_type,
             'data': data,
-            'room': f"game_{game_id}"
+            'room': f"game_{game_id}",
+            'published_at': time.time(),
         }
         r.publish('game_updates', json.dumps(message))
     except Exception as e:
@@ -40,13 +53,35 @@ def publish_user_update(user_id, event_type, data):
         message = {
             'event': event_type,
             'data': data,
-            'room': str(user_id)  # Publish to user's personal room
+            'room': str(user_id),  # Publish to user's personal room
+            'published_at': time.time(),
         }
         # Publish to 'game_updates' channel which Gateway listens to
         r.publish('game_updates', json.dumps(message))
     except Exception as e:
         current_app.logger.error(f"Failed to publish user update: {e}")
 
+def move_delta(game_id, user_id, position, state):
+    """
+    game_update payload for one move: what changed, not the whole state.
+    Clients apply it in move_seq order and ask the gateway for a 'resync'
+    (full state) if they see a gap.
+    """
+    delta = {
+        'game_id': game_id,
+        'position': int(position),
+        'symbol': 'X' if user_id == state['player1_id'] else 'O',
+        'move_seq': state['move_seq'],
+        'current_player_id': state['current_player_id'],
+        'p1_time': state['p1_time'],
+        'p2_time': state['p2_time'],
+    }
+    if state['status'] != 'active':
+        delta['status'] = state['status']
+        delta['winner_id'] = state['winner_id']
+        delta['winning_line'] = state['winning_line']
+    return delta
+
 @game_bp.route('/games', methods=['POST'])
 def create_new_game():
     data = request.json
@@ -69,7 +104,7 @@ def create_new_game():
     
     # 2. Initialize Redis State
     game_id = str(new_game.id)
-    redis_state = create_game(game_id, player1_id, player2_id, settings)
+    redis_state = create_game(game_id, player1_id, player2_id, settings, include_board=True)
     
     # 3. Notify
     if player2_id:
@@ -81,10 +116,114 @@ def create_new_game():
 
     return jsonify(new_game.to_dict()), 201
 
+@game_bp.route('/games/bulk', methods=['POST'])
+def create_games_bulk():
+    """
+    Create many games in one call (the matcher sends a tick's worth of
+    pairs): {"games": [{"player1_id", "player2_id", "settings", "key"}, ...]}.
+    One multi-row INSERT, one Redis pipeline for the states and one for the
+    notifications. Games come back in request order, each with its key.
+
+    ``key`` (optional) makes a game idempotent: its id is derived from the
+    key, so a retried request (say after a timeout whose first attempt did
+    commit) gets back the games already created instead of new ones. Those
+    are not started or announced again.
+    """
+    data = request.json or {}
+    specs = data.get('games')
+    if not isinstance(specs, list) or not specs:
+        return jsonify({'error': 'games must be a non-empty list'}), 400
+    if len(specs) > MAX_BULK_GAMES:
+        return jsonify({'error': f'At most {MAX_BULK_GAMES} games per request'}), 400
+
+    now = datetime.utcnow()
+    rows = []
+    try:
+        for spec in specs:
+            player2_id = spec.get('player2_id')
+            key = spec.get('key')
+            rows.append({
+                'id': uuid.uuid5(BULK_KEY_NAMESPACE, str(key)) if key else uuid.uuid4(),
+                'player1_id': uuid.UUID(spec['player1_id']),
+                'player2_id': uuid.UUID(player2_id) if player2_id else None,
+                'status': 'active' if player2_id else 'waiting',
+                'created_at': now,
+                'started_at': now if player2_id else None,
+            })
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return jsonify({'error': 'Each game needs a valid player1_id (and optional player2_id)'}), 400
+
+    # 1. DB Records (one INSERT, ids generated here so nothing to read back).
+    # Keyed games that an earlier attempt already inserted are left alone.
+    keyed = [row['id'] for row, spec in zip(rows, specs) if spec.get('key')]
+    existing = {}
+    if keyed:
+        existing = {game.id: game for game in Game.query.filter(Game.id.in_(keyed))}
+    new_rows = [row for row in rows if row['id'] not in existing]
+    try:
+        if new_rows:
+            db.session.execute(insert(Game), new_rows)
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent attempt with the same keys got there first; a retry
+        # returns its games
+        db.session.rollback()
+        return jsonify({'error': 'Games with these keys are being created, retry'}), 409
+
+    # An earlier attempt may have committed and then failed before the
+    # Redis states: start those games now
+    started = {row['id'] for row in new_rows}
+    if existing:
+        states = get_fields_many([str(game_id) for game_id in existing], ['status'])
+        started.update(game_id for game_id, game in existing.items()
+                       if game.status == 'active' and states[str(game_id)] is None)
+    to_start = [(row, spec) for row, spec in zip(rows, specs) if row['id'] in started]
+
+    # 2. Redis States
+    states = create_games([
+        (str(row['id']), spec['player1_id'], spec.get('player2_id'), spec.get('settings', {}))
+        for row, spec in to_start
+    ], include_board=True) if to_start else []
+
+    # 3. Notify (same events as POST /games, one pipeline)
+    try:
+        pipe = get_event_bus_client().pipeline(transaction=False)
+        for (row, spec), state in zip(to_start, states):
+            if not spec.get('player2_id'):
+                continue
+            game_id = str(row['id'])
+            pipe.publish('game_updates', json.dumps({'event': 'game_start', 'data': state, 'room': f"game_{game_id}",
+                                                       'published_at': time.time()}))
+            for user_id in (spec['player1_id'], spec['player2_id']):
+                pipe.publish('game_updates', json.dumps({
+                    'event': 'dashboard_update',
+                    'data': {'type': 'game_started', 'game_id': game_id},
+                    'room': str(user_id),
+                    'published_at': time.time(),
+                }))
+        pipe.execute()
+    except Exception as e:
+        current_app.logger.error(f"Failed to publish bulk game updates: {e}")
+
+    games = []
+    for row, spec in zip(rows, specs):
+        game = existing[row['id']].to_dict() if row['id'] in existing else Game(**row).to_dict()
+        game['key'] = spec.get('key')
+        games.append(game)
+    return jsonify({'games': games}), 201
+
 @game_bp.route('/games/<game_id>', methods=['GET'])
 def get_game_state(game_id):
-    # Try Redis first
-    state = get_state(game_id)
+    # Optional ?fields=status,updated_at to read just those hash fields
+    fields = request.args.get('fields')
+    if fields:
+        names = [f for f in fields.split(',') if f in STATE_FIELDS or f == 'board']
+        if not names:
+            return jsonify({'error': 'No valid fields requested'}), 400
+        state = get_fields(game_id, names)
+    else:
+        # Try Redis first
+        state = get_state(game_id, include_board=True)
     if state:
         return jsonify(state)
     
@@ -94,6 +233,72 @@ def get_game_state(game_id):
         return jsonify({'error': 'Game not found'}), 404
     return jsonify(game.to_dict()) # DB only has metadata, not board if not finished
 
+def _id_in(ids):
+    # `id = ANY(:ids)` binds one array whatever the count, so Postgres keeps
+    # one plan; other dialects (sqlite in the tests) get a plain IN.
+    if db.engine.dialect.name == 'postgresql':
+        return Game.id == any_(bindparam('ids', ids, type_=ARRAY(UUID(as_uuid=True))))
+    return Game.id.in_(ids)
+
+@game_bp.route('/games/batch', methods=['POST'])
+def get_game_states_batch():
+    """
+    State for many games in one call: {"game_ids": [...]} ->
+    {"games": {id: state}, "missing": [...]}. Live games come from one Redis
+    pipeline, the rest from a single `id = ANY(:ids)` query.
+    """
+    data = request.json or {}
+    game_ids = data.get('game_ids')
+    if not isinstance(game_ids, list) or not game_ids:
+        return jsonify({'error': 'game_ids list required'}), 400
+    if len(game_ids) > MAX_BATCH_GAMES:
+        return jsonify({'error': f'At most {MAX_BATCH_GAMES} game_ids per request'}), 400
+    try:
+        uuids = {game_id: uuid.UUID(game_id) for game_id in dict.fromkeys(game_ids)}
+    except (ValueError, TypeError, AttributeError):
+        return jsonify({'error': 'Invalid game_id'}), 400
+
+    games = {
+        game_id: state
+        for game_id, state in get_fields_many(uuids, STATE_FIELDS + ('board',)).items()
+        if state
+    }
+
+    misses = [uid for game_id, uid in uuids.items() if game_id not in games]
+    if misses:
+        rows = Game.query.filter(_id_in(misses)).all()
+        for game in rows:
+            games[str(game.id)] = game.to_dict()
+
+    return jsonify({
+        'games': games,
+        'missing': [game_id for game_id in uuids if game_id not in games],
+    })
+
+@game_bp.route('/games/<game_id>/moves', methods=['GET'])
+def get_game_moves(game_id):
+    # Page with ?after=<move_seq>&limit=<n>; pass next_after back to continue
+    after = max(request.args.get('after', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), MAX_MOVES_PAGE)
+
+    # Live (or recently finished) games: the Redis move log
+    moves = get_moves(game_id, after, limit)
+    if moves is None:
+        # Older games: the log persisted with the final board
+        try:
+            game = Game.query.get(uuid.UUID(game_id))
+        except ValueError:
+            return jsonify({'error': 'Invalid game_id'}), 400
+        if not game:
+            return jsonify({'error': 'Game not found'}), 404
+        moves = move_log.decode(game.move_log or b'', after, limit)
+
+    return jsonify({
+        'game_id': game_id,
+        'moves': moves,
+        'next_after': moves[-1]['seq'] if len(moves) == limit else None,
+    })
+
 @game_bp.route('/games/<game_id>/move', methods=['POST'])
 def make_move(game_id):
     data = request.json
@@ -104,103 +309,103 @@ def make_move(game_id):
         return jsonify({'error': 'user_id and position required'}), 400
 
     # Apply move in Redis
-    result = apply_move(game_id, user_id, position)
+    result = apply_move(game_id, user_id, position, include_board=True)
     
     if not result['success']:
         return jsonify({'error': result['error']}), 400
     
     new_state = result['state']
     
-    # Publish update
-    publish_game_update(game_id, 'game_update', new_state)
+    # Publish update (delta only; full state goes out on resync)
+    publish_game_update(game_id, 'game_update', move_delta(game_id, user_id, position, new_state))
     
-    # Handle Game Over
+    # Handle Game Over. The move script queued the game for the persister,
+    # which writes the DB row and sends the stats/dashboard events; only the
+    # realtime notification goes out here.
     if new_state.get('status') == 'completed':
-        # Update DB
-        game = Game.query.get(game_id)
-        if game:
-            game.status = 'completed'
-            game.finished_at = datetime.utcnow()
-            game.final_board_state = new_state.get('board')
-            winner_id = new_state.get('winner_id')
-            if winner_id:
-                game.winner_id = uuid.UUID(winner_id)
-            db.session.commit()
-            
-            publish_game_update(game_id, 'game_over', new_state)
-            
-            # Update User Stats (ELO, Wins, Losses)
-            player1_outcome = 'draw'
-            player2_outcome = 'draw'
-            player1_elo_change = 0
-            player2_elo_change = 0
-            
-            if winner_id:
-                if str(game.player1_id) == winner_id:
-                    player1_outcome = 'win'
-                    player2_outcome = 'loss'
-                    player1_elo_change = 15
-                    player2_elo_change = -10
-                else:
-                    player1_outcome = 'loss'
-                    player2_outcome = 'win'
-                    player1_elo_change = -10
-                    player2_elo_change = 15
-            
-            # Publish Domain Event for Stats Sync
-            try:
-                r = get_event_bus_client()
-                domain_event = {
-                    'event_type': 'GAME_COMPLETED',
-                    'payload': {
-                        'game_id': game_id,
-                        'finished_at': game.finished_at.isoformat(),
-                        'player1_id': str(game.player1_id),
-                        'player1_outcome': player1_outcome,
-                        'player1_elo_change': player1_elo_change,
-                        'player2_id': str(game.player2_id) if game.player2_id else None,
-                        'player2_outcome': player2_outcome,
-                        'player2_elo_change': player2_elo_change
-                    }
-                }
-                r.publish('domain_events', json.dumps(domain_event))
-                current_app.logger.info(f"Published GAME_COMPLETED event for {game_id}")
-            except Exception as e:
-                current_app.logger.error(f"Failed to publish domain event: {e}")
-
-            # Notify both users to update their dashboard
-            publish_user_update(str(game.player1_id), 'dashboard_update', {'type': 'game_ended', 'game_id': game_id})
-            if game.player2_id:
-                publish_user_update(str(game.player2_id), 'dashboard_update', {'type': 'game_ended', 'game_id': game_id})
+        publish_game_update(game_id, 'game_over', new_state)
 
     return jsonify(new_state)
 
 
 
 
+def _player_games(uid, status, order_by, limit=None, before=None):
+    """
+    Games in ``status`` that ``uid`` plays in, newest first by ``order_by``.
+    Reads games.status, which the persister writes behind Redis: a game
+    shows up as completed here once its row is written (about a batch
+    after it ends). Active games come from Redis instead.
+
+    One query per player column instead of ``player1_id = uid OR
+    player2_id = uid``, so each is a range scan of that column's partial
+    index (see db/models/game.py); the two sorted runs are merged here.
+    ``before`` is an ``order_by`` tuple to resume after (keyset paging).
+    """
+    games = {}
+    for column in (Game.player1_id, Game.player2_id):
+        query = Game.query.filter(column == uid, Game.status == status)
+        if before:
+            query = query.filter(tuple_(*order_by) < tuple_(*before))
+        query = query.order_by(*[c.desc() for c in order_by])
+        if limit:
+            query = query.limit(limit)
+        for game in query:
+            games[game.id] = game
+    ordered = sorted(
+        games.values(),
+        key=lambda g: tuple(getattr(g, c.key) or datetime.min for c in order_by),
+        reverse=True,
+    )
+    return ordered[:limit] if limit else ordered
+
 @game_bp.route('/games/active/<user_id>', methods=['GET'])
 def get_active_games(user_id):
+    # Which games are active comes from Redis: games.status is written
+    # behind by the persister, so a game that just ended can still read
+    # 'active' there. The rows only supply the rest of each game.
     try:
-        uid = uuid.UUID(user_id)
-        games = Game.query.filter(
-            ((Game.player1_id == uid) | (Game.player2_id == uid)),
-            Game.status == 'active'
-        ).order_by(Game.started_at.desc()).all()
-        return jsonify([g.to_dict() for g in games]), 200
+        uuid.UUID(user_id)
     except ValueError:
         return jsonify({'error': 'Invalid user_id'}), 400
+    game_ids = [uuid.UUID(game_id) for game_id in active_games_for_user(user_id)]
+    if not game_ids:
+        return jsonify([]), 200
+    games = Game.query.filter(Game.id.in_(game_ids)).all()
+    games.sort(key=lambda g: g.started_at or datetime.min, reverse=True)
+    return jsonify([dict(g.to_dict(), status='active') for g in games]), 200
+
+@game_bp.route('/games/active/<user_id>/exists', methods=['GET'])
+def has_active_game(user_id):
+    # Cheap pre-check for matchmaking: Redis set lookup, no SQL
+    game_ids = active_games_for_user(user_id)
+    return jsonify({'active': bool(game_ids), 'game_ids': game_ids}), 200
 
 @game_bp.route('/games/recent/<user_id>', methods=['GET'])
 def get_recent_games(user_id):
+    # Keyset paging: pass the X-Next-Cursor header of a page back as
+    # ?before=<finished_at>,<id>. ?offset= is deprecated: it fetches
+    # offset + limit rows per player column, so it is capped.
     try:
         uid = uuid.UUID(user_id)
-        limit = request.args.get('limit', 5, type=int)
-        offset = request.args.get('offset', 0, type=int)
-        
-        games = Game.query.filter(
-            ((Game.player1_id == uid) | (Game.player2_id == uid)),
-            Game.status == 'completed'
-        ).order_by(Game.finished_at.desc()).offset(offset).limit(limit).all()
-        return jsonify([g.to_dict() for g in games]), 200
+        limit = min(max(request.args.get('limit', 5, type=int), 1), MAX_RECENT_PAGE)
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        before = request.args.get('before')
+        if before:
+            finished_at, game_id = before.rsplit(',', 1)
+            before = (datetime.fromisoformat(finished_at), uuid.UUID(game_id))
+            offset = 0
+        elif offset > MAX_RECENT_OFFSET:
+            return jsonify({'error': f'offset is limited to {MAX_RECENT_OFFSET}; page with ?before=<X-Next-Cursor>'}), 400
+
+        order_by = (Game.finished_at, Game.id)
+        games = _player_games(uid, 'completed', order_by, limit=offset + limit, before=before)[offset:]
+        response = jsonify([g.to_dict() for g in games])
+        if len(games) == limit:
+            last = games[-1]
+            response.headers['X-Next-Cursor'] = f"{last.finished_at.isoformat()},{last.id}"
+        if offset:
+            response.headers['Deprecation'] = 'true'
+        return response, 200
     except ValueError:
-        return jsonify({'error': 'Invalid user_id'}), 400
+        return jsonify({'error': 'Invalid user_id or cursor'}), 400
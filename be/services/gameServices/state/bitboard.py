@@ -0,0 +1,126 @@
+"""
+Bitboard engine for the 13x13 five-in-a-row board.
+
+Each player's stones live in one occupancy bitmap. The board is stored row by
+row, one 16-bit big-endian word per row (bit ``c`` of a word is column ``c``),
+so a packed bitmap is 26 bytes. The three spare bits at the top of every word
+act as padding: when the bytes are read as one big integer, shifting by
+1 (horizontal), 16 (vertical), 15 and 17 (diagonals) never wraps a run from
+one row into the next.
+
+The Lua move script in ``redis_store.py`` uses exactly the same layout, so a
+bitmap written by Redis can be read here and vice versa.
+"""
+from __future__ import annotations
+
+from typing import Iterable, List, Optional, Tuple
+
+BOARD_SIZE = 13
+WIN_LENGTH = 5
+CELL_COUNT = BOARD_SIZE * BOARD_SIZE
+
+ROW_BITS = 16
+ROW_BYTES = ROW_BITS // 8
+PACKED_SIZE = BOARD_SIZE * ROW_BYTES
+EMPTY = bytes(PACKED_SIZE)
+
+# Shift per direction in the padded integer layout.
+HORIZONTAL = 1
+VERTICAL = ROW_BITS
+DIAGONAL_DOWN = ROW_BITS - 1   # (r, c) -> (r + 1, c + 1)
+DIAGONAL_UP = ROW_BITS + 1     # (r, c) -> (r + 1, c - 1)
+DIRECTIONS = (HORIZONTAL, VERTICAL, DIAGONAL_DOWN, DIAGONAL_UP)
+
+# Row/column steps matching DIRECTIONS, used to walk a winning line.
+_STEPS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+
+def bit_index(pos: int) -> int:
+    """Bit number of board position ``pos`` in the unpacked integer."""
+    row, col = divmod(pos, BOARD_SIZE)
+    return (BOARD_SIZE - 1 - row) * ROW_BITS + col
+
+
+def cell_mask(pos: int) -> int:
+    return 1 << bit_index(pos)
+
+
+def unpack(data: Optional[bytes]) -> int:
+    """Packed bytes -> bitmap integer. Missing or empty data is an empty board."""
+    if not data:
+        return 0
+    return int.from_bytes(data, "big")
+
+
+def pack(bits: int) -> bytes:
+    return bits.to_bytes(PACKED_SIZE, "big")
+
+
+def is_set(bits: int, pos: int) -> bool:
+    return bool(bits & cell_mask(pos))
+
+
+def place(bits: int, pos: int) -> int:
+    return bits | cell_mask(pos)
+
+
+def count(bits: int) -> int:
+    return bin(bits).count("1")
+
+
+def has_five(bits: int) -> bool:
+    """True if the bitmap contains WIN_LENGTH stones in a row in any direction."""
+    for shift in DIRECTIONS:
+        run = bits
+        for _ in range(WIN_LENGTH - 1):
+            run &= run >> shift
+        if run:
+            return True
+    return False
+
+
+def winning_line(bits: int, pos: int) -> Optional[List[int]]:
+    """
+    Positions of the run through ``pos`` that wins the game, or None.
+
+    Ordering follows the original move script: the played cell, then the
+    forward direction, then the backward direction.
+    """
+    row, col = divmod(pos, BOARD_SIZE)
+    for dr, dc in _STEPS:
+        line = [pos]
+        for sign in (1, -1):
+            for i in range(1, WIN_LENGTH):
+                r, c = row + sign * dr * i, col + sign * dc * i
+                if not (0 <= r < BOARD_SIZE and 0 <= c < BOARD_SIZE):
+                    break
+                p = r * BOARD_SIZE + c
+                if not is_set(bits, p):
+                    break
+                line.append(p)
+        if len(line) >= WIN_LENGTH:
+            return line
+    return None
+
+
+def render(x_bits: int, o_bits: int) -> List[Optional[str]]:
+    """Build the client-facing list of ``"X"``/``"O"``/``None`` cells."""
+    board: List[Optional[str]] = [None] * CELL_COUNT
+    for pos in range(CELL_COUNT):
+        mask = cell_mask(pos)
+        if x_bits & mask:
+            board[pos] = "X"
+        elif o_bits & mask:
+            board[pos] = "O"
+    return board
+
+
+def from_board(board: Iterable[Optional[str]]) -> Tuple[int, int]:
+    """Convert a legacy JSON ``board`` list into ``(x_bits, o_bits)``."""
+    x_bits = o_bits = 0
+    for pos, cell in enumerate(board):
+        if cell == "X":
+            x_bits = place(x_bits, pos)
+        elif cell == "O":
+            o_bits = place(o_bits, pos)
+    return x_bits, o_bits
@@ -0,0 +1,28 @@
+"""
+Shard ownership for the timeout manager across game-service replicas.
+
+Every replica heartbeats into the ``timeout:members`` sorted set and holds a
+lease, ``timeout:lease:{shard}``, on each deadline shard it works, aiming for
+ceil(shards / live members) of them. The lease logic is shared with the
+matchmaking workers (``shared_leases``, be/services/shared).
+"""
+from __future__ import annotations
+
+import os
+
+from shared_leases.leases import Leases
+
+from state.redis_store import DEADLINE_SHARDS, get_redis
+
+KEY_MEMBERS = "timeout:members"
+KEY_LEASE = "timeout:lease:{shard}"
+LEASE_TTL_MS = int(os.getenv("TIMEOUT_LEASE_TTL_MS", "10000"))
+
+
+class ShardLeases(Leases):
+    def __init__(self, shards: int = DEADLINE_SHARDS, ttl_ms: int = LEASE_TTL_MS):
+        self.shards = shards
+        super().__init__(
+            get_redis(), KEY_MEMBERS, lambda shard: KEY_LEASE.format(shard=shard),
+            items=lambda: range(shards), ttl_ms=ttl_ms, name="timeout shard",
+        )
@@ -0,0 +1,60 @@
+"""
+Compact encoding for a game's move history.
+
+Each move is 7 bytes: the board position (one byte, 0-168) followed by the
+server time it was applied, in milliseconds since the epoch, as a 6-byte
+big-endian integer. The move script writes one record per entry of the
+``game:{id}:events`` stream (entry id ``<move_seq>-0``), and the persister
+stores the concatenated records in ``games.move_log``.
+
+Player 1 (X) always moves first, so the symbol of a move follows from its
+sequence number and is not stored.
+
+A log normally starts at move 1. Games migrated from the old state layout
+mid-play have no records for the moves made before the migration; their
+log starts with a 3-byte header, 0xFF and the first move's sequence number
+(2 bytes, big-endian). No record starts with 0xFF (positions are 0-168).
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Tuple
+
+RECORD_SIZE = 7
+HEADER_MARK = 0xFF
+HEADER_SIZE = 3
+
+
+def encode(position: int, ts_ms: int) -> bytes:
+    return bytes((position,)) + ts_ms.to_bytes(6, "big")
+
+
+def decode_record(record: bytes, seq: int) -> Dict[str, object]:
+    return {
+        "seq": seq,
+        "position": record[0],
+        "symbol": "X" if seq % 2 else "O",
+        "ts": int.from_bytes(record[1:RECORD_SIZE], "big"),
+    }
+
+
+def header(first_seq: int) -> bytes:
+    return bytes((HEADER_MARK,)) + first_seq.to_bytes(2, "big")
+
+
+def split(blob: bytes) -> Tuple[int, bytes]:
+    """(sequence number of the first record, the records) of a log."""
+    if blob[:1] == bytes((HEADER_MARK,)):
+        return int.from_bytes(blob[1:HEADER_SIZE], "big"), blob[HEADER_SIZE:]
+    return 1, blob
+
+
+def decode(blob: bytes, after: int = 0, limit: int = None) -> List[Dict[str, object]]:
+    """Moves ``after + 1`` onwards (at most ``limit``) from a concatenated log."""
+    first_seq, records = split(blob)
+    total = len(records) // RECORD_SIZE
+    start = max(after + 1 - first_seq, 0)
+    end = total if limit is None else min(total, start + limit)
+    return [
+        decode_record(records[i * RECORD_SIZE:(i + 1) * RECORD_SIZE], first_seq + i)
+        for i in range(start, end)
+    ]
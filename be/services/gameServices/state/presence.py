@@ -0,0 +1,48 @@
+"""
+Read side of the WebSocket Gateway's presence (websocketGateway/presence.py),
+which lives on the event bus Redis: per-bucket sorted sets of online users
+scored by expiry. PRESENCE_BUCKETS must match the gateway's.
+"""
+from __future__ import annotations
+
+import os
+import time
+import zlib
+from typing import Dict, List
+
+import redis
+
+PRESENCE_BUCKETS = int(os.getenv("PRESENCE_BUCKETS", "64"))
+KEY_PRESENCE = "presence:{bucket}"
+# Gateways from before the bucketed presence kept one set, which nothing
+# maintains any more: members never leave it. It is only consulted until
+# PRESENCE_LEGACY_UNTIL (epoch seconds; unset = never), so a rolling deploy
+# from the old gateway can set a window of a few minutes and not see
+# everyone as offline meanwhile. Drop with the next presence change.
+KEY_LEGACY_ONLINE = "online_users"
+PRESENCE_LEGACY_UNTIL = float(os.getenv("PRESENCE_LEGACY_UNTIL", "0"))
+
+
+def _presence_key(user_id: str) -> str:
+    return KEY_PRESENCE.format(bucket=zlib.crc32(str(user_id).encode()) % PRESENCE_BUCKETS)
+
+
+def online(r: redis.Redis, user_ids: List[str], legacy_until: float = None) -> Dict[str, bool]:
+    """Which of ``user_ids`` are online: one pipeline for the lot."""
+    if not user_ids:
+        return {}
+    now = time.time()
+    now_ms = int(now * 1000)
+    legacy_until = PRESENCE_LEGACY_UNTIL if legacy_until is None else legacy_until
+    pipe = r.pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.zscore(_presence_key(user_id), user_id)
+    if now < legacy_until:
+        pipe.smismember(KEY_LEGACY_ONLINE, user_ids)
+        *scores, legacy = pipe.execute()
+    else:
+        scores, legacy = pipe.execute(), [0] * len(user_ids)
+    return {
+        user_id: (score is not None and score > now_ms) or bool(was_online)
+        for user_id, score, was_online in zip(user_ids, scores, legacy)
+    }
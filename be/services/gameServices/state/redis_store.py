@@ -3,213 +3,762 @@ Redis-backed game state store for TicTacToe.
 
 Avoids writing to SQL on every move by keeping active games in Redis.
 Persist to SQL periodically and at end-of-game.
+
+``game:{id}:state`` is a hash with one field per piece of state, so readers
+can HMGET just what they need and the move script updates fields in place.
+The board is two packed occupancy bitmaps (``x`` and ``o`` fields, see
+``state/bitboard.py``); the ``board`` list clients know is only rendered when
+a caller asks for it.
+
+Older games may still be stored as a JSON string. Such keys are converted
+to the hash layout the first time they are read or moved on.
+
+``games:deadlines:{shard}`` are sorted sets of active game ids scored by the
+epoch second at which the player to move runs out of time, split into
+DEADLINE_SHARDS shards by crc32(game_id) so timeout replicas can divide the
+work. They are written in the same step as the state (create, move script,
+finish), so the timeout manager only ever looks at games about to expire.
+
+``game:{id}:events`` is the game's move log: a stream with one entry per
+move, id ``<move_seq>-0``, holding the compact record from
+``state/move_log.py``. Games migrated from the JSON layout mid-play have no
+entries for their earlier moves, so their stream starts after 1-0; the log
+persisted for them records where it starts.
+
+``user:{user_id}:active_games`` holds the ids of the active games a user plays
+in, so "is this user in a game?" is a set lookup rather than a SQL query.
+Entries are added when a game starts and removed when it ends; readers drop
+any that turn out to be stale.
+
+Every game that ends (winning/drawing move, timeout, abandonment) is appended
+to the ``games:finished`` stream by the same script that ends it. The
+persister (``persister.py``) drains that stream into Postgres, so nothing on
+the move path waits on the database.
 """
 from __future__ import annotations
 
 import json
 import os
+import threading
 import time
-from typing import Any, Dict, Optional, Tuple
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 import redis
 
+from state import bitboard, move_log
+from state.scripts import scripts
+
 # Configuration
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6382/0")
 KEY_STATE = "game:{game_id}:state"
 KEY_EVENTS = "game:{game_id}:events"
+KEY_DEADLINES = "games:deadlines:{shard}"
+KEY_FINISHED = "games:finished"
+KEY_USER_ACTIVE = "user:{user_id}:active_games"
+FINISHED_STREAM_MAXLEN = int(os.getenv("FINISHED_STREAM_MAXLEN", "100000"))
+# Must be the same on every replica; changing it needs the index rebuilt.
+DEADLINE_SHARDS = int(os.getenv("DEADLINE_SHARDS", "16"))
 GAME_TTL_SECONDS = int(os.getenv("GAME_TTL_SECONDS", "86400"))  # 24h
+# A player loses on time when their clock runs out or a single move takes
+# longer than MOVE_TIME_LIMIT_SECONDS, whichever comes first. The grace
+# covers client/network latency.
+MOVE_TIME_LIMIT_SECONDS = int(os.getenv("MOVE_TIME_LIMIT_SECONDS", "30"))
+TIMEOUT_GRACE_SECONDS = int(os.getenv("TIMEOUT_GRACE_SECONDS", "5"))
+
+BOARD_SIZE = bitboard.BOARD_SIZE
+WIN_CONDITION = bitboard.WIN_LENGTH
 
-BOARD_SIZE = 13
-WIN_CONDITION = 5
+# Public state fields, in the order they are returned to clients.
+STATE_FIELDS = (
+    "player1_id", "player2_id", "current_player_id", "status",
+    "winner_id", "winning_line", "move_seq", "settings",
+    "p1_time", "p2_time", "last_move_time",
+    "created_at", "started_at", "updated_at",
+)
+BOARD_FIELDS = ("x", "o")
+_INT_FIELDS = frozenset((
+    "move_seq", "p1_time", "p2_time", "last_move_time",
+    "created_at", "started_at", "updated_at",
+    "timer_initial", "timer_increment",
+))
+
+_redis: Optional[redis.Redis] = None
+_redis_lock = threading.Lock()
 
 def get_redis() -> redis.Redis:
-    return redis.from_url(REDIS_URL, decode_responses=True)
+    """Process-wide client; every caller shares its connection pool."""
+    global _redis
+    if _redis is None:
+        with _redis_lock:
+            if _redis is None:
+                # Responses stay as bytes: board bitmaps are binary and must not be decoded.
+                _redis = redis.from_url(REDIS_URL)
+    return _redis
 
 
 def _key(fmt: str, game_id: str) -> str:
     return fmt.format(game_id=game_id)
 
 
-def _new_board() -> list:
-    return [None] * (BOARD_SIZE * BOARD_SIZE)
+def deadline_shard(game_id: str) -> int:
+    return zlib.crc32(game_id.encode()) % DEADLINE_SHARDS
 
 
-def create_game(game_id: str, player1_id: str, player2_id: Optional[str], settings: Dict[str, Any] = None) -> Dict[str, Any]:
-    r = get_redis()
-    state = {
-        "player1_id": player1_id,
-        "player2_id": player2_id,
-        "current_player_id": player1_id if player2_id else None,
-        "board": _new_board(),
-        "status": "active" if player2_id else "waiting",
-        "winner_id": None,
-        "winning_line": None,
-        "move_seq": 0,
-        "settings": settings or {},
-        "p1_time": (settings.get('timer', {}).get('initial') if settings else 120),
-        "p2_time": (settings.get('timer', {}).get('initial') if settings else 120),
-        "last_move_time": int(time.time()) if player2_id else None,
-        "created_at": int(time.time()),
-        "started_at": int(time.time()) if player2_id else None,
-        "updated_at": int(time.time()),
-    }
-    r.setex(_key(KEY_STATE, game_id), GAME_TTL_SECONDS, json.dumps(state))
+def _deadline_key(game_id: str) -> str:
+    return KEY_DEADLINES.format(shard=deadline_shard(game_id))
+
+
+def _encode_value(name: str, value: Any) -> Any:
+    if name == "settings":
+        return json.dumps(value or {})
+    if name == "winning_line":
+        return ",".join(str(p) for p in value)
+    return value
+
+
+def _decode_value(name: str, raw: Optional[bytes]) -> Any:
+    # Absent fields mean None; hashes cannot hold nulls.
+    if raw is None:
+        return None
+    if name in BOARD_FIELDS:
+        return raw
+    value = raw.decode()
+    if name in _INT_FIELDS:
+        return int(value)
+    if name == "settings":
+        return json.loads(value)
+    if name == "winning_line":
+        return [int(p) for p in value.split(",")] if value else []
+    return value
+
+
+def move_deadline(last_move_time: int, remaining: Optional[int]) -> int:
+    """Epoch second after which the player to move has lost on time."""
+    budget = MOVE_TIME_LIMIT_SECONDS if remaining is None else min(remaining, MOVE_TIME_LIMIT_SECONDS)
+    return last_move_time + budget + TIMEOUT_GRACE_SECONDS
+
+
+def _encode_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    return {name: _encode_value(name, value) for name, value in state.items() if value is not None}
+
+
+def _decode_state(fields: Dict[str, Optional[bytes]], include_board: bool) -> Dict[str, Any]:
+    state = {name: _decode_value(name, raw) for name, raw in fields.items()
+             if name not in BOARD_FIELDS and not name.startswith("timer_")}
+    if include_board:
+        state["board"] = bitboard.render(bitboard.unpack(fields.get("x")), bitboard.unpack(fields.get("o")))
     return state
 
 
-def get_state(game_id: str) -> Optional[Dict[str, Any]]:
+def create_game(game_id: str, player1_id: str, player2_id: Optional[str], settings: Dict[str, Any] = None, include_board: bool = False) -> Dict[str, Any]:
+    return create_games([(game_id, player1_id, player2_id, settings)], include_board)[0]
+
+
+def create_games(games: List[Tuple[str, str, Optional[str], Optional[Dict[str, Any]]]], include_board: bool = False) -> List[Dict[str, Any]]:
+    """
+    Initialize state for ``(game_id, player1_id, player2_id, settings)``
+    tuples in one pipelined round trip; returns their states in order.
+    """
+    r = get_redis()
+    now = int(time.time())
+    pipe = r.pipeline()
+    states = []
+    for game_id, player1_id, player2_id, settings in games:
+        timer = (settings or {}).get('timer', {})
+        state = {
+            "player1_id": player1_id,
+            "player2_id": player2_id,
+            "current_player_id": player1_id if player2_id else None,
+            "status": "active" if player2_id else "waiting",
+            "winner_id": None,
+            "winning_line": None,
+            "move_seq": 0,
+            "settings": settings or {},
+            "p1_time": (timer.get('initial') if settings else 120),
+            "p2_time": (timer.get('initial') if settings else 120),
+            "last_move_time": now if player2_id else None,
+            "created_at": now,
+            "started_at": now if player2_id else None,
+            "updated_at": now,
+        }
+        stored = _encode_state(state)
+        stored.update({
+            "x": bitboard.EMPTY,
+            "o": bitboard.EMPTY,
+            "timer_initial": timer.get('initial', 120),
+            # As before the hash layout: no timer settings means 120s + 5s,
+            # a timer without an increment has none.
+            "timer_increment": timer.get('increment', 0) if 'timer' in (settings or {}) else 5,
+        })
+        state_key = _key(KEY_STATE, game_id)
+        pipe.delete(state_key, _key(KEY_EVENTS, game_id))
+        pipe.hset(state_key, mapping=stored)
+        pipe.expire(state_key, GAME_TTL_SECONDS)
+        if state["status"] == "active":
+            remaining = state["p1_time"] if state["p1_time"] is not None else stored["timer_initial"]
+            pipe.zadd(_deadline_key(game_id), {game_id: move_deadline(state["last_move_time"], remaining)})
+            for user_id in (player1_id, player2_id):
+                pipe.sadd(KEY_USER_ACTIVE.format(user_id=user_id), game_id)
+        if include_board:
+            state["board"] = bitboard.render(0, 0)
+        states.append(state)
+    pipe.execute()
+    return states
+
+
+def _migrate(r: redis.Redis, game_id: str) -> None:
+    scripts.run(r, "migrate_state", [_key(KEY_STATE, game_id)])
+
+
+def get_fields(game_id: str, fields: Iterable[str]) -> Optional[Dict[str, Any]]:
+    """
+    HMGET only ``fields`` of a game's state. Returns None if the game is not
+    in Redis. ``board`` may be requested like any other field.
+    """
+    names = list(fields)
+    include_board = "board" in names
+    wanted = [n for n in names if n != "board"]
+    if include_board:
+        wanted.extend(BOARD_FIELDS)
+    # Always fetch status so a missing game can be told apart from unset fields.
+    wanted.append("status")
     r = get_redis()
-    data = r.get(_key(KEY_STATE, game_id))
-    if not data:
+    state_key = _key(KEY_STATE, game_id)
+    try:
+        values = r.hmget(state_key, wanted)
+    except redis.ResponseError:
+        # WRONGTYPE: still a JSON string from before the hash layout.
+        _migrate(r, game_id)
+        values = r.hmget(state_key, wanted)
+    if values[-1] is None:
         return None
-    return json.loads(data)
+    raw = dict(zip(wanted, values))
+    state = _decode_state(raw, include_board)
+    return {name: state.get(name) for name in names}
 
 
-# Lua script for atomic move application
-# Logic: 
-# 1. Update board
-# 2. Check win condition (5 in a row) using direction vectors from the played position
-# 3. Persist
-LUA_APPLY_MOVE = """
-local state_raw = redis.call('GET', KEYS[1])
-if not state_raw then return cjson.encode({ err = 'NOT_FOUND' }) end
-local st = cjson.decode(state_raw)
-
--- Args: user_id, pos, ttl
-local user_id = ARGV[1]
-local pos = tonumber(ARGV[2])
-local board_size = 13
-local win_len = 5
-local max_idx = (board_size * board_size) - 1
--- Current server time for timer calc
-local now = tonumber(redis.call('TIME')[1])
+def get_fields_many(game_ids: Iterable[str], fields: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """``get_fields`` for many games in one pipelined round trip."""
+    game_ids = list(game_ids)
+    names = list(fields)
+    include_board = "board" in names
+    wanted = [n for n in names if n != "board"]
+    if include_board:
+        wanted.extend(BOARD_FIELDS)
+    wanted.append("status")
+    pipe = get_redis().pipeline(transaction=False)
+    for game_id in game_ids:
+        pipe.hmget(_key(KEY_STATE, game_id), wanted)
+    results = {}
+    for game_id, values in zip(game_ids, pipe.execute(raise_on_error=False)):
+        if isinstance(values, redis.ResponseError):
+            results[game_id] = get_fields(game_id, names)  # Legacy JSON key, migrate it
+            continue
+        if values[-1] is None:
+            results[game_id] = None
+            continue
+        state = _decode_state(dict(zip(wanted, values)), include_board)
+        results[game_id] = {name: state.get(name) for name in names}
+    return results
 
-if st.status ~= 'active' then return cjson.encode({ err = 'NOT_ACTIVE' }) end
-if st.current_player_id ~= user_id then return cjson.encode({ err = 'NOT_YOUR_TURN' }) end
-if pos < 0 or pos > max_idx then return cjson.encode({ err = 'BAD_POS' }) end
-if st.board[pos + 1] ~= cjson.null then return cjson.encode({ err = 'CELL_TAKEN' }) end
 
--- 1. Apply Move
-local symbol = (user_id == st.player1_id) and 'X' or 'O'
-st.board[pos + 1] = symbol
-st.move_seq = (st.move_seq or 0) + 1
+def get_state(game_id: str, include_board: bool = False) -> Optional[Dict[str, Any]]:
+    fields = STATE_FIELDS + (("board",) if include_board else ())
+    return get_fields(game_id, fields)
 
--- 2. Timer Logic (Chess Style)
-local is_p1 = (user_id == st.player1_id)
-local settings = st.settings or {}
-local timer_cfg = settings.timer or { initial = 120, increment = 5 } 
-local increment = timer_cfg.increment or 0
-
--- Deduct time used (if not first moves? usually applies always except maybe very first)
--- Actually, started_at is when p2 joined.
-local last_time = st.last_move_time or st.started_at or now
-local elapsed = now - last_time
 
-if is_p1 then
-   st.p1_time = (st.p1_time or timer_cfg.initial) - elapsed + increment
-   if st.p1_time < 0 then st.p1_time = 0 end -- Timeout check could happen here
-else
-   st.p2_time = (st.p2_time or timer_cfg.initial) - elapsed + increment
-   if st.p2_time < 0 then st.p2_time = 0 end
+def render_board(game_id: str) -> list:
+    """Client-facing board list for a game (all cells empty if unknown)."""
+    state = get_fields(game_id, ("board",))
+    return state["board"] if state else bitboard.render(0, 0)
+
+
+def finish_game(game_id: str, status: str, winner_id: Optional[str], winning_line: Optional[list] = None,
+                only_if_due: bool = False) -> bool:
+    """Write the end-of-game fields in place (timeouts, abandonment)."""
+    return bool(finish_games([(game_id, status, winner_id, winning_line)], only_if_due))
+
+
+def finish_games(results: Iterable[Tuple[str, str, Optional[str], Optional[list]]],
+                 only_if_due: bool = False) -> List[str]:
+    """
+    ``finish_game`` for many games in one pipelined round trip. ``results``
+    holds ``(game_id, status, winner_id, winning_line)`` tuples.
+
+    Each game only transitions if it is still active (and, with
+    ``only_if_due``, its deadline has passed), checked atomically with the
+    write, so a concurrent move or another replica ending the same game
+    cannot both win. Returns the ids of the games this call ended.
+    """
+    results = list(results)
+    # Recorded on the finished stream: 'timeout', or the status ('abandoned').
+    calls = [
+        ([_key(KEY_STATE, game_id), _deadline_key(game_id), KEY_FINISHED, _key(KEY_EVENTS, game_id)],
+         [game_id, status, winner_id or "", _encode_value("winning_line", winning_line or []),
+          str(GAME_TTL_SECONDS), "1" if only_if_due else "0",
+          "timeout" if only_if_due else status, str(FINISHED_STREAM_MAXLEN)])
+        for game_id, status, winner_id, winning_line in results
+    ]
+    if not calls:
+        return []
+    r = get_redis()
+    ended = scripts.run_many(r, "finish_game", calls)
+    # The script returns 0, or {1, player1_id, player2_id} for a game it ended.
+    ended = {game_id: res[1:] for (game_id, *_), res in zip(results, ended) if res != 0}
+    _release_players(r, [(game_id, p.decode()) for game_id, players in ended.items() for p in players if p])
+    return list(ended)
+
+
+def _release_players(r: redis.Redis, entries: Iterable[Tuple[str, str]]) -> None:
+    """Drop ``(game_id, user_id)`` pairs from the users' active game sets."""
+    pipe = r.pipeline(transaction=False)
+    for game_id, user_id in entries:
+        pipe.srem(KEY_USER_ACTIVE.format(user_id=user_id), game_id)
+    if len(pipe):
+        pipe.execute()
+
+
+def active_games_for_user(user_id: str) -> List[str]:
+    """
+    Ids of the active games ``user_id`` plays in. Usually an empty set, i.e.
+    one SMEMBERS; listed games are confirmed against their state and stale
+    entries (game ended without its players being released) are removed.
+    """
+    r = get_redis()
+    key = KEY_USER_ACTIVE.format(user_id=user_id)
+    game_ids = [game_id.decode() for game_id in r.smembers(key)]
+    if not game_ids:
+        return []
+    pipe = r.pipeline(transaction=False)
+    for game_id in game_ids:
+        pipe.hget(_key(KEY_STATE, game_id), "status")
+    statuses = pipe.execute(raise_on_error=False)
+    active = [game_id for game_id, status in zip(game_ids, statuses) if status == b"active"]
+    stale = [game_id for game_id in game_ids if game_id not in active]
+    if stale:
+        r.srem(key, *stale)
+    return active
+
+
+def get_moves(game_id: str, after: int = 0, limit: int = 200) -> Optional[List[Dict[str, Any]]]:
+    """
+    Moves ``after + 1`` onwards (at most ``limit``) from the game's move log
+    stream, or None if the game has no log in Redis (expired or never played).
+    """
+    pipe = get_redis().pipeline(transaction=False)
+    events_key = _key(KEY_EVENTS, game_id)
+    pipe.exists(events_key)
+    pipe.xrange(events_key, min=f"{after + 1}-0", max="+", count=limit)
+    exists, entries = pipe.execute()
+    if not exists:
+        return None
+    return [
+        move_log.decode_record(fields[b"m"], int(entry_id.split(b"-")[0]))
+        for entry_id, fields in entries
+    ]
+
+
+def get_deadline(game_id: str) -> Optional[float]:
+    return get_redis().zscore(_deadline_key(game_id), game_id)
+
+
+def due_deadlines(shard: int, until: float) -> list:
+    """``(game_id, deadline)`` for every active game in ``shard`` expiring by ``until``."""
+    rows = get_redis().zrangebyscore(KEY_DEADLINES.format(shard=shard), "-inf", until, withscores=True)
+    return [(game_id.decode(), score) for game_id, score in rows]
+
+
+def active_game_ids(shard: int, batch_size: int = 500) -> Iterable[List[str]]:
+    """Every game id in a deadline shard (i.e. every active game in it), in ZSCAN batches."""
+    r = get_redis()
+    key = KEY_DEADLINES.format(shard=shard)
+    cursor = 0
+    while True:
+        cursor, rows = r.zscan(key, cursor, count=batch_size)
+        if rows:
+            yield [game_id.decode() for game_id, _ in rows]
+        if cursor == 0:
+            break
+
+
+def backfill_deadlines() -> int:
+    """
+    Index active games created before the deadline set (and the per-user
+    active game sets) existed. One keyspace SCAN, run once when the timeout
+    manager starts; returns how many deadlines were added.
+    """
+    r = get_redis()
+    added = 0
+    for key in r.scan_iter(match=KEY_STATE.format(game_id="*"), count=500):
+        game_id = key.decode().split(":")[1]
+        state = get_fields(game_id, ("status", "player1_id", "player2_id", "current_player_id",
+                                     "p1_time", "p2_time", "last_move_time", "started_at"))
+        if not state or state["status"] != "active":
+            continue
+        for user_id in (state["player1_id"], state["player2_id"]):
+            if user_id:
+                r.sadd(KEY_USER_ACTIVE.format(user_id=user_id), game_id)
+        last = state["last_move_time"] or state["started_at"] or int(time.time())
+        remaining = state["p1_time"] if state["current_player_id"] == state["player1_id"] else state["p2_time"]
+        added += r.zadd(_deadline_key(game_id), {game_id: move_deadline(last, remaining)}, nx=True)
+    return added
+
+
+# Converts a JSON-string state (board as a list of cells) into the hash
+# layout. Shared by the migration script and
+# the move script so a move on an unconverted game converts it first.
+_LUA_MIGRATE_FN = """
+local board_size = 13
+local cell_count = board_size * board_size
+
+local function pack_rows(rows)
+    local out = {}
+    for r = 0, board_size - 1 do
+        out[r + 1] = string.char(bit.rshift(rows[r], 8), bit.band(rows[r], 0xFF))
+    end
+    return table.concat(out)
+end
+
+local function empty_rows()
+    local rows = {}
+    for r = 0, board_size - 1 do rows[r] = 0 end
+    return rows
 end
 
-st.last_move_time = now
-st.updated_at = now
+local function migrate_json_state(state_key)
+    if redis.call('TYPE', state_key).ok ~= 'string' then return 0 end
+    local st = cjson.decode(redis.call('GET', state_key))
+    local ttl = redis.call('PTTL', state_key)
 
--- 3. Win Check
-local function get_cell(b, r, c)
-    if r < 0 or r >= board_size or c < 0 or c >= board_size then return nil end
-    local idx = (r * board_size) + c
-    return b[idx + 1]
+    local x_rows, o_rows = empty_rows(), empty_rows()
+    if type(st.board) == 'table' then
+        for i = 1, cell_count do
+            local r, c = math.floor((i - 1) / board_size), (i - 1) % board_size
+            if st.board[i] == 'X' then
+                x_rows[r] = bit.bor(x_rows[r], bit.lshift(1, c))
+            elseif st.board[i] == 'O' then
+                o_rows[r] = bit.bor(o_rows[r], bit.lshift(1, c))
+            end
+        end
+    end
+
+    local fields = { 'x', pack_rows(x_rows), 'o', pack_rows(o_rows) }
+    local function put(name, value)
+        if value ~= nil and value ~= cjson.null then
+            table.insert(fields, name)
+            table.insert(fields, tostring(value))
+        end
+    end
+    for _, name in ipairs({ 'player1_id', 'player2_id', 'current_player_id', 'status', 'winner_id',
+                            'move_seq', 'p1_time', 'p2_time', 'last_move_time',
+                            'created_at', 'started_at', 'updated_at' }) do
+        put(name, st[name])
+    end
+    if type(st.winning_line) == 'table' then
+        put('winning_line', table.concat(st.winning_line, ','))
+    end
+    local settings = type(st.settings) == 'table' and st.settings or {}
+    local timer = type(settings.timer) == 'table' and settings.timer or nil
+    put('settings', cjson.encode(settings))
+    put('timer_initial', timer and timer.initial or 120)
+    put('timer_increment', timer and (timer.increment or 0) or 5)
+
+    redis.call('DEL', state_key)
+    redis.call('HSET', state_key, unpack(fields))
+    if ttl > 0 then redis.call('PEXPIRE', state_key, ttl) end
+    return 1
 end
+"""
+
+# Concatenated records of a game's move log stream, for the finished stream.
+# A log that does not start at move 1 (game migrated mid-play) gets the
+# header with its first sequence number (state/move_log.py).
+_LUA_MOVE_LOG_FN = """
+local function move_log(events_key)
+    local out = {}
+    for i, entry in ipairs(redis.call('XRANGE', events_key, '-', '+')) do
+        if i == 1 then
+            local first_seq = tonumber(string.match(entry[1], '^(%d+)'))
+            if first_seq ~= 1 then
+                out[1] = string.char(255, math.floor(first_seq / 256), first_seq % 256)
+            end
+        end
+        out[#out + 1] = entry[2][2]
+    end
+    return table.concat(out)
+end
+"""
+
+LUA_MIGRATE_STATE = _LUA_MIGRATE_FN + """
+return migrate_json_state(KEYS[1])
+"""
 
-local row = math.floor(pos / board_size)
-local col = pos % board_size
-local directions = {
-    {0, 1},   -- Horizontal
-    {1, 0},   -- Vertical
-    {1, 1},   -- Diagonal \
-    {1, -1}   -- Diagonal /
-}
 
-local winner = nil
-local winning_line = {}
-
-for _, d in ipairs(directions) do
-    local dr, dc = d[1], d[2]
-    local count = 1
-    local line = {pos}
-    
-    -- Forward
-    for i = 1, win_len - 1 do
-        local r, c = row + (dr * i), col + (dc * i)
-        if get_cell(st.board, r, c) == symbol then
-            count = count + 1
-            table.insert(line, r * board_size + c)
+# Lua script for atomic move application
+# Logic:
+# 1. Update the mover's bitmap field
+# 2. Check win condition (5 in a row) with shift/AND masks over the rows
+#    around the played position; walk the line only when a win is found
+# 3. Draw is move_seq reaching the cell count, no board scan
+# 4. Write only the fields that changed
+#
+# Bitmaps use the layout from state/bitboard.py: 13 big-endian 16-bit row
+# words, bit c of a word = column c. Redis' Lua runs 32-bit `bit` ops, which
+# is plenty for a 13-bit row.
+#
+# Returns { err } on error, { 'OK', field, value, ... } (the whole hash) on
+# success.
+LUA_APPLY_MOVE = _LUA_MIGRATE_FN + _LUA_MOVE_LOG_FN + """
+-- Keys: state, deadline index, finished stream, move log
+-- Args: user_id, pos, ttl, game_id, move time limit, timeout grace, stream maxlen
+local user_id = ARGV[1]
+local pos = tonumber(ARGV[2])
+local win_len = 5
+local max_idx = cell_count - 1
+local full_row = 0x1FFF
+-- Current server time for timer calc (seconds) and the move log (ms)
+local t = redis.call('TIME')
+local now = tonumber(t[1])
+local now_ms = now * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+migrate_json_state(KEYS[1])
+
+local f = redis.call('HMGET', KEYS[1], 'status', 'current_player_id', 'player1_id', 'player2_id',
+                     'x', 'o', 'move_seq', 'p1_time', 'p2_time', 'last_move_time', 'started_at',
+                     'timer_initial', 'timer_increment')
+local status, current_player_id, player1_id, player2_id = f[1], f[2], f[3], f[4]
+if not status then return { 'NOT_FOUND' } end
+
+local function unpack_rows(s)
+    local rows = {}
+    local valid = s and #s == board_size * 2
+    for r = 0, board_size - 1 do
+        if valid then
+            local hi, lo = string.byte(s, 2 * r + 1, 2 * r + 2)
+            rows[r] = hi * 256 + lo
         else
-            break
+            rows[r] = 0
         end
     end
-    
-    -- Backward
-    for i = 1, win_len - 1 do
-        local r, c = row - (dr * i), col - (dc * i)
-        if get_cell(st.board, r, c) == symbol then
-            count = count + 1
-            table.insert(line, r * board_size + c)
-        else
-            break
+    return rows
+end
+
+local function is_set(rows, r, c)
+    if r < 0 or r >= board_size or c < 0 or c >= board_size then return false end
+    return bit.band(rows[r], bit.lshift(1, c)) ~= 0
+end
+
+-- Any five-run must contain the stone just played (the previous position had
+-- none), so only row r and the five-row windows that include it are checked.
+local function has_five(rows, r)
+    local w = rows[r]
+    if bit.band(w, bit.rshift(w, 1), bit.rshift(w, 2), bit.rshift(w, 3), bit.rshift(w, 4)) ~= 0 then
+        return true
+    end
+    for top = math.max(0, r - win_len + 1), math.min(r, board_size - win_len) do
+        local v, d1, d2 = full_row, full_row, full_row
+        for i = 0, win_len - 1 do
+            local row = rows[top + i]
+            v = bit.band(v, row)
+            d1 = bit.band(d1, bit.rshift(row, i))
+            d2 = bit.band(d2, bit.lshift(row, i))
+        end
+        if v ~= 0 or d1 ~= 0 or bit.band(d2, full_row) ~= 0 then
+            return true
         end
     end
-    
-    if count >= win_len then
-        winner = symbol
-        winning_line = line
-        break
+    return false
+end
+
+local function line_through(rows, row, col)
+    local directions = {
+        {0, 1},   -- Horizontal
+        {1, 0},   -- Vertical
+        {1, 1},   -- Diagonal \\
+        {1, -1}   -- Diagonal /
+    }
+    for _, d in ipairs(directions) do
+        local line = { row * board_size + col }
+        for _, sign in ipairs({1, -1}) do
+            for i = 1, win_len - 1 do
+                local r, c = row + sign * d[1] * i, col + sign * d[2] * i
+                if not is_set(rows, r, c) then break end
+                table.insert(line, r * board_size + c)
+            end
+        end
+        if #line >= win_len then return table.concat(line, ',') end
     end
+    return ''
+end
+
+if status ~= 'active' then return { 'NOT_ACTIVE' } end
+if current_player_id ~= user_id then return { 'NOT_YOUR_TURN' } end
+if pos < 0 or pos > max_idx then return { 'BAD_POS' } end
+
+local x_rows, o_rows = unpack_rows(f[5]), unpack_rows(f[6])
+local row = math.floor(pos / board_size)
+local col = pos % board_size
+if is_set(x_rows, row, col) or is_set(o_rows, row, col) then
+    return { 'CELL_TAKEN' }
+end
+
+-- Position byte + 6-byte big-endian ms timestamp (state/move_log.py)
+local function encode_move(p, ms)
+    local hi = math.floor(ms / 4294967296)
+    local lo = ms - hi * 4294967296
+    return string.char(p, math.floor(hi / 256) % 256, hi % 256,
+                       math.floor(lo / 16777216) % 256, math.floor(lo / 65536) % 256,
+                       math.floor(lo / 256) % 256, lo % 256)
+end
+
+-- 1. Apply Move
+local is_p1 = (user_id == player1_id)
+local mine = is_p1 and x_rows or o_rows
+mine[row] = bit.bor(mine[row], bit.lshift(1, col))
+local move_seq = (tonumber(f[7]) or 0) + 1
+
+-- 2. Timer Logic (Chess Style)
+local initial = tonumber(f[12]) or 120
+local increment = tonumber(f[13]) or 0
+local p1_time = tonumber(f[8]) or initial
+local p2_time = tonumber(f[9]) or initial
+
+-- Deduct time used. started_at is when p2 joined.
+local last_time = tonumber(f[10]) or tonumber(f[11]) or now
+local elapsed = now - last_time
+
+if is_p1 then
+   p1_time = p1_time - elapsed + increment
+   if p1_time < 0 then p1_time = 0 end
+else
+   p2_time = p2_time - elapsed + increment
+   if p2_time < 0 then p2_time = 0 end
 end
 
-if winner then
-  st.status = 'completed'
-  st.winning_line = winning_line
-  st.winner_id = user_id
-elseif st.p1_time == 0 or st.p2_time == 0 then
+local changes = {
+    is_p1 and 'x' or 'o', pack_rows(mine),
+    'move_seq', move_seq,
+    'p1_time', p1_time,
+    'p2_time', p2_time,
+    'last_move_time', now,
+    'updated_at', now,
+}
+
+-- 3. Win / Timeout / Draw
+local winner_id = nil
+local winning_line = nil
+if has_five(mine, row) then
+  status = 'completed'
+  winning_line = line_through(mine, row, col)
+  winner_id = user_id
+elseif p1_time == 0 or p2_time == 0 then
   -- Handle Timeout
-  st.status = 'completed'
-  st.winner_id = (st.p1_time == 0) and st.player2_id or st.player1_id
-  st.winning_line = {} -- No line for timeout
+  status = 'completed'
+  winner_id = (p1_time == 0) and player2_id or player1_id
+  winning_line = '' -- No line for timeout
+elseif move_seq >= cell_count then
+  status = 'completed'
 else
-  -- Check draw
-  local full = true
-  for i=1, (board_size * board_size) do
-    if st.board[i] == cjson.null then full = false break end
-  end
-  if full then
-    st.status = 'completed'
-    st.winner_id = cjson.null
+  -- Switch Turn
+  if current_player_id == player1_id then
+    current_player_id = player2_id
   else
-    -- Switch Turn
-    if st.current_player_id == st.player1_id then
-      st.current_player_id = st.player2_id
-    else
-      st.current_player_id = st.player1_id
-    end
+    current_player_id = player1_id
   end
 end
 
-redis.call('SETEX', KEYS[1], tonumber(ARGV[3]), cjson.encode(st))
-return cjson.encode({ ok = true, state = st })
+table.insert(changes, 'status'); table.insert(changes, status)
+table.insert(changes, 'current_player_id'); table.insert(changes, current_player_id)
+if winner_id then
+  table.insert(changes, 'winner_id'); table.insert(changes, winner_id)
+end
+if winning_line then
+  table.insert(changes, 'winning_line'); table.insert(changes, winning_line)
+end
+
+-- Log first: it is the one write that can fail (ids must increase), and
+-- nothing has been changed yet if it does.
+redis.call('XADD', KEYS[4], move_seq .. '-0', 'm', encode_move(pos, now_ms))
+redis.call('EXPIRE', KEYS[4], tonumber(ARGV[3]))
+redis.call('HSET', KEYS[1], unpack(changes))
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[3]))
+
+-- 4. Deadline index: the player now to move must answer before their clock
+-- (capped at the per-move limit) plus grace runs out.
+if status == 'active' then
+  local remaining = (current_player_id == player1_id) and p1_time or p2_time
+  local budget = math.min(remaining, tonumber(ARGV[5]))
+  redis.call('ZADD', KEYS[2], now + budget + tonumber(ARGV[6]), ARGV[4])
+else
+  redis.call('ZREM', KEYS[2], ARGV[4])
+  redis.call('XADD', KEYS[3], 'MAXLEN', '~', ARGV[7], '*',
+             'game_id', ARGV[4], 'status', status, 'reason', 'move',
+             'winner_id', winner_id or '', 'finished_at', now,
+             'player1_id', player1_id, 'player2_id', player2_id or '',
+             'x', pack_rows(x_rows), 'o', pack_rows(o_rows),
+             'moves', move_log(KEYS[4]))
+end
+
+local result = redis.call('HGETALL', KEYS[1])
+table.insert(result, 1, 'OK')
+return result
 """
 
+# Compare-and-set end of game for timeouts and abandonment: only an active
+# game transitions, and with the due flag only if its deadline has passed
+# (a move that landed first has pushed it back). Whoever gets 1 back owns
+# the game_over publish; the persister gets the game from the stream.
+# Keys: state, deadline shard, finished stream, move log
+# Args: game_id, status, winner_id ('' for none), winning_line, ttl, due flag,
+#       reason, stream maxlen
+LUA_FINISH_GAME = _LUA_MOVE_LOG_FN + """
+if redis.call('HGET', KEYS[1], 'status') ~= 'active' then return 0 end
+local t = redis.call('TIME')
+local now = tonumber(t[1])
+if ARGV[6] == '1' then
+    local deadline = tonumber(redis.call('ZSCORE', KEYS[2], ARGV[1]))
+    if deadline and deadline > now + tonumber(t[2]) / 1000000 then return 0 end
+end
+redis.call('HSET', KEYS[1], 'status', ARGV[2], 'winning_line', ARGV[4], 'updated_at', now)
+if ARGV[3] ~= '' then
+    redis.call('HSET', KEYS[1], 'winner_id', ARGV[3])
+else
+    redis.call('HDEL', KEYS[1], 'winner_id')
+end
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[5]))
+redis.call('ZREM', KEYS[2], ARGV[1])
+local f = redis.call('HMGET', KEYS[1], 'player1_id', 'player2_id', 'x', 'o')
+redis.call('XADD', KEYS[3], 'MAXLEN', '~', ARGV[8], '*',
+           'game_id', ARGV[1], 'status', ARGV[2], 'reason', ARGV[7],
+           'winner_id', ARGV[3], 'finished_at', now,
+           'player1_id', f[1] or '', 'player2_id', f[2] or '',
+           'x', f[3] or '', 'o', f[4] or '', 'moves', move_log(KEYS[4]))
+return { 1, f[1] or '', f[2] or '' }
+"""
+
+scripts.register("migrate_state", LUA_MIGRATE_STATE)
+scripts.register("apply_move", LUA_APPLY_MOVE)
+scripts.register("finish_game", LUA_FINISH_GAME)
+
 
-def apply_move(game_id: str, user_id: str, position: int) -> Dict[str, Any]:
+def apply_move(game_id: str, user_id: str, position: int, include_board: bool = False) -> Dict[str, Any]:
     r = get_redis()
     state_key = _key(KEY_STATE, game_id)
     try:
-        res = r.eval(LUA_APPLY_MOVE, 1, state_key, user_id, str(position), str(GAME_TTL_SECONDS))
-        data = json.loads(res)
-        if data.get("err"):
-            return {"success": False, "error": data["err"]}
-        return {"success": True, "state": data["state"]}
+        res = scripts.run(
+            r, "apply_move",
+            [state_key, _deadline_key(game_id), KEY_FINISHED, _key(KEY_EVENTS, game_id)],
+            [user_id, str(position), str(GAME_TTL_SECONDS), game_id,
+             str(MOVE_TIME_LIMIT_SECONDS), str(TIMEOUT_GRACE_SECONDS), str(FINISHED_STREAM_MAXLEN)],
+        )
+        if res[0] != b"OK":
+            return {"success": False, "error": res[0].decode()}
+        raw = {name.decode(): value for name, value in zip(res[1::2], res[2::2])}
+        state = dict.fromkeys(STATE_FIELDS)
+        state.update(_decode_state(raw, include_board))
+        if state["status"] != "active":
+            _release_players(r, [(game_id, p) for p in (state["player1_id"], state["player2_id"]) if p])
+        return {"success": True, "state": state}
     except redis.RedisError as e:
         return {"success": False, "error": f"REDIS_ERR:{e}"}
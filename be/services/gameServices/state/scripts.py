@@ -0,0 +1,68 @@
+"""
+Registry for the game service's Lua scripts.
+
+Scripts are registered once at import time with their SHA1 computed locally,
+preloaded with SCRIPT LOAD at startup, and run with EVALSHA so the source is
+never sent on the hot path. If Redis has lost the script cache (restart,
+SCRIPT FLUSH, failover) the NOSCRIPT error triggers a reload and one retry.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+from typing import Any, Dict, List, Sequence, Tuple
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+
+class ScriptRegistry:
+    def __init__(self):
+        self._sources: Dict[str, str] = {}
+        self._shas: Dict[str, str] = {}
+
+    def register(self, name: str, source: str) -> None:
+        self._sources[name] = source
+        self._shas[name] = hashlib.sha1(source.encode()).hexdigest()
+
+    def load_all(self, r: redis.Redis) -> None:
+        """SCRIPT LOAD every registered script (one pipelined round trip)."""
+        pipe = r.pipeline(transaction=False)
+        for source in self._sources.values():
+            pipe.script_load(source)
+        pipe.execute()
+        logger.info(f"Preloaded {len(self._sources)} Lua scripts.")
+
+    def run(self, r: redis.Redis, name: str, keys: Sequence[str], args: Sequence[Any] = ()) -> Any:
+        sha = self._shas[name]
+        try:
+            return r.evalsha(sha, len(keys), *keys, *args)
+        except redis.exceptions.NoScriptError:
+            logger.warning(f"Script '{name}' missing from Redis cache, reloading.")
+            r.script_load(self._sources[name])
+            return r.evalsha(sha, len(keys), *keys, *args)
+
+    def run_many(self, r: redis.Redis, name: str, calls: Sequence[Tuple[Sequence[str], Sequence[Any]]]) -> List[Any]:
+        """Run one script for each ``(keys, args)`` in a single pipelined round trip."""
+        sha = self._shas[name]
+
+        def attempt():
+            pipe = r.pipeline(transaction=False)
+            for keys, args in calls:
+                pipe.evalsha(sha, len(keys), *keys, *args)
+            return pipe.execute(raise_on_error=False)
+
+        results = attempt()
+        if any(isinstance(res, redis.exceptions.NoScriptError) for res in results):
+            # Every call in the batch failed the same way, so none ran.
+            logger.warning(f"Script '{name}' missing from Redis cache, reloading.")
+            r.script_load(self._sources[name])
+            results = attempt()
+        for res in results:
+            if isinstance(res, Exception):
+                raise res
+        return results
+
+
+scripts = ScriptRegistry()
@@ -0,0 +1,45 @@
+import os
+import sys
+
+import fakeredis
+import pytest
+
+# Modules import each other by top-level name (``from extensions import db``),
+# so run the tests with the service directory on the path, as the service is.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from state import redis_store  # noqa: E402
+from state.scripts import ScriptRegistry  # noqa: E402
+
+# fakeredis's Lua has no ``bit`` library (Redis ships LuaBitOp); this is a
+# slow but exact stand-in for the calls the scripts make, on 16-bit rows.
+LUA_BIT = """
+local bit = {}
+local function bitwise(a, b, keep)
+    local r, p = 0, 1
+    for _ = 0, 31 do
+        if keep(a % 2, b % 2) then r = r + p end
+        a, b, p = math.floor(a / 2), math.floor(b / 2), p * 2
+    end
+    return r
+end
+function bit.band(a, ...)
+    for _, b in ipairs({...}) do a = bitwise(a, b, function(x, y) return x == 1 and y == 1 end) end
+    return a
+end
+function bit.bor(a, ...)
+    for _, b in ipairs({...}) do a = bitwise(a, b, function(x, y) return x == 1 or y == 1 end) end
+    return a
+end
+function bit.lshift(a, n) return (a * 2 ^ n) % 4294967296 end
+function bit.rshift(a, n) return math.floor(a / 2 ^ n) end
+"""
+
+
+@pytest.fixture
+def lua_store(monkeypatch):
+    registry = ScriptRegistry()
+    for name, source in redis_store.scripts._sources.items():
+        registry.register(name, LUA_BIT + source)
+    monkeypatch.setattr(redis_store, 'scripts', registry)
+    monkeypatch.setattr(redis_store, '_redis', fakeredis.FakeRedis())
@@ -0,0 +1,61 @@
+import json
+import uuid
+from datetime import datetime
+
+import fakeredis
+import pytest
+from flask import Flask
+
+import extensions
+from extensions import db
+from db.models.game import Game
+from routes import MAX_BATCH_GAMES, game_bp
+from state import redis_store
+
+
+@pytest.fixture
+def client(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis_store, '_redis', fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(extensions, '_event_bus', fakeredis.FakeRedis(server=server))
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    app.register_blueprint(game_bp)
+    with app.app_context():
+        db.create_all()
+        yield app.test_client()
+        db.drop_all()
+
+
+def post(client, game_ids):
+    return client.post('/games/batch', data=json.dumps({'game_ids': game_ids}), content_type='application/json')
+
+
+def test_live_games_from_redis_and_the_rest_from_the_database(client):
+    p1, p2 = str(uuid.uuid4()), str(uuid.uuid4())
+    live = str(uuid.uuid4())
+    redis_store.create_game(live, p1, p2, {'timer': {'initial': 60, 'increment': 2}})
+    old = Game(id=uuid.uuid4(), player1_id=uuid.UUID(p1), player2_id=uuid.UUID(p2), status='completed',
+               winner_id=uuid.UUID(p1), finished_at=datetime(2024, 1, 1))
+    db.session.add(old)
+    db.session.commit()
+    unknown = str(uuid.uuid4())
+
+    response = post(client, [live, str(old.id), unknown, live])
+    assert response.status_code == 200
+    body = response.get_json()
+    assert set(body['games']) == {live, str(old.id)}
+    assert body['games'][live]['status'] == 'active'
+    assert body['games'][live]['current_player_id'] == p1
+    assert len(body['games'][live]['board']) == 169
+    assert body['games'][str(old.id)]['winner_id'] == p1
+    assert body['missing'] == [unknown]
+
+
+def test_rejects_bad_requests(client):
+    assert post(client, []).status_code == 400
+    assert client.post('/games/batch', data='{}', content_type='application/json').status_code == 400
+    assert post(client, [str(uuid.uuid4()) for _ in range(MAX_BATCH_GAMES + 1)]).status_code == 400
+    assert post(client, [str(uuid.uuid4()), 'not-a-uuid']).status_code == 400
+    assert post(client, [str(uuid.uuid4()) for _ in range(MAX_BATCH_GAMES)]).status_code == 200
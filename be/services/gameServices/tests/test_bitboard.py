@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+from state import bitboard, redis_store
+from state.bitboard import BOARD_SIZE, WIN_LENGTH
+
+
+def pos(row, col):
+    return row * BOARD_SIZE + col
+
+
+def stones(*positions):
+    bits = 0
+    for p in positions:
+        bits = bitboard.place(bits, p)
+    return bits
+
+
+@pytest.mark.parametrize('dr, dc, start', [
+    (0, 1, (6, 3)),    # Horizontal
+    (1, 0, (2, 12)),   # Vertical, last column
+    (1, 1, (8, 8)),    # Diagonal down to the corner
+    (1, -1, (0, 4)),   # Diagonal up, first column
+])
+def test_five_in_each_direction(dr, dc, start):
+    line = [pos(start[0] + dr * i, start[1] + dc * i) for i in range(WIN_LENGTH)]
+    bits = stones(*line)
+    assert bitboard.has_five(bits)
+    assert not bitboard.has_five(stones(*line[:-1]))
+    for played in line:
+        assert sorted(bitboard.winning_line(bits, played)) == sorted(line)
+
+
+def test_runs_do_not_wrap_between_rows():
+    # Last three columns of row 0 and first two of row 1 are adjacent bits
+    # in an unpadded layout
+    assert not bitboard.has_five(stones(pos(0, 10), pos(0, 11), pos(0, 12), pos(1, 0), pos(1, 1)))
+    # Same for the diagonals at the board edge
+    assert not bitboard.has_five(stones(*[pos(i, 10 + i) for i in range(3)], pos(3, 0), pos(4, 1)))
+    assert bitboard.winning_line(stones(pos(0, 11), pos(0, 12), pos(1, 0), pos(1, 1), pos(1, 2)), pos(1, 0)) is None
+
+
+def test_winning_line_order_is_played_cell_then_forward_then_back():
+    bits = stones(*[pos(4, c) for c in range(2, 8)])
+    assert bitboard.winning_line(bits, pos(4, 4)) == [pos(4, c) for c in (4, 5, 6, 7, 3, 2)]
+
+
+def test_pack_render_round_trip():
+    x, o = stones(0, 14, 168), stones(1, 84)
+    assert bitboard.unpack(bitboard.pack(x)) == x
+    assert len(bitboard.pack(x)) == bitboard.PACKED_SIZE
+    assert bitboard.unpack(b'') == 0
+    board = bitboard.render(x, o)
+    assert board[0] == board[14] == board[168] == 'X' and board[84] == 'O' and board.count(None) == 164
+    assert bitboard.from_board(board) == (x, o)
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_lua_move_script_agrees_with_bitboard(lua_store, seed):
+    rng = random.Random(seed)
+    players = ('p1', 'p2')
+    redis_store.create_game('g', *players, {'timer': {'initial': 600, 'increment': 0}})
+    cells = list(range(bitboard.CELL_COUNT))
+    rng.shuffle(cells)
+    mine = {'p1': 0, 'p2': 0}
+    for turn, cell in enumerate(cells):
+        player = players[turn % 2]
+        result = redis_store.apply_move('g', player, cell)
+        assert result['success'], result
+        mine[player] = bitboard.place(mine[player], cell)
+        state = result['state']
+        if bitboard.has_five(mine[player]):
+            assert state['status'] == 'completed' and state['winner_id'] == player
+            assert state['winning_line'] == bitboard.winning_line(mine[player], cell)
+            break
+        assert state['status'] == 'active'
+    fields = redis_store.get_redis().hmget('game:g:state', 'x', 'o')
+    assert [bitboard.unpack(f) for f in fields] == [mine['p1'], mine['p2']]
@@ -0,0 +1,78 @@
+import json
+import uuid
+
+import fakeredis
+import pytest
+from flask import Flask
+
+import extensions
+from extensions import db
+from db.models.game import Game
+from routes import game_bp
+from state import redis_store
+
+
+@pytest.fixture
+def client(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis_store, '_redis', fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(extensions, '_event_bus', fakeredis.FakeRedis(server=server))
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    app.register_blueprint(game_bp)
+    with app.app_context():
+        db.create_all()
+        yield app.test_client()
+        db.drop_all()
+
+
+def spec(key=None):
+    game = {'player1_id': str(uuid.uuid4()), 'player2_id': str(uuid.uuid4()),
+            'settings': {'timer': {'initial': 30, 'increment': 3}}}
+    if key:
+        game['key'] = key
+    return game
+
+
+def post(client, specs):
+    return client.post('/games/bulk', data=json.dumps({'games': specs}), content_type='application/json')
+
+
+def test_retry_with_the_same_keys_returns_the_same_games(client):
+    specs = [spec('k1'), spec('k2')]
+    first = post(client, specs)
+    assert first.status_code == 201
+
+    retry = post(client, specs + [spec('k3')])
+    assert retry.status_code == 201
+    games = retry.get_json()['games']
+    assert [g['key'] for g in games] == ['k1', 'k2', 'k3']
+    assert [g['id'] for g in games[:2]] == [g['id'] for g in first.get_json()['games']]
+    assert Game.query.count() == 3
+
+
+def test_retry_does_not_restart_existing_games(client):
+    specs = [spec('k1')]
+    game_id = post(client, specs).get_json()['games'][0]['id']
+    redis_store.get_redis().hset(f"game:{game_id}:state", 'move_seq', 3)
+
+    post(client, specs)
+    assert redis_store.get_fields(game_id, ['move_seq'])['move_seq'] == 3
+
+
+def test_committed_game_without_state_is_started_on_retry(client):
+    specs = [spec('k1')]
+    game_id = post(client, specs).get_json()['games'][0]['id']
+    redis_store.get_redis().delete(f"game:{game_id}:state")
+
+    post(client, specs)
+    assert redis_store.get_fields(game_id, ['status'])['status'] == 'active'
+    assert redis_store.active_games_for_user(specs[0]['player1_id']) == [game_id]
+
+
+def test_games_without_keys_are_always_new(client):
+    specs = [spec()]
+    first = post(client, specs).get_json()['games'][0]['id']
+    second = post(client, specs).get_json()['games'][0]['id']
+    assert first != second
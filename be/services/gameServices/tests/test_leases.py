@@ -0,0 +1,45 @@
+import fakeredis
+import pytest
+
+from state import leases as leases_module
+from state.leases import KEY_LEASE, KEY_MEMBERS, ShardLeases
+
+
+@pytest.fixture
+def r(monkeypatch):
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(leases_module, 'get_redis', lambda: client)
+    return client
+
+
+def test_single_replica_takes_every_shard(r):
+    node = ShardLeases(shards=8)
+    assert node.refresh() == set(range(8))
+    assert r.get(KEY_LEASE.format(shard=3)).decode() == node.node_id
+
+
+def test_shards_rebalance_when_a_replica_joins_and_leaves(r):
+    a, b = ShardLeases(shards=8), ShardLeases(shards=8)
+    a.refresh()
+    b.refresh()          # Two members now; a still holds everything
+    a.refresh()          # a hands back its excess
+    b.refresh()          # and b picks it up
+    assert len(a.owned) == len(b.owned) == 4
+    assert a.owned.isdisjoint(b.owned)
+
+    b.release_all()
+    assert r.zscore(KEY_MEMBERS, b.node_id) is None
+    assert a.refresh() == set(range(8))
+
+
+def test_lost_lease_is_dropped_not_renewed(r):
+    a, b = ShardLeases(shards=2), ShardLeases(shards=2)
+    a.refresh()
+    # a stalled past its TTL and b took shard 0
+    r.set(KEY_LEASE.format(shard=0), b.node_id)
+    assert 0 not in a.refresh()
+    assert r.get(KEY_LEASE.format(shard=0)).decode() == b.node_id
+
+    a.release_all()  # Must not drop b's lease
+    assert r.get(KEY_LEASE.format(shard=0)).decode() == b.node_id
+    assert r.get(KEY_LEASE.format(shard=1)) is None
@@ -0,0 +1,36 @@
+import fakeredis
+
+from state import move_log
+from state.redis_store import _LUA_MOVE_LOG_FN
+
+
+def records(positions, first_ts=1700000000000):
+    return [move_log.encode(pos, first_ts + i) for i, pos in enumerate(positions)]
+
+
+def test_decode_from_move_one():
+    blob = b''.join(records([84, 85, 70]))
+    moves = move_log.decode(blob)
+    assert [(m['seq'], m['position'], m['symbol']) for m in moves] == [(1, 84, 'X'), (2, 85, 'O'), (3, 70, 'X')]
+    assert [m['seq'] for m in move_log.decode(blob, after=1, limit=1)] == [2]
+
+
+def test_decode_log_that_starts_later():
+    blob = move_log.header(5) + b''.join(records([10, 11, 12]))
+    moves = move_log.decode(blob)
+    assert [(m['seq'], m['position'], m['symbol']) for m in moves] == [(5, 10, 'X'), (6, 11, 'O'), (7, 12, 'X')]
+    assert [m['seq'] for m in move_log.decode(blob, after=5)] == [6, 7]
+    assert [m['seq'] for m in move_log.decode(blob, after=0, limit=2)] == [5, 6]
+    assert move_log.decode(blob, after=7) == []
+
+
+def test_lua_move_log_writes_the_header_only_when_needed():
+    r = fakeredis.FakeRedis()
+    script = r.register_script(_LUA_MOVE_LOG_FN + "return move_log(KEYS[1])")
+    for seq, record in enumerate(records([1, 2]), start=1):
+        r.xadd('full', {'m': record}, id=f"{seq}-0")
+    for seq, record in enumerate(records([3, 4]), start=300):
+        r.xadd('migrated', {'m': record}, id=f"{seq}-0")
+
+    assert move_log.split(script(keys=['full'])) == (1, b''.join(records([1, 2])))
+    assert [m['seq'] for m in move_log.decode(script(keys=['migrated']))] == [300, 301]
@@ -0,0 +1,74 @@
+import json
+
+import fakeredis
+import pytest
+from flask import Flask
+
+import extensions
+from routes import game_bp
+from state import redis_store
+
+
+@pytest.fixture
+def game(lua_store, monkeypatch):
+    bus = fakeredis.FakeRedis()
+    monkeypatch.setattr(extensions, '_event_bus', bus)
+    pubsub = bus.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe('game_updates')
+    redis_store.create_game('g', 'p1', 'p2', {'timer': {'initial': 300, 'increment': 2}})
+    app = Flask(__name__)
+    app.register_blueprint(game_bp)
+    return app.test_client(), pubsub
+
+
+def published(pubsub):
+    messages = []
+    for _ in range(20):
+        message = pubsub.get_message(timeout=0.01)
+        if message:
+            messages.append(json.loads(message['data']))
+    return messages
+
+
+def move(client, user_id, position):
+    return client.post('/games/g/move', data=json.dumps({'user_id': user_id, 'position': position}),
+                       content_type='application/json')
+
+
+def test_move_publishes_a_delta_not_the_state(game):
+    client, pubsub = game
+    assert move(client, 'p1', 84).status_code == 200
+    assert move(client, 'p2', 85).status_code == 200
+
+    first, second = published(pubsub)
+    assert first['event'] == second['event'] == 'game_update'
+    assert first['room'] == 'game_g'
+    delta = second['data']
+    assert set(delta) == {'game_id', 'position', 'symbol', 'move_seq', 'current_player_id', 'p1_time', 'p2_time'}
+    assert (delta['game_id'], delta['position'], delta['symbol'], delta['move_seq']) == ('g', 85, 'O', 2)
+    assert delta['current_player_id'] == 'p1'
+    assert 300 <= delta['p1_time'] <= 302 and 300 <= delta['p2_time'] <= 302
+    assert first['data']['symbol'] == 'X' and first['data']['move_seq'] == 1
+
+
+def test_rejected_move_publishes_nothing(game):
+    client, pubsub = game
+    assert move(client, 'p2', 0).status_code == 400  # Not p2's turn
+    assert published(pubsub) == []
+
+
+def test_winning_move_delta_carries_the_result(game):
+    client, pubsub = game
+    for n in range(4):
+        move(client, 'p1', n)
+        move(client, 'p2', 13 + n)
+    response = move(client, 'p1', 4)
+    assert response.get_json()['status'] == 'completed'
+
+    messages = published(pubsub)
+    delta = messages[-2]['data']
+    assert (delta['move_seq'], delta['status'], delta['winner_id']) == (9, 'completed', 'p1')
+    assert sorted(delta['winning_line']) == [0, 1, 2, 3, 4]
+    assert messages[-1]['event'] == 'game_over' and 'board' in messages[-1]['data']
+    # The move script's finish releases both players from their active sets
+    assert redis_store.active_games_for_user('p1') == redis_store.active_games_for_user('p2') == []
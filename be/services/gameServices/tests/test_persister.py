@@ -0,0 +1,161 @@
+import json
+import uuid
+
+import fakeredis
+import pytest
+from flask import Flask
+
+from extensions import db
+from db.models.game import Game
+import persister as persister_module
+from persister import GROUP, KEY_FINISHED_DEAD, KEY_FOLLOWUPS_SENT, GamePersister
+from state import bitboard
+from state.redis_store import KEY_FINISHED
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def persister(app):
+    pers = GamePersister(app)
+    server = fakeredis.FakeServer()
+    pers.redis_client = fakeredis.FakeRedis(server=server)
+    pers.event_bus = fakeredis.FakeRedis(server=server)
+    pers.redis_client.xgroup_create(KEY_FINISHED, GROUP, id='0', mkstream=True)
+    return pers
+
+
+def finish(pers, p1, p2):
+    game = Game(player1_id=uuid.UUID(p1), player2_id=uuid.UUID(p2), status='active')
+    db.session.add(game)
+    db.session.commit()
+    game_id = str(game.id)
+    x = 0
+    for pos in range(5):
+        x = bitboard.place(x, pos)
+    pers.redis_client.xadd(KEY_FINISHED, {
+        'game_id': game_id, 'status': 'completed', 'reason': 'move', 'winner_id': p1,
+        'finished_at': 1700000000, 'player1_id': p1, 'player2_id': p2,
+        'x': bitboard.pack(x), 'o': bitboard.pack(0), 'moves': b'',
+    })
+    return game_id
+
+
+def read(pers, pending=False):
+    resp = pers.redis_client.xreadgroup(GROUP, 'c1', {KEY_FINISHED: '0' if pending else '>'}, count=10)
+    return resp[0][1] if resp else []
+
+
+def completed_events(pubsub):
+    events = []
+    # get_message returns None for the (ignored) subscribe confirmations too
+    for _ in range(20):
+        message = pubsub.get_message(timeout=0.01)
+        if message is None:
+            continue
+        data = json.loads(message['data'])
+        if data.get('event_type') == 'GAME_COMPLETED':
+            events.append(data['payload']['game_id'])
+    return events
+
+
+def test_persists_publishes_and_acks(persister):
+    pubsub = persister.event_bus.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe('domain_events')
+    p1, p2 = str(uuid.uuid4()), str(uuid.uuid4())
+    game_id = finish(persister, p1, p2)
+
+    persister._persist(read(persister))
+
+    game = db.session.get(Game, uuid.UUID(game_id))
+    assert game.status == 'completed' and game.finished_at is not None
+    assert str(game.winner_id) == p1
+    assert completed_events(pubsub) == [game_id]
+    assert persister.redis_client.xpending(KEY_FINISHED, GROUP)['pending'] == 0
+
+
+def test_failed_publish_is_retried_on_redelivery(persister, monkeypatch):
+    pubsub = persister.event_bus.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe('domain_events')
+    p1, p2 = str(uuid.uuid4()), str(uuid.uuid4())
+    game_id = finish(persister, p1, p2)
+
+    real_pipeline = persister.event_bus.pipeline
+
+    def broken_pipeline(*args, **kwargs):
+        pipe = real_pipeline(*args, **kwargs)
+        def execute(*a, **k):
+            raise ConnectionError("event bus down")
+        pipe.execute = execute
+        return pipe
+
+    monkeypatch.setattr(persister.event_bus, 'pipeline', broken_pipeline)
+    with pytest.raises(ConnectionError):
+        persister._persist(read(persister))
+
+    # The row is written but the entry stays pending and no marker is set.
+    assert db.session.get(Game, uuid.UUID(game_id)).finished_at is not None
+    assert persister.redis_client.xpending(KEY_FINISHED, GROUP)['pending'] == 1
+    assert persister.event_bus.get(KEY_FOLLOWUPS_SENT.format(game_id=game_id)) is None
+    assert completed_events(pubsub) == []
+
+    monkeypatch.setattr(persister.event_bus, 'pipeline', real_pipeline)
+    persister._persist(read(persister, pending=True))
+
+    assert completed_events(pubsub) == [game_id]
+    assert persister.redis_client.xpending(KEY_FINISHED, GROUP)['pending'] == 0
+
+
+def test_redelivery_after_publish_does_not_publish_again(persister):
+    pubsub = persister.event_bus.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe('domain_events')
+    game_id = finish(persister, str(uuid.uuid4()), str(uuid.uuid4()))
+    entries = read(persister)
+
+    persister._persist(entries)
+    # Same entries again, as if the ack had been lost.
+    persister._persist(entries)
+
+    assert completed_events(pubsub) == [game_id]
+
+
+def test_bad_entry_is_dead_lettered_and_the_rest_persisted(persister):
+    p1, p2 = str(uuid.uuid4()), str(uuid.uuid4())
+    good = finish(persister, p1, p2)
+    persister.redis_client.xadd(KEY_FINISHED, {
+        'game_id': 'not-a-uuid', 'status': 'completed', 'reason': 'move', 'winner_id': '',
+        'finished_at': 1700000000, 'player1_id': p1, 'player2_id': p2, 'x': b'', 'o': b'',
+    })
+
+    persister._persist(read(persister))
+
+    assert db.session.get(Game, uuid.UUID(good)).finished_at is not None
+    assert persister.redis_client.xpending(KEY_FINISHED, GROUP)['pending'] == 0
+    (_, fields), = persister.redis_client.xrange(KEY_FINISHED_DEAD)
+    assert fields[b'game_id'] == b'not-a-uuid' and b'error' in fields
+
+
+def test_run_backs_off_while_failing(persister, monkeypatch):
+    def down(*args, **kwargs):
+        raise ConnectionError("redis down")
+    monkeypatch.setattr(persister.redis_client, 'xautoclaim', down)
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 4:
+            persister.running = False
+    monkeypatch.setattr(persister_module.time, 'sleep', sleep)
+
+    persister.running = True
+    persister._run()
+    assert sleeps == [0.5, 1.0, 2.0, 4.0]
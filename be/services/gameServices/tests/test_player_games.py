@@ -0,0 +1,107 @@
+import uuid
+from datetime import datetime, timedelta
+
+import fakeredis
+import pytest
+from flask import Flask
+
+import extensions
+from extensions import db
+from db.models.game import Game
+from routes import MAX_RECENT_OFFSET, game_bp
+from state import redis_store
+
+
+@pytest.fixture
+def client(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis_store, '_redis', fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(extensions, '_event_bus', fakeredis.FakeRedis(server=server))
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    app.register_blueprint(game_bp)
+    with app.app_context():
+        db.create_all()
+        yield app.test_client()
+        db.drop_all()
+
+
+def add_game(p1, p2, status, **times):
+    game = Game(id=uuid.uuid4(), player1_id=p1, player2_id=p2, status=status, **times)
+    db.session.add(game)
+    db.session.commit()
+    return game
+
+
+def test_active_games_follow_redis_not_the_stale_row(client):
+    me, other = uuid.uuid4(), uuid.uuid4()
+    started = datetime(2024, 1, 1)
+    live = add_game(me, other, 'active', started_at=started)
+    newer = add_game(other, me, 'active', started_at=started + timedelta(minutes=1))
+    ended = add_game(me, other, 'active', started_at=started)  # Finished, row not written yet
+    redis_store.create_games([(str(g.id), str(g.player1_id), str(g.player2_id), {}) for g in (live, newer, ended)])
+    redis_store.finish_game(str(ended.id), 'completed', str(me))
+
+    games = client.get(f'/games/active/{me}').get_json()
+    assert [g['id'] for g in games] == [str(newer.id), str(live.id)]
+    assert {g['status'] for g in games} == {'active'}
+
+
+def test_active_games_empty_and_invalid(client):
+    assert client.get(f'/games/active/{uuid.uuid4()}').get_json() == []
+    assert client.get('/games/active/not-a-uuid').status_code == 400
+
+
+def test_recent_games_keyset_paging(client):
+    me = uuid.uuid4()
+    finished = datetime(2024, 1, 1)
+    games = [add_game(me if i % 2 else uuid.uuid4(), uuid.uuid4() if i % 2 else me, 'completed',
+                      finished_at=finished + timedelta(minutes=i // 2))
+             for i in range(7)]  # Pairs share a finished_at, so the id breaks ties
+    add_game(me, uuid.uuid4(), 'active', started_at=finished)
+    expected = [str(g.id) for g in sorted(games, key=lambda g: (g.finished_at, g.id.hex), reverse=True)]
+
+    seen, cursor = [], None
+    while True:
+        url = f'/games/recent/{me}?limit=3' + (f'&before={cursor}' if cursor else '')
+        response = client.get(url)
+        seen.extend(g['id'] for g in response.get_json())
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+    assert seen == expected
+
+    by_offset = client.get(f'/games/recent/{me}?limit=3&offset=3')
+    assert [g['id'] for g in by_offset.get_json()] == expected[3:6]
+    assert by_offset.headers['Deprecation'] == 'true'
+    assert 'Deprecation' not in response.headers
+    assert client.get(f'/games/recent/{me}?offset={MAX_RECENT_OFFSET}').status_code == 200
+    assert client.get(f'/games/recent/{me}?offset={MAX_RECENT_OFFSET + 1}').status_code == 400
+    assert client.get(f'/games/recent/{me}?before=garbage').status_code == 400
+
+
+def test_active_set_follows_start_and_finish(client):
+    assert client.get('/games/active/p1/exists').get_json() == {'active': False, 'game_ids': []}
+    redis_store.create_games([('g1', 'p1', 'p2', {}), ('g2', 'p1', 'p3', {}), ('w', 'p1', None, {})])
+
+    body = client.get('/games/active/p1/exists').get_json()
+    assert body['active'] and sorted(body['game_ids']) == ['g1', 'g2']  # Not the waiting game
+    assert client.get('/games/active/p2/exists').get_json() == {'active': True, 'game_ids': ['g1']}
+
+    redis_store.finish_game('g1', 'completed', 'p1')
+    assert client.get('/games/active/p1/exists').get_json() == {'active': True, 'game_ids': ['g2']}
+    assert client.get('/games/active/p2/exists').get_json() == {'active': False, 'game_ids': []}
+    assert redis_store.get_redis().scard(redis_store.KEY_USER_ACTIVE.format(user_id='p2')) == 0
+
+
+def test_stale_active_entries_are_dropped_on_read(client):
+    redis_store.create_games([('live', 'p1', 'p2', {}), ('ended', 'p1', 'p2', {})])
+    r = redis_store.get_redis()
+    key = redis_store.KEY_USER_ACTIVE.format(user_id='p1')
+    # Ended without releasing its players, and one whose state expired
+    r.hset('game:ended:state', 'status', 'completed')
+    r.sadd(key, 'expired')
+
+    assert client.get('/games/active/p1/exists').get_json() == {'active': True, 'game_ids': ['live']}
+    assert r.smembers(key) == {b'live'}
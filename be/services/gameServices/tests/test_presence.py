@@ -0,0 +1,25 @@
+import time
+
+import fakeredis
+
+from state import presence
+
+
+def test_online_reads_bucketed_presence():
+    r = fakeredis.FakeRedis()
+    now_ms = int(time.time() * 1000)
+    r.zadd(presence._presence_key('alive'), {'alive': now_ms + 30000})
+    r.zadd(presence._presence_key('expired'), {'expired': now_ms - 1000})
+
+    assert presence.online(r, ['alive', 'expired', 'never']) == {
+        'alive': True, 'expired': False, 'never': False,
+    }
+
+
+def test_legacy_set_only_counts_inside_migration_window():
+    r = fakeredis.FakeRedis()
+    r.sadd(presence.KEY_LEGACY_ONLINE, 'stale')
+
+    assert presence.online(r, ['stale'], legacy_until=time.time() + 60) == {'stale': True}
+    assert presence.online(r, ['stale'], legacy_until=time.time() - 60) == {'stale': False}
+    assert presence.online(r, ['stale'], legacy_until=0) == {'stale': False}
@@ -0,0 +1,59 @@
+import importlib
+import sys
+
+import fakeredis
+import pytest
+
+from config import Config
+from state import redis_store
+from state.scripts import ScriptRegistry, scripts
+
+
+@pytest.fixture
+def r():
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture
+def registry():
+    registry = ScriptRegistry()
+    registry.register('echo', "return ARGV[1]")
+    return registry
+
+
+def test_run_loads_a_missing_script_and_retries(r, registry):
+    sha = registry._shas['echo']
+    assert r.script_exists(sha) == [False]
+    assert registry.run(r, 'echo', [], ['hi']) == b'hi'
+    assert r.script_exists(sha) == [True]
+
+    r.script_flush()  # Redis restarted or failed over
+    assert registry.run(r, 'echo', [], ['again']) == b'again'
+
+
+def test_run_many_reloads_once_for_the_batch(r, registry):
+    calls = [([], [str(n)]) for n in range(3)]
+    assert registry.run_many(r, 'echo', calls) == [b'0', b'1', b'2']
+    r.script_flush()
+    assert registry.run_many(r, 'echo', calls) == [b'0', b'1', b'2']
+
+
+def test_script_errors_are_raised_not_retried(r):
+    registry = ScriptRegistry()
+    registry.register('boom', "return redis.error_reply('BOOM')")
+    registry.load_all(r)
+    with pytest.raises(Exception, match='BOOM'):
+        registry.run(r, 'boom', [])
+    with pytest.raises(Exception, match='BOOM'):
+        registry.run_many(r, 'boom', [([], [])])
+
+
+def test_create_app_preloads_every_registered_script(r, monkeypatch):
+    monkeypatch.setattr(redis_store, '_redis', r)
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', 'sqlite://')
+    monkeypatch.delitem(sys.modules, 'main', raising=False)
+    main = importlib.import_module('main')
+
+    r.script_flush()
+    main.create_app()
+    assert scripts._shas and all(r.script_exists(*scripts._shas.values()))
@@ -0,0 +1,112 @@
+import json
+import time
+
+import pytest
+
+from state import bitboard, redis_store
+
+CELLS = bitboard.CELL_COUNT
+
+
+def legacy_game(game_id, settings=None, moves=(), ttl=3600, **overrides):
+    """Store a game as the JSON blob written before the hash layout."""
+    board = [None] * CELLS
+    for i, cell in enumerate(moves):
+        board[cell] = 'XO'[i % 2]
+    now = int(time.time())
+    state = {
+        'player1_id': 'p1', 'player2_id': 'p2',
+        'current_player_id': 'p1' if len(moves) % 2 == 0 else 'p2',
+        'board': board, 'status': 'active', 'winner_id': None, 'winning_line': None,
+        'move_seq': len(moves), 'settings': settings or {},
+        'p1_time': 200, 'p2_time': 190, 'last_move_time': now,
+        'created_at': now - 60, 'started_at': now - 60, 'updated_at': now,
+    }
+    state.update(overrides)
+    redis_store.get_redis().set(f'game:{game_id}:state', json.dumps(state), ex=ttl)
+    return state
+
+
+def stored(game_id, *fields):
+    return redis_store.get_redis().hmget(f'game:{game_id}:state', fields)
+
+
+def test_get_fields_migrates_a_legacy_blob(lua_store):
+    legacy_game('g', moves=(0, 14, 168))
+    state = redis_store.get_fields('g', ('status', 'current_player_id', 'move_seq', 'p1_time', 'p2_time', 'board'))
+
+    r = redis_store.get_redis()
+    assert r.type('game:g:state') == b'hash'
+    assert 3500 < r.ttl('game:g:state') <= 3600
+    assert state['status'] == 'active' and state['current_player_id'] == 'p2'
+    assert (state['move_seq'], state['p1_time'], state['p2_time']) == (3, 200, 190)
+    assert state['board'][0] == state['board'][168] == 'X' and state['board'][14] == 'O'
+    assert state['board'].count(None) == CELLS - 3
+
+
+def test_legacy_blob_without_ttl_stays_persistent(lua_store):
+    legacy_game('g', ttl=None)
+    assert redis_store.get_fields('g', ('status',)) == {'status': 'active'}
+    assert redis_store.get_redis().ttl('game:g:state') == -1
+
+
+def test_get_fields_many_falls_back_per_legacy_game(lua_store):
+    legacy_game('old', moves=(5,))
+    redis_store.create_game('new', 'p3', 'p4')
+    states = redis_store.get_fields_many(['old', 'new', 'missing'], ('player1_id', 'move_seq', 'board'))
+
+    assert states['missing'] is None
+    assert (states['old']['player1_id'], states['old']['move_seq']) == ('p1', 1)
+    assert states['old']['board'][5] == 'X'
+    assert (states['new']['player1_id'], states['new']['move_seq']) == ('p3', 0)
+    assert redis_store.get_redis().type('game:old:state') == b'hash'
+
+
+def test_move_on_a_legacy_blob_migrates_it_first(lua_store):
+    legacy_game('g', settings={'timer': {'initial': 300}}, moves=(0, 14))
+    result = redis_store.apply_move('g', 'p1', 1, include_board=True)
+
+    assert result['success'], result
+    state = result['state']
+    assert state['move_seq'] == 3 and state['current_player_id'] == 'p2'
+    assert state['board'][0] == state['board'][1] == 'X' and state['board'][14] == 'O'
+    assert state['board'].count(None) == CELLS - 3
+    assert state['settings'] == {'timer': {'initial': 300}}
+    assert 195 <= state['p1_time'] <= 200  # No increment configured
+    assert stored('g', 'timer_initial', 'timer_increment') == [b'300', b'0']
+    assert redis_store.get_redis().ttl('game:g:state') > 3600  # Refreshed by the move
+
+
+def test_move_rules_still_apply_after_migration(lua_store):
+    legacy_game('g', moves=(0,))
+    assert not redis_store.apply_move('g', 'p1', 2)['success']  # Not p1's turn
+    assert not redis_store.apply_move('g', 'p2', 0)['success']  # Occupied
+    assert redis_store.apply_move('g', 'p2', 2)['success']
+
+
+@pytest.mark.parametrize('settings, expected', [
+    (None, (b'120', b'5')),
+    ({}, (b'120', b'5')),
+    ({'timer': {'initial': 60}}, (b'60', b'0')),
+    ({'timer': {'initial': 60, 'increment': 2}}, (b'60', b'2')),
+])
+def test_timer_defaults_match_on_create_and_migration(lua_store, settings, expected):
+    redis_store.create_game('new', 'p1', 'p2', settings)
+    legacy_game('old', settings=settings)
+    redis_store.get_fields('old', ('status',))
+
+    assert tuple(stored('new', 'timer_initial', 'timer_increment')) == expected
+    assert tuple(stored('old', 'timer_initial', 'timer_increment')) == expected
+
+
+def test_backfill_indexes_unindexed_active_games(lua_store):
+    legacy_game('old')
+    legacy_game('done', status='completed')
+    redis_store.create_game('new', 'p3', 'p4')
+
+    assert redis_store.backfill_deadlines() == 1
+    assert redis_store.get_deadline('old') == redis_store.move_deadline(
+        redis_store.get_fields('old', ('last_move_time',))['last_move_time'], 200)
+    assert redis_store.get_deadline('done') is None
+    assert redis_store.active_games_for_user('p1') == ['old']
+    assert redis_store.backfill_deadlines() == 0  # Idempotent
@@ -0,0 +1,79 @@
+import json
+import time
+
+import fakeredis
+import pytest
+
+import timeout_manager
+from state import presence, redis_store
+from timeout_manager import TimeoutManager
+
+
+def test_end_games_rejects_unknown_reasons():
+    manager = TimeoutManager.__new__(TimeoutManager)
+    with pytest.raises(ValueError):
+        manager._end_games([('g1', {'player1_id': 'a', 'player2_id': 'b', 'current_player_id': 'a'})], 'resigned')
+
+
+@pytest.fixture
+def manager(lua_store, monkeypatch):
+    bus = fakeredis.FakeRedis()
+    monkeypatch.setattr(timeout_manager, 'ABANDON_BATCH_SIZE', 2)
+    manager = TimeoutManager.__new__(TimeoutManager)
+    manager.event_bus = bus
+    manager.shards = set(range(redis_store.DEADLINE_SHARDS))
+    return manager
+
+
+def set_online(bus, *user_ids):
+    expires_ms = int((time.time() + 30) * 1000)
+    for user_id in user_ids:
+        bus.zadd(presence._presence_key(user_id), {user_id: expires_ms})
+
+
+def test_abandonment_sweep_over_a_mixed_batch(manager, monkeypatch):
+    games = {
+        'both-offline': ('a1', 'a2'),
+        'one-online': ('b1', 'b2'),
+        'both-online': ('c1', 'c2'),
+        'finished': ('d1', 'd2'),        # Still indexed, but already over
+        'finished-meanwhile': ('e1', 'e2'),  # A move ends it during the sweep
+        'also-offline': ('f1', 'f2'),
+    }
+    redis_store.create_games([(game_id, p1, p2, {}) for game_id, (p1, p2) in games.items()])
+    r = redis_store.get_redis()
+    deadline_key = redis_store._deadline_key('finished')
+    deadline = r.zscore(deadline_key, 'finished')
+    redis_store.finish_game('finished', 'completed', 'd1')
+    r.zadd(deadline_key, {'finished': deadline})
+    set_online(manager.event_bus, 'b1', 'c1', 'c2')
+
+    checked = []
+    online = presence.online
+
+    def racing_online(bus, user_ids):
+        checked.extend(user_ids)
+        if 'e1' in user_ids:
+            redis_store.finish_game('finished-meanwhile', 'completed', 'e1')
+        return online(bus, user_ids)
+
+    monkeypatch.setattr(presence, 'online', racing_online)
+    pubsub = manager.event_bus.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe('game_updates')
+    manager._check_abandoned()
+
+    statuses = {game_id: redis_store.get_fields(game_id, ('status',))['status'] for game_id in games}
+    assert statuses == {
+        'both-offline': 'abandoned', 'one-online': 'active', 'both-online': 'active',
+        'finished': 'completed', 'finished-meanwhile': 'completed', 'also-offline': 'abandoned',
+    }
+    assert 'e1' in checked and 'd1' not in checked and 'd2' not in checked
+    over = []
+    for _ in range(20):
+        message = pubsub.get_message(timeout=0.01)
+        if message:
+            over.append(json.loads(message['data']))
+    assert sorted(m['room'] for m in over) == ['game_also-offline', 'game_both-offline']
+    assert {m['event'] for m in over} == {'game_over'}
+    assert redis_store.active_games_for_user('a1') == []
+    assert redis_store.active_games_for_user('b1') == ['one-online']
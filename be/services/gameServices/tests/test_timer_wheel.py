@@ -0,0 +1,69 @@
+import random
+
+from timer_wheel import TimerWheel
+
+
+def run(wheel, start, end, step=0.1):
+    """{key: time it fired} while advancing the wheel from ``start`` to ``end`` in ``step``s."""
+    fired = {}
+    for n in range(1, round((end - start) / step) + 1):
+        t = round(start + n * step, 6)
+        for key in wheel.advance(t):
+            fired[key] = t
+    return fired
+
+
+def test_fires_at_the_deadline_tick():
+    wheel = TimerWheel(tick=0.1, slots=8, levels=3, now=100.0)
+    wheel.schedule('a', 100.35)
+    assert wheel.advance(100.3) == []
+    assert wheel.advance(100.4) == ['a']
+    assert 'a' not in wheel and len(wheel) == 0
+
+
+def test_past_deadline_fires_on_next_advance():
+    wheel = TimerWheel(tick=0.1, now=50.0)
+    wheel.schedule('late', 49.0)
+    assert wheel.advance(50.0) == ['late']
+
+
+def test_reschedule_and_cancel():
+    wheel = TimerWheel(tick=0.1, slots=8, levels=3, now=0.0)
+    wheel.schedule('a', 1.0)
+    wheel.schedule('a', 3.0)  # Moved: the old entry is dropped when it comes up
+    wheel.schedule('b', 2.0)
+    wheel.cancel('b')
+    fired = run(wheel, 0.0, 5.0)
+    assert fired == {'a': 3.0}
+
+
+def test_far_timers_cascade_down_the_levels():
+    wheel = TimerWheel(tick=1.0, slots=4, levels=3, now=0.0)
+    deadlines = {f"k{i}": float(i) for i in range(1, 70)}  # Past the 64-tick span of 3 levels
+    for key, deadline in deadlines.items():
+        wheel.schedule(key, deadline)
+    fired = run(wheel, 0.0, 80.0, step=1.0)
+    assert fired == deadlines
+
+
+def test_matches_a_sorted_schedule():
+    rng = random.Random(7)
+    wheel = TimerWheel(tick=0.1, slots=16, levels=3, now=1000.0)
+    expected = {}
+    for i in range(500):
+        deadline = 1000.0 + rng.uniform(0, 600)
+        wheel.schedule(i, deadline)
+        expected[i] = deadline
+    for i in rng.sample(range(500), 100):
+        if rng.random() < 0.5:
+            wheel.cancel(i)
+            del expected[i]
+        else:
+            expected[i] = 1000.0 + rng.uniform(0, 600)
+            wheel.schedule(i, expected[i])
+
+    fired = run(wheel, 1000.0, 1700.0, step=0.5)
+    assert set(fired) == set(expected)
+    for key, at in fired.items():
+        # On the first advance that reaches the deadline's tick
+        assert expected[key] - 1e-6 <= at < expected[key] + 0.5 + wheel.tick
@@ -1,154 +1,201 @@
+import atexit
 import threading
 import time
 import logging
 import json
-import redis
 import requests
 from config import Config
-from state.redis_store import get_redis, _key, KEY_STATE, GAME_TTL_SECONDS
-from extensions import db
-from db.models.game import Game
-from datetime import datetime
-import uuid
+from state.redis_store import (
+    STATE_FIELDS, get_redis, get_fields, get_fields_many, finish_games,
+    deadline_shard, get_deadline, due_deadlines, active_game_ids, backfill_deadlines,
+)
+from state.leases import ShardLeases
+from state import presence
+from timer_wheel import TimerWheel
+from extensions import get_event_bus
 
 logger = logging.getLogger("TimeoutManager")
 
+TICK_SECONDS = 0.1        # Timer wheel resolution
+LOAD_INTERVAL = 1.0       # How often the deadline index is polled
+LOOKAHEAD_SECONDS = 2.0   # Deadlines pulled into the wheel ahead of time
+ABANDON_INTERVAL = 10.0   # How often active games are checked for abandonment
+ABANDON_BATCH_SIZE = 500  # Games per presence check round trip
+LEASE_REFRESH_INTERVAL = 2.0  # Heartbeat/renew well inside the lease TTL
+
 class TimeoutManager:
+    """
+    Ends games whose player to move ran out of time, and games both players
+    have left.
+
+    Deadlines live in the sharded ``games:deadlines:{shard}`` sorted sets
+    maintained by the state store, and each replica only works the shards it
+    holds a lease on (see ``state/leases.py``). Once a second the manager
+    pulls the deadlines expiring within the lookahead into a hierarchical
+    timer wheel, and the wheel fires each game at its deadline (to the
+    nearest tick). Ending a game is a compare-and-set in Redis, so a move
+    that landed first or another replica that got there first wins and this
+    one neither publishes nor writes to the DB.
+    """
+
     def __init__(self, app):
         self.app = app
         self.running = False
         self.redis_client = get_redis()
-        self.event_bus = redis.from_url(Config.EVENT_BUS_REDIS_URL)
+        self.event_bus = get_event_bus()
+        self.wheel = TimerWheel(tick=TICK_SECONDS, now=time.time())
+        self.leases = ShardLeases()
+        self.shards = set()
 
     def start(self):
         self.running = True
+        atexit.register(self.stop)
         thread = threading.Thread(target=self._monitor_loop)
         thread.daemon = True
         thread.start()
-        logger.info("TimeoutManager thread started.")
+        logger.info(f"TimeoutManager thread started as {self.leases.node_id}.")
+
+    def stop(self):
+        self.running = False
+        try:
+            self.leases.release_all()
+        except Exception as e:
+            logger.error(f"Error releasing timeout shard leases: {e}")
 
     def _monitor_loop(self):
+        try:
+            added = backfill_deadlines()
+            if added:
+                logger.info(f"Indexed deadlines for {added} games created before the deadline index.")
+        except Exception as e:
+            logger.error(f"Error backfilling game deadlines: {e}")
+
+        next_lease = next_load = next_abandon_check = 0.0
         while self.running:
+            now = time.time()
             with self.app.app_context():
                 try:
-                    self._check_timeouts()
+                    if now >= next_lease:
+                        self._refresh_leases()
+                        next_lease = now + LEASE_REFRESH_INTERVAL
+                    if now >= next_load:
+                        self._load_due(now)
+                        next_load = now + LOAD_INTERVAL
+                    for game_id in self.wheel.advance(now):
+                        self._fire(game_id)
+                    if now >= next_abandon_check:
+                        self._check_abandoned()
+                        next_abandon_check = now + ABANDON_INTERVAL
                 except Exception as e:
                     logger.error(f"Error in timeout monitor loop: {e}")
-            
-            time.sleep(2) # Check every 2 seconds
-
-    def _check_timeouts(self):
-        # Scan for active games
-        # Using SCAN based on KEY_STATE pattern "game:*:state"
-        # Note: keys() is blocking, scan_iter is better but for high volume
-        # For this prototype, we likely don't have millions of keys.
-        
-        # We need to find all game keys.
-        # Pattern: game:*:state
-        
-        cursor = '0'
-        while cursor != 0:
-            cursor, keys = self.redis_client.scan(cursor=cursor, match="game:*:state", count=100)
-            for key in keys:
-                self._process_game(key)
-
-    def _process_game(self, key):
-        state_raw = self.redis_client.get(key)
-        if not state_raw:
-            return
 
-        try:
-            state = json.loads(state_raw)
-        except json.JSONDecodeError:
-            return
+            time.sleep(TICK_SECONDS)
 
-        if state.get('status') != 'active':
+    def _refresh_leases(self):
+        shards = self.leases.refresh()
+        if shards != self.shards:
+            logger.info(f"Timeout shards now {sorted(shards)}")
+            self.shards = shards
+
+    def _load_due(self, now):
+        for shard in self.shards:
+            for game_id, deadline in due_deadlines(shard, now + LOOKAHEAD_SECONDS):
+                self.wheel.schedule(game_id, deadline)
+
+    def _fire(self, game_id):
+        if deadline_shard(game_id) not in self.shards:
+            return  # Shard handed to another replica since it was scheduled
+        # The wheel only knows the deadline as of the last load; the index is
+        # the source of truth.
+        deadline = get_deadline(game_id)
+        if deadline is None:
+            return  # Finished since it was scheduled
+        if deadline > time.time():
+            self.wheel.schedule(game_id, deadline)
             return
 
-        # 1. Check Connection Status (Abandon)
-        # We need to know who is online.
-        # This information is in the WebSocket Gateway's Redis Set 'online_users'
-        # BUT this manager is in Game Service. We need access to the same Redis instance or logic.
-        # Assuming WS and Game use same Redis or can access the one with 'online_users'.
-        # Config currently has REDIS_URL and EVENT_BUS_REDIS_URL.
-        # online_users is likely in EVENT_BUS_REDIS_URL based on Gateway config?
-        # Let's check Gateway config: REDIS_URL = redis://localhost:6382/0 (Event Bus usually)
-        # Game Service EVENT_BUS_REDIS_URL = redis://localhost:6382/0
-        
-        # The key in Gateway is 'online_users'.
-        
-        # Check if both players are present in 'online_users' set
-        # Since we are using redis-py, sismember returns boolean
-        # using event_bus client which connects to 6382 where Gateway stores online_users (presumably)
-        # Wait, Gateway config uses REDIS_URL for both pubsub and storage? 
-        # Gateway main.py: redis_listener uses Config.REDIS_URL.
-        # Gateway events.py uses redis.from_url(Config.REDIS_URL).
-        
-        # So yes, we should check self.event_bus for 'online_users'.
-        
-        p1 = state.get('player1_id')
-        p2 = state.get('player2_id')
-        
-        if p1 and p2:
-            p1_online = self.event_bus.sismember('online_users', p1)
-            p2_online = self.event_bus.sismember('online_users', p2)
-            
-            if not p1_online and not p2_online:
-                logger.info(f"Game {key} abandoned (both players offline).")
-                self._end_game(state, key, reason='abandoned')
-                return
-
-        # 2. Check Timeouts
-        last_move_time = state.get('updated_at', state.get('started_at'))
-        if not last_move_time:
+        state = get_fields(game_id, ('status', 'player1_id', 'player2_id', 'current_player_id'))
+        if not state or state.get('status') != 'active':
             return
+        if self._end_game(state, game_id, reason='timeout'):
+            logger.info(f"Game {game_id} timed out. Current player {state.get('current_player_id')} took too long.")
+
+    def _check_abandoned(self):
+        # Only games in the deadline index are active; finished games waiting
+        # out their TTL are never looked at. Each ZSCAN window costs one HMGET
+        # pipeline, one presence pipeline and (if anything was abandoned) one write
+        # pipeline, however many games it holds.
+        for game_ids in (ids for shard in list(self.shards)
+                         for ids in active_game_ids(shard, batch_size=ABANDON_BATCH_SIZE)):
+            states = get_fields_many(game_ids, ('status', 'player1_id', 'player2_id', 'current_player_id'))
+            candidates = [
+                (game_id, state) for game_id, state in states.items()
+                if state and state.get('status') == 'active'
+                and state.get('player1_id') and state.get('player2_id')
+            ]
+            if not candidates:
+                continue
+
+            # Presence is kept by the WebSocket Gateway on the event bus Redis.
+            players = list({p for _, state in candidates for p in (state['player1_id'], state['player2_id'])})
+            online = presence.online(self.event_bus, players)
+
+            abandoned = [
+                (game_id, state) for game_id, state in candidates
+                if not online[state['player1_id']] and not online[state['player2_id']]
+            ]
+            if abandoned:
+                for game_id in self._end_games(abandoned, reason='abandoned'):
+                    logger.info(f"Game {game_id} abandoned (both players offline).")
+
+    def _end_game(self, state, game_id, reason):
+        return bool(self._end_games([(game_id, state)], reason=reason))
+
+    def _end_games(self, ended, reason):
+        """
+        End ``(game_id, state)`` games for ``reason`` with one Redis write and
+        one publish pipeline, and return the ids actually ended. Games that a move or another
+        replica finished first are skipped.
+        """
+        results = []
+        for game_id, state in ended:
+            if reason == 'abandoned':
+                status = 'abandoned'
+                winner_id = None
+
+            elif reason == 'timeout':
+                status = 'completed'
+                current_player = state['current_player_id']
+                # Winner is the OTHER player
+                winner_id = state['player1_id'] if current_player == state['player2_id'] else state['player2_id']
+
+            else:
+                raise ValueError(f"Unknown end reason {reason!r}")
+
+            # Time out has no line
+            results.append((game_id, status, winner_id, []))
+
+        # Persist to Redis; only the games we transitioned are ours to report.
+        # A timeout additionally requires the deadline to still be in the past.
+        # The DB row is written by the persister from the finished stream.
+        ended_ids = finish_games(results, only_if_due=(reason == 'timeout'))
+        if not ended_ids:
+            return []
+        final_states = get_fields_many(ended_ids, STATE_FIELDS + ('board',))
 
-        current_time = int(time.time())
-        time_diff = current_time - last_move_time
-        
-        # Limit 35s (30s move + 5s grace/latency)
-        if time_diff > 35:
-            current_player = state.get('current_player_id')
-            logger.info(f"Game {key} timed out. Current player {current_player} took too long.")
-            
-            self._end_game(state, key, reason='timeout')
-
-    def _end_game(self, state, key, reason):
-        game_id = key.split(':')[1]
-        
-        if reason == 'abandoned':
-             state['status'] = 'abandoned'
-             state['winner_id'] = None
-             state['winning_line'] = []
-        
-        elif reason == 'timeout':
-            state['status'] = 'completed'
-            current_player = state['current_player_id']
-            # Winner is the OTHER player
-            winner_id = state['player1_id'] if current_player == state['player2_id'] else state['player2_id']
-            state['winner_id'] = winner_id
-            state['winning_line'] = [] # Time out has no line
-        
-        # Persist to Redis
-        self.redis_client.setex(key, GAME_TTL_SECONDS, json.dumps(state))
-        
-        # Update DB
-        game = Game.query.get(game_id)
-        if game:
-            game.status = state['status']
-            game.finished_at = datetime.utcnow()
-            game.final_board_state = state['board']
-            if state.get('winner_id'):
-                game.winner_id = uuid.UUID(state['winner_id'])
-            db.session.commit()
-            
         # Notify via Pub/Sub
-        self._publish_update(game_id, 'game_over', state)
+        pipe = self.event_bus.pipeline(transaction=False)
+        for game_id, state in final_states.items():
+            if state:
+                self._publish_update(game_id, 'game_over', state, client=pipe)
+        pipe.execute()
+        return ended_ids
 
-    def _publish_update(self, game_id, event_type, data):
+    def _publish_update(self, game_id, event_type, data, client=None):
         message = {
             'event': event_type,
             'data': data,
-            'room': f"game_{game_id}"
+            'room': f"game_{game_id}",
+            'published_at': time.time(),
         }
-        self.event_bus.publish('game_updates', json.dumps(message))
+        (client or self.event_bus).publish('game_updates', json.dumps(message))
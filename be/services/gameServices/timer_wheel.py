@@ -0,0 +1,98 @@
+import math
+
+
+class TimerWheel:
+    """
+    Hierarchical timing wheel.
+
+    Level 0 has ``slots`` buckets of ``tick`` seconds each; every higher level
+    has the same number of buckets, each spanning one full revolution of the
+    level below. A timer sits in the coarsest bucket that still tells it apart
+    from "now" and cascades down as its time approaches, so scheduling is O(1)
+    and advancing one tick only touches the bucket that is due.
+
+    Rescheduling a key does not search for its old entry: every entry carries
+    the due tick it was placed for and is dropped when its bucket comes up if
+    the key has since been rescheduled or cancelled.
+    """
+
+    def __init__(self, tick=0.1, slots=64, levels=4, now=0.0):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self._wheels = [[set() for _ in range(slots)] for _ in range(levels)]
+        self._due = {}  # key -> due tick it is currently scheduled for
+        self._expired = set()  # Scheduled with a deadline already passed
+        self._current = int(now / tick)
+
+    def __len__(self):
+        return len(self._due)
+
+    def __contains__(self, key):
+        return key in self._due
+
+    def schedule(self, key, deadline):
+        """(Re)schedule ``key`` to fire once ``deadline`` (epoch seconds) has passed."""
+        due_tick = math.ceil(deadline / self.tick)
+        if self._due.get(key) == due_tick:
+            return
+        self._due[key] = due_tick
+        self._place(key, due_tick)
+
+    def cancel(self, key):
+        self._due.pop(key, None)
+
+    def advance(self, now):
+        """Move the wheel forward to ``now`` and return the keys that came due."""
+        fired = []
+        for key, due_tick in self._expired:
+            if self._due.get(key) == due_tick:
+                del self._due[key]
+                fired.append(key)
+        self._expired.clear()
+
+        target = int(now / self.tick)
+        while self._current < target:
+            self._current += 1
+            # Cascade coarse buckets whose span starts at this tick, highest
+            # level first so entries can fall through more than one level.
+            for level in range(self.levels - 1, 0, -1):
+                span = self.slots ** level
+                if self._current % span == 0:
+                    bucket = self._wheels[level][(self._current // span) % self.slots]
+                    entries = list(bucket)
+                    bucket.clear()
+                    for key, due_tick in entries:
+                        if self._due.get(key) != due_tick:
+                            continue
+                        if due_tick == self._current:
+                            # Due this very tick: the level-0 pass below fires it.
+                            self._wheels[0][self._current % self.slots].add((key, due_tick))
+                        else:
+                            self._place(key, due_tick)
+
+            bucket = self._wheels[0][self._current % self.slots]
+            entries = list(bucket)
+            bucket.clear()
+            for key, due_tick in entries:
+                if self._due.get(key) != due_tick:
+                    continue  # Rescheduled or cancelled since it was placed
+                if due_tick > self._current:
+                    self._place(key, due_tick)  # Clamped beyond the top level
+                    continue
+                del self._due[key]
+                fired.append(key)
+        return fired
+
+    def _place(self, key, due_tick):
+        if due_tick <= self._current:
+            self._expired.add((key, due_tick))
+            return
+        # Lowest level whose parent block holds both "now" and the due tick;
+        # anything coarser would sit in a bucket that already cascaded.
+        for level in range(self.levels):
+            parent = self.slots ** (level + 1)
+            if due_tick // parent == self._current // parent or level == self.levels - 1:
+                index = (due_tick // self.slots ** level) % self.slots
+                self._wheels[level][index].add((key, due_tick))
+                return
@@ -11,3 +11,23 @@ class Config:
     GAME_SERVICE_URL = os.environ.get('GAME_SERVICE_URL', 'http://localhost:5002')
     WS_GATEWAY_URL = os.environ.get('WS_GATEWAY_URL', 'http://localhost:5005')
     EVENT_BUS_REDIS_URL = os.environ.get('EVENT_BUS_REDIS_URL', 'redis://localhost:6382/0')
+    # Pairing: 'immediate' (match each entrant on join, the default), or
+    # opt in to a batch pass over the queue every MATCH_TICK_SECONDS with
+    # 'greedy' or 'max_weight'. A batch strategy turns off on-join matching:
+    # entrants wait for the next tick, in exchange for better-balanced pairs.
+    MATCH_STRATEGY = os.environ.get('MATCH_STRATEGY', 'immediate')
+    MATCH_NEIGHBOURS = int(os.environ.get('MATCH_NEIGHBOURS', 4))
+    MATCH_TICK_SECONDS = float(os.environ.get('MATCH_TICK_SECONDS', 1.0))
+    # ELO window widening while queued: "seconds:extra_elo" steps, applied to
+    # both ends of the player's range and to the max ELO gap. Queues with
+    # fewer than ELO_WINDOW_DEPTH_REFERENCE players move through the schedule
+    # up to ELO_WINDOW_MAX_DEPTH_FACTOR times faster.
+    ELO_WINDOW_SCHEDULE = os.environ.get('ELO_WINDOW_SCHEDULE', '0:0,15:50,30:100,60:200,120:400')
+    ELO_WINDOW_DEPTH_REFERENCE = int(os.environ.get('ELO_WINDOW_DEPTH_REFERENCE', 50))
+    ELO_WINDOW_MAX_DEPTH_FACTOR = float(os.environ.get('ELO_WINDOW_MAX_DEPTH_FACTOR', 3.0))
+    # Matcher placement: in the API process (python main.py) or in worker.py.
+    # Workers lease speed buckets; MATCH_SPEEDS (comma-separated) pins a
+    # worker to those speeds instead of balancing them across workers.
+    MATCHER_EMBEDDED = os.environ.get('MATCHER_EMBEDDED', 'true').lower() in ('1', 'true', 'yes')
+    MATCH_SPEEDS = [s.strip().lower() for s in os.environ.get('MATCH_SPEEDS', '').split(',') if s.strip()]
+    MATCH_LEASE_TTL_MS = int(os.environ.get('MATCH_LEASE_TTL_MS', 10000))
@@ -0,0 +1,30 @@
+"""
+Speed-bucket ownership for matcher workers.
+
+Each game speed's queue is worked by one matcher at a time: the worker holds
+a lease, ``mmq:lease:{speed}``, heartbeats into ``mmq:workers`` and aims for
+ceil(speeds / live workers) leases. The lease logic is shared with the game
+service's timeout manager (``shared_leases``, be/services/shared).
+
+MATCH_SPEEDS pins a worker to a fixed set of speeds instead (static
+sharding); it then takes every one of those whose lease is free, and does
+not heartbeat, so the balancing workers split every speed between them.
+
+Leases only keep workers from doing the same work twice; claiming a pair is
+atomic in Redis regardless (see queue_store.claim_pair).
+"""
+from shared_leases.leases import Leases
+
+import queue_store
+from queue_store import get_queue_redis
+
+KEY_WORKERS = "mmq:workers"
+KEY_LEASE = "mmq:lease:{speed}"
+
+
+class SpeedLeases(Leases):
+    def __init__(self, ttl_ms=10000, speeds=None):
+        super().__init__(
+            get_queue_redis(), KEY_WORKERS, lambda speed: KEY_LEASE.format(speed=speed),
+            items=queue_store.speeds, ttl_ms=ttl_ms, pinned=speeds, name="matcher speed",
+        )
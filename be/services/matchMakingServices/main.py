@@ -30,10 +30,6 @@ def create_app(config_class=Config):
 
 app = create_app()
 
-# Initialize and start Matcher
-# We need to do this efficiently. In production, might want a separate worker process.
-# For this setup, a background thread in the app process is fine.
-matcher = Matcher(app)
 
 def check_schema(app):
     """
@@ -58,8 +54,12 @@ if __name__ == '__main__':
     # Fix schema just in case
     check_schema(app)
 
-    # Start matcher thread
-    matcher.start()
+    # Matcher and mirror in this process for local runs; deployments run
+    # them in worker.py (MATCHER_EMBEDDED=false) so the API only serves HTTP.
+    if Config.MATCHER_EMBEDDED:
+        from mirror import QueueMirror
+        Matcher(app).start()
+        QueueMirror(app).start()
     
     app.run(host='0.0.0.0', port=Config.PORT)
 
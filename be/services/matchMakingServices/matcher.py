@@ -4,139 +4,486 @@ import logging
 import requests
 import redis
 import json
+from datetime import datetime, timezone
 from config import Config
-from extensions import db
 from db.models.queue import MatchQueue
+from queue_index import QueueIndex, WindowSchedule
+from pairing import get_strategy, match_quality
+import queue_store
+from queue_store import QUEUE_EVENTS_KEY, get_queue_redis
 
 logger = logging.getLogger("Matcher")
 
+EVENT_BLOCK_MS = 1000
+CLAIM_ATTEMPTS = 3
+CREATE_RETRY_DELAY = 1.0  # Pause pending creations after a failed one
+BULK_CREATE_SIZE = 500  # Game service's MAX_BULK_GAMES
+BULK_CREATE_TIMEOUT = 10
+CREATE_MAX_ATTEMPTS = 5  # Unanswered creations before checking for the game directly
+STATUS_MIN_INTERVAL = 1.0  # At most one queue_status per waiting player per second
+WAIT_EWMA_ALPHA = 0.2  # Weight of each newly matched player in the wait estimate
+LEASE_REFRESH_INTERVAL = 2.0
+
+# Map speed to time settings (Chess style: initial + increment)
+# speed: 'blitz' (30s+3s), 'standard' (2m+5s), 'extended' (5m+10s)
+TIME_MAP = {
+    'blitz': {'initial': 30, 'increment': 3, 'label': '30s + 3s'},
+    'standard': {'initial': 120, 'increment': 5, 'label': '2m + 5s'},
+    'extended': {'initial': 300, 'increment': 10, 'label': '5m + 10s'}
+}
+
+def game_settings(speed):
+    speed = speed or 'standard'
+    timer_settings = TIME_MAP.get(speed, {'initial': 120, 'increment': 5, 'label': '2m + 5s'})
+    return {
+        "speed": speed,
+        "timer": timer_settings,
+        "timePerMove": timer_settings['label'], # Keep for backward compatibility if needed
+        "eloStakes": 24
+    }
+
+def pair_key(p1, p2):
+    """
+    Idempotency key for a claimed pair's game. Stable across retries and
+    unique per claim: a player can only be claimed once per queue entry.
+    """
+    return f"{p1.user_id}:{p1.joined_at!r}:{p2.user_id}:{p2.joined_at!r}"
+
 class Matcher:
-    def __init__(self, app):
+    """
+    Event-driven matcher.
+
+    The queue itself lives in Redis (``queue_store``). Each matcher keeps an
+    in-memory copy (``QueueIndex``: per-speed, ELO-sorted), loaded once at
+    startup and then kept current from the queue event stream. Each entrant
+    is matched the moment its join event arrives by searching only its own
+    ELO window; players that find nobody stay indexed and are found by later
+    entrants. Any number of matchers can run: a pair is only matched by
+    whichever one wins the atomic claim in Redis.
+
+    With a pairing strategy (``pairing.py``, Config.MATCH_STRATEGY) joins are
+    only indexed, and every MATCH_TICK_SECONDS the strategy pairs each speed's
+    whole queue at once instead, which finds pairings the greedy
+    first-come search misses.
+
+    ELO windows widen with wait time (``WindowSchedule``), so the tick also
+    re-searches for players who have waited long enough to widen since their
+    last search.
+
+    With ``leases`` (``SpeedLeases``, as worker.py runs it) the matcher only
+    pairs the speeds it holds a lease on; without, it pairs every speed.
+    The index always follows every speed, so a lease taken over from another
+    worker is ready to work straight away.
+    """
+
+    def __init__(self, app, strategy=None, leases=None):
         self.app = app
+        self.leases = leases
+        self.next_lease_refresh = 0.0
         self.running = False
-        self.redis_client = redis.from_url(Config.REDIS_URL)
+        self.redis_client = get_queue_redis()
         self.event_bus = redis.from_url(Config.EVENT_BUS_REDIS_URL)
+        self.notify_pipe = self.event_bus.pipeline(transaction=False)
+        # Kept-alive connections to the game service
+        self.game_service = requests.Session()
+        self.pending = []  # (p1, p2, claimed_at) pairs waiting for their games
+        self.next_flush = 0.0  # Creations wait until then after a failure
+        self.create_attempts = {}  # pair_key -> failed creation attempts
+        self.wait_estimate = {}  # speed -> smoothed wait at match (seconds)
+        self.status_sent = {}  # user_id -> (sent_at, what was sent)
+        self.index = QueueIndex(WindowSchedule.parse(
+            Config.ELO_WINDOW_SCHEDULE,
+            depth_reference=Config.ELO_WINDOW_DEPTH_REFERENCE,
+            max_depth_factor=Config.ELO_WINDOW_MAX_DEPTH_FACTOR,
+        ))
+        self.last_event_id = '0-0'
+        self.strategy = strategy if strategy is not None else get_strategy(Config.MATCH_STRATEGY, k=Config.MATCH_NEIGHBOURS)
+        self.tick = Config.MATCH_TICK_SECONDS
+        self.next_pass = 0.0
 
     def start(self):
         self.running = True
-        thread = threading.Thread(target=self._match_loop)
+        thread = threading.Thread(target=self.run)
         thread.daemon = True
         thread.start()
         logger.info("Matcher thread started.")
 
-    def _match_loop(self):
+    def stop(self):
+        """Finish the current round and exit ``run`` (within about a second)."""
+        self.running = False
+
+    def run(self):
+        self.running = True
+        self._refresh_leases()
+        with self.app.app_context():
+            self._hydrate()
+
         while self.running:
-            with self.app.app_context():
+            self._refresh_leases()
+            wake_at = min(self.next_pass, self.next_flush) if self.pending else self.next_pass
+            block_ms = max(1, min(EVENT_BLOCK_MS, int((wake_at - time.time()) * 1000)))
+            try:
+                resp = self.redis_client.xread({QUEUE_EVENTS_KEY: self.last_event_id}, block=block_ms, count=100)
+            except Exception as e:
+                logger.error(f"Error reading queue events: {e}")
+                time.sleep(1)
+                continue
+            for _, events in resp or []:
+                for event_id, fields in events:
+                    self.last_event_id = event_id
+                    with self.app.app_context():
+                        try:
+                            self._apply_event(fields)
+                        except Exception as e:
+                            logger.error(f"Error in match loop: {e}")
+
+            if time.time() >= self.next_pass:
+                with self.app.app_context():
+                    try:
+                        if self.strategy is not None:
+                            self._batch_pass()
+                        else:
+                            self._rescan()
+                        self._publish_waiting()
+                        self._publish_status()
+                    except Exception as e:
+                        logger.error(f"Error in match tick: {e}")
+                self.next_pass = time.time() + self.tick
+
+            # Everything claimed this round goes to the game service together
+            if self.pending and time.time() >= self.next_flush:
                 try:
-                    self._process_queue()
+                    self._flush()
                 except Exception as e:
-                    logger.error(f"Error in match loop: {e}")
-            
-            time.sleep(2) # Run every 2 seconds
-
-    def _process_queue(self):
-        # 1. Group by game_speed
-        queue_items = MatchQueue.query.order_by(MatchQueue.elo).all()
-        logger.info(f"Processing queue: {len(queue_items)} players.")
-        
-        if len(queue_items) < 2:
+                    logger.error(f"Error creating matches: {e}")
+
+        if self.leases is not None:
+            self.leases.release_all()
+        logger.info("Matcher stopped.")
+
+    def _owns(self, speed):
+        return self.leases is None or speed in self.leases.owned
+
+    def _owned_queues(self):
+        return [(speed, queue) for speed, queue in list(self.index.speeds.items()) if self._owns(speed)]
+
+    def _refresh_leases(self):
+        if self.leases is None or time.time() < self.next_lease_refresh:
             return
+        before = set(self.leases.owned)
+        try:
+            owned = self.leases.refresh()
+        except Exception as e:
+            logger.error(f"Error refreshing matcher leases: {e}")
+            return
+        finally:
+            self.next_lease_refresh = time.time() + LEASE_REFRESH_INTERVAL
+        if owned != before:
+            logger.info(f"Matcher now owns speeds {sorted(owned)}")
+        for speed in owned - before:
+            # Taken over: everyone waiting there needs a fresh search.
+            for entry in self.index.queue(speed):
+                entry.widen_seen = -1
+
+    def _hydrate(self):
+        # Remember where the stream is before reading the queue: anything that
+        # happens during the load is replayed afterwards (replays are harmless,
+        # a join just re-indexes the entry).
+        latest = self.redis_client.xrevrange(QUEUE_EVENTS_KEY, count=1)
+        self.last_event_id = latest[0][0] if latest else '0-0'
+
+        if not queue_store.speeds():
+            self._import_table()
+
+        entries = sorted(queue_store.load_entries(), key=lambda e: e.joined_at)
+        for entry in entries:
+            self._on_join(entry)
+        logger.info(f"Matcher loaded {len(entries)} queued players, {len(self.index)} still waiting.")
+
+    def _import_table(self):
+        # First start on the Redis queue: carry over players still queued in
+        # Postgres. Their join events are replayed after the load and only
+        # re-index them.
+        for row in MatchQueue.query.order_by(MatchQueue.joined_at):
+            queue_store.join(
+                row.user_id, row.elo, row.game_speed,
+                row.min_elo if row.min_elo is not None else 0,
+                row.max_elo if row.max_elo is not None else 3000,
+                (row.joined_at or datetime.utcnow()).replace(tzinfo=timezone.utc).timestamp(),
+            )
+
+    def _apply_event(self, event):
+        if event['type'] == 'join':
+            self._on_join(queue_store.entry_from_fields(event))
+        elif event['type'] == 'leave':
+            self.index.remove(event['user_id'])
+        elif event['type'] == 'matched':
+            self.index.remove(event['user_id'])
+            self.index.remove(event['opponent_id'])
+
+    def _on_join(self, entry):
+        queue = self.index.queue(entry.game_speed)
+        queue.add(entry)
+        if self.strategy is not None or not self._owns(entry.game_speed):
+            return  # Paired on the next batch pass / by the speed's owner
+        self._search(queue, entry)
+
+    def _search(self, queue, entry):
+        now = time.time()
+        entry.widen_seen = queue.widen(entry, now)
+        for _ in range(CLAIM_ATTEMPTS):
+            opponent = queue.best_opponent(entry, now)
+            if opponent is None:
+                logger.debug(f"No opponent yet for {entry}")
+                return
+            if self._claim(queue, entry, opponent, now):
+                return
+            if queue.get(entry.user_id) is None:
+                return
+
+    def _rescan(self):
+        # Immediate mode only searches on join; players whose window has
+        # widened since get another search, longest-waiting first.
+        now = time.time()
+        for _, queue in self._owned_queues():
+            for entry in sorted(queue, key=lambda e: e.joined_at):
+                if queue.get(entry.user_id) is entry and queue.widen(entry, now) > entry.widen_seen:
+                    self._search(queue, entry)
 
-        buckets = {}
-        for item in queue_items:
-            # Normalize speed to lowercase to avoid casing issues
-            speed = (item.game_speed or 'standard').lower()
-            if speed not in buckets:
-                buckets[speed] = []
-            buckets[speed].append(item)
-            logger.info(f"Player {item.user_id} ({item.elo}) added to bucket '{speed}'. Range: {item.min_elo}-{item.max_elo}")
-
-        # 2. Match within buckets
-        for speed, items in buckets.items():
-            if len(items) < 2:
-                logger.info(f"Bucket '{speed}' has {len(items)} players. Not enough to match.")
+    def _batch_pass(self):
+        now = time.time()
+        for _, queue in self._owned_queues():
+            if len(queue) < 2:
                 continue
-            
-            logger.info(f"Bucket '{speed}' has {len(items)} players. Attempting to match...")
-            i = 0
-            while i < len(items) - 1:
-                player1 = items[i]
-                player2 = items[i+1]
-                
-                # Check mutual ELO requirements
-                p1_satisfies_p2 = player2.min_elo <= player1.elo <= player2.max_elo
-                p2_satisfies_p1 = player1.min_elo <= player2.elo <= player1.max_elo
-                
-                elo_diff = abs(player1.elo - player2.elo)
-                
-                # Combined check
-                if p1_satisfies_p2 and p2_satisfies_p1 and elo_diff <= 300: # Increased hard cap to 300 for easier testing
-                    self._create_match(player1, player2)
-                    i += 2
-                else:
-                    logger.info(f"Match rejected: {player1.user_id} ({player1.elo}) vs {player2.user_id} ({player2.elo})")
-                    logger.info(f"  > P1 satisfies P2 ({player2.min_elo}-{player2.max_elo})? {p1_satisfies_p2}")
-                    logger.info(f"  > P2 satisfies P1 ({player1.min_elo}-{player1.max_elo})? {p2_satisfies_p1}")
-                    logger.info(f"  > Diff {elo_diff} <= 300? {elo_diff <= 300}")
-                    # Try next pair
-                    i += 1
-
-    def _create_match(self, p1, p2):
-        logger.info(f"Match found: {p1.user_id} ({p1.elo}) vs {p2.user_id} ({p2.elo})")
-        
-        # Determine settings from p1 (since they matched on speed, p1.game_speed == p2.game_speed)
-        speed = p1.game_speed or 'standard'
-        
-        # Map speed to time settings (Chess style: initial + increment)
-        # speed: 'blitz' (30s+3s), 'standard' (2m+5s), 'extended' (5m+10s)
-        time_map = {
-            'blitz': {'initial': 30, 'increment': 3, 'label': '30s + 3s'},
-            'standard': {'initial': 120, 'increment': 5, 'label': '2m + 5s'},
-            'extended': {'initial': 300, 'increment': 10, 'label': '5m + 10s'}
-        }
-        timer_settings = time_map.get(speed, {'initial': 120, 'increment': 5, 'label': '2m + 5s'})
+            for a, b in self.strategy.pair(list(queue), now, compatible=queue.compatible):
+                self._claim(queue, a, b, now)
 
-        game_settings = {
-            "speed": speed,
-            "timer": timer_settings,
-            "timePerMove": timer_settings['label'], # Keep for backward compatibility if needed
-            "eloStakes": 24 
-        }
+    def _record(self, speed, pairs, claimed_at):
+        # Waits end at the claim; game creation time is not queue time.
+        quality = match_quality(pairs, now=None, matched_at=claimed_at)
+        waits = [at - e.joined_at for pair, at in zip(pairs, claimed_at) for e in pair]
+        queue_store.record_quality(speed, quality)
+        queue_store.record_waits(speed, waits)
+        estimate = self.wait_estimate.get(speed)
+        for wait in waits:
+            estimate = wait if estimate is None else estimate + WAIT_EWMA_ALPHA * (wait - estimate)
+        self.wait_estimate[speed] = estimate
+        return quality
+
+    def _publish_waiting(self):
+        now = time.time()
+        snapshots = {}
+        for speed, queue in self._owned_queues():
+            waits = sorted(now - e.joined_at for e in queue)
+            if not waits:
+                snapshots[speed] = {'count': 0}
+                continue
+            snapshots[speed] = {
+                'count': len(waits),
+                'p50_seconds': round(waits[len(waits) // 2], 1),
+                'p90_seconds': round(waits[int(len(waits) * 0.9)], 1),
+                'max_seconds': round(waits[-1], 1),
+                'max_widen': queue.schedule.widen(waits[-1], len(queue)),
+            }
+        queue_store.publish_waiting(snapshots)
+
+    def _publish_status(self):
+        """
+        Queue depth and estimated wait per speed: a snapshot for
+        GET /queue/status, and a queue_status event to each waiting player
+        whose position, depth or estimate changed, at most once a second.
+        """
+        now = time.time()
+        snapshot = {}
+        waiting = set()
+        for speed, queue in self._owned_queues():
+            estimate = self.wait_estimate.get(speed)
+            snapshot[speed] = {
+                'depth': len(queue),
+                'estimated_wait_seconds': round(estimate) if estimate is not None else None,
+            }
+            for position, entry in enumerate(sorted(queue, key=lambda e: e.joined_at), start=1):
+                waiting.add(entry.user_id)
+                waited = now - entry.joined_at
+                remaining = max(0, round(estimate - waited)) if estimate is not None else None
+                # The remaining estimate counts down by itself; only a new
+                # position, depth or speed estimate is worth a message.
+                status = (speed, position, len(queue), snapshot[speed]['estimated_wait_seconds'])
+                sent_at, last = self.status_sent.get(entry.user_id, (0.0, None))
+                if status == last or now - sent_at < STATUS_MIN_INTERVAL:
+                    continue
+                self.status_sent[entry.user_id] = (now, status)
+                self.notify_pipe.publish('matchmaking_updates', json.dumps({
+                    "event": "queue_status",
+                    "data": {
+                        "game_speed": speed,
+                        "position": position,
+                        "queue_size": len(queue),
+                        "waited_seconds": round(waited),
+                        "estimated_wait_seconds": remaining,
+                    },
+                    "room": entry.user_id,
+                    "published_at": time.time(),
+                }))
+        self.notify_pipe.execute()
+        for user_id in list(self.status_sent):
+            if user_id not in waiting:
+                del self.status_sent[user_id]
+        queue_store.publish_status(snapshot)
+
+    def _claim(self, queue, a, b, now=None):
+        if queue_store.claim_pair(a, b, queue.widen(a, now), queue.widen(b, now)):
+            queue.remove(a.user_id)
+            queue.remove(b.user_id)
+            # Longest-waiting player moves first.
+            p1, p2 = sorted((a, b), key=lambda e: e.joined_at)
+            self.pending.append((p1, p2, time.time() if now is None else now))
+            return True
+        # Another matcher got there first, or our copy is behind the stream:
+        # drop whoever is gone.
+        for user_id, queued in queue_store.is_queued([a.user_id, b.user_id]).items():
+            if not queued:
+                queue.remove(user_id)
+        return False
+
+    def _flush(self):
+        """
+        Create games for every pair claimed since the last flush.
+
+        Each pair is sent with an idempotency key (``pair_key``), so a pair
+        whose outcome is unknown (timeout, 5xx, missing from the response)
+        is simply sent again: if its game was created the first time, the
+        game service returns that game. Pairs only go back to the queue when
+        the game service rejected them outright, or after
+        CREATE_MAX_ATTEMPTS once ``_reconcile`` has checked that neither
+        player got a game after all.
+
+        After a failure the rest stay pending until ``next_flush`` rather
+        than the loop sleeping, so events and the other speeds keep going.
+        """
+        pairs, self.pending = self.pending, []
+        for i in range(0, len(pairs), BULK_CREATE_SIZE):
+            chunk = pairs[i:i + BULK_CREATE_SIZE]
+            game_ids, rejected = self._create_matches(chunk)
+
+            self._start([(p1, p2, claimed_at, game_ids[pair_key(p1, p2)])
+                         for p1, p2, claimed_at in chunk if pair_key(p1, p2) in game_ids])
+            failed = [pair for pair in chunk if pair_key(pair[0], pair[1]) not in game_ids]
+            if not failed:
+                continue
+
+            if rejected:
+                # Nothing was created: back in the queue with their original
+                # join times; the join events re-index them everywhere.
+                for p1, p2, _ in failed:
+                    self.create_attempts.pop(pair_key(p1, p2), None)
+                    queue_store.requeue(p1)
+                    queue_store.requeue(p2)
+            else:
+                for pair in failed:
+                    key = pair_key(pair[0], pair[1])
+                    attempts = self.create_attempts.get(key, 0) + 1
+                    self.create_attempts[key] = attempts
+                    if attempts < CREATE_MAX_ATTEMPTS:
+                        self.pending.append(pair)
+                    else:
+                        self._reconcile(*pair)
+            # The game service is failing, so give it a moment before the
+            # next attempt; later chunks wait for that too.
+            self.pending.extend(pairs[i + BULK_CREATE_SIZE:])
+            self.next_flush = time.time() + CREATE_RETRY_DELAY
+            return
+
+    def _start(self, started):
+        """Announce ``(p1, p2, claimed_at, game_id)`` games and record their match quality."""
+        if not started:
+            return
+        by_speed = {}
+        for p1, p2, claimed_at, game_id in started:
+            self.create_attempts.pop(pair_key(p1, p2), None)
+            self._queue_match_found(p1, p2, game_id)
+            pairs, claimed = by_speed.setdefault(p1.game_speed, ([], []))
+            pairs.append((p1, p2))
+            claimed.append(claimed_at)
+        self.notify_pipe.execute()
+        for speed, (pairs, claimed) in by_speed.items():
+            quality = self._record(speed, pairs, claimed)
+            logger.info(f"{self.strategy.name if self.strategy else 'immediate'} [{speed}]: {quality}, "
+                        f"{len(self.index.queue(speed))} still waiting.")
 
-        # 1. Call Game Service to create game
+    def _reconcile(self, p1, p2, claimed_at):
+        """
+        Settle a pair whose game creation kept failing without an answer: if
+        both players are in the same active game it was created after all,
+        so announce it; otherwise requeue whoever has no active game. If the
+        game service can't say, the pair stays pending.
+        """
         try:
-            payload = {
+            active = {}
+            for entry in (p1, p2):
+                response = self.game_service.get(
+                    f"{Config.GAME_SERVICE_URL}/games/active/{entry.user_id}/exists", timeout=BULK_CREATE_TIMEOUT)
+                response.raise_for_status()
+                active[entry.user_id] = set(response.json().get('game_ids', []))
+        except Exception as e:
+            logger.error(f"Could not check active games for {p1.user_id} and {p2.user_id}: {e}")
+            self.pending.append((p1, p2, claimed_at))
+            return
+
+        shared = active[p1.user_id] & active[p2.user_id]
+        if shared:
+            self._start([(p1, p2, claimed_at, min(shared))])
+            return
+        logger.warning(f"No game for {p1.user_id} vs {p2.user_id} after {CREATE_MAX_ATTEMPTS} attempts, requeueing")
+        self.create_attempts.pop(pair_key(p1, p2), None)
+        # Someone already playing another game stays out of the queue
+        for entry in (p1, p2):
+            if not active[entry.user_id]:
+                queue_store.requeue(entry)
+
+    def _create_matches(self, pairs):
+        """
+        One POST /games/bulk for pending ``(p1, p2, claimed_at)`` pairs.
+        Returns ({pair_key: game_id} for the games the service confirmed,
+        whether it rejected the request): a rejection (4xx) means nothing was
+        created; any other failure may have created some or all of the games.
+        """
+        games = []
+        for p1, p2, _ in pairs:
+            logger.info(f"Match found: {p1.user_id} ({p1.elo}) vs {p2.user_id} ({p2.elo})")
+            games.append({
                 "player1_id": p1.user_id,
                 "player2_id": p2.user_id,
-                "settings": game_settings
-            }
-            
-            response = requests.post(f"{Config.GAME_SERVICE_URL}/games", json=payload, timeout=5)
-            
+                # Both players matched on speed, so p1's is the game's
+                "settings": game_settings(p1.game_speed),
+                "key": pair_key(p1, p2),
+            })
+
+        try:
+            response = self.game_service.post(
+                f"{Config.GAME_SERVICE_URL}/games/bulk", json={"games": games}, timeout=BULK_CREATE_TIMEOUT)
             if response.status_code == 201:
-                game_data = response.json()
-                game_id = game_data.get('id') 
-                
-                if not game_id:
-                     logger.error(f"Game created but no ID returned: {game_data}")
-                     return
-
-                # 2. Notify Players via Redis
-                # Player 1 is X, Player 2 is O
-                # Pass game_settings so FE can display them
-                self._notify_match_found(p1.user_id, game_id, "X", p2.user_id, game_settings)
-                self._notify_match_found(p2.user_id, game_id, "O", p1.user_id, game_settings)
-                
-                # 3. Remove from Queue
-                db.session.delete(p1)
-                db.session.delete(p2)
-                db.session.commit()
-                logger.info(f"Game {game_id} created and players removed from queue.")
-            else:
-                logger.error(f"Failed to create game: {response.text}")
-        
+                created = response.json().get('games', [])
+                game_ids = {game['key']: game['id'] for game in created if game.get('key') and game.get('id')}
+                if len(game_ids) < len(pairs):
+                    logger.error(f"Bulk create returned {len(game_ids)} games for {len(pairs)} pairs")
+                else:
+                    logger.info(f"Created {len(game_ids)} games.")
+                return game_ids, False
+            logger.error(f"Failed to create games ({response.status_code}): {response.text}")
+            # 409: a concurrent attempt with the same keys, worth retrying
+            return {}, 400 <= response.status_code < 500 and response.status_code != 409
         except Exception as e:
-            logger.error(f"Error creating match: {e}")
+            logger.error(f"Error creating matches: {e}")
+        return {}, False
+
+    def _queue_match_found(self, p1, p2, game_id):
+        # Player 1 is X, Player 2 is O. Pass game_settings so FE can display them.
+        # Players are already out of the queue (claimed); the mirror drops
+        # their match_queue rows from the 'matched' event.
+        settings = game_settings(p1.game_speed)
+        self._notify_match_found(p1.user_id, game_id, "X", p2.user_id, settings)
+        self._notify_match_found(p2.user_id, game_id, "O", p1.user_id, settings)
 
     def _notify_match_found(self, user_id, game_id, symbol, opponent_id, settings):
         message = {
@@ -147,6 +494,7 @@ class Matcher:
                 "opponent_id": opponent_id,
                 "game_settings": settings
             },
-            "room": user_id 
+            "room": user_id,
+            "published_at": time.time(),
         }
-        self.event_bus.publish('matchmaking_updates', json.dumps(message))
+        self.notify_pipe.publish('matchmaking_updates', json.dumps(message))
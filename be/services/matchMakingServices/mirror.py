@@ -0,0 +1,136 @@
+import os
+import socket
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import redis
+
+from config import Config
+from extensions import db
+from db.models.queue import MatchQueue
+from shared_leases.leases import LUA_RELEASE_LEASE, LUA_RENEW_LEASE
+from queue_store import QUEUE_EVENTS_KEY, get_queue_redis
+
+logger = logging.getLogger("QueueMirror")
+
+GROUP = "pg_mirror"
+KEY_MIRROR_LEASE = "mmq:mirror_lease"
+BATCH_SIZE = 200
+BLOCK_MS = 1000
+
+class QueueMirror:
+    """
+    Copies the Redis queue into ``match_queue`` for analytics.
+
+    Follows the queue event stream through a consumer group and applies each
+    batch of joins/leaves/matches in one transaction before acking it. Nothing
+    on the join or match path waits on Postgres; the table lags the live
+    queue by about one batch. Applying an event twice gives the same row, so
+    redelivery after a crash is safe.
+
+    Rows are last-event-wins, so events must be applied in stream order:
+    every worker runs a mirror, but only the one holding the mirror lease
+    (``mmq:mirror_lease``, like the speed leases in leases.py) consumes.
+    Whenever it takes the lease, or a batch fails, it first finishes the
+    group's pending events, oldest first, before reading new ones.
+    """
+
+    def __init__(self, app, ttl_ms=None):
+        self.app = app
+        self.running = False
+        self.redis_client = get_queue_redis()
+        self.consumer = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.ttl_ms = ttl_ms or Config.MATCH_LEASE_TTL_MS
+        self.leader = False
+        self.catch_up = True  # Pending events to apply before new ones
+        self._renew = self.redis_client.register_script(LUA_RENEW_LEASE)
+        self._release = self.redis_client.register_script(LUA_RELEASE_LEASE)
+
+    def start(self):
+        self.running = True
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+        logger.info("QueueMirror thread started.")
+
+    def _run(self):
+        try:
+            self.redis_client.xgroup_create(QUEUE_EVENTS_KEY, GROUP, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+        while self.running:
+            with self.app.app_context():
+                try:
+                    if not self._hold_lease():
+                        time.sleep(BLOCK_MS / 1000)
+                        continue
+                    self.step()
+                except Exception as e:
+                    db.session.rollback()
+                    self.catch_up = True
+                    logger.error(f"Error mirroring queue events: {e}")
+        if self.leader:
+            self._release(keys=[KEY_MIRROR_LEASE], args=[self.consumer])
+
+    def _hold_lease(self):
+        if self.leader:
+            if self._renew(keys=[KEY_MIRROR_LEASE], args=[self.consumer, self.ttl_ms]):
+                return True
+            logger.warning("Lost the queue mirror lease")
+            self.leader = False
+        if self.redis_client.set(KEY_MIRROR_LEASE, self.consumer, nx=True, px=self.ttl_ms):
+            logger.info("Took the queue mirror lease")
+            self.leader = True
+            self.catch_up = True
+        return self.leader
+
+    def step(self):
+        """Apply one batch: the oldest pending events while catching up, else new ones."""
+        if self.catch_up:
+            # Whoever held them (a previous leader, or this mirror before an
+            # error), they come back oldest first
+            events = self.redis_client.xautoclaim(
+                QUEUE_EVENTS_KEY, GROUP, self.consumer, min_idle_time=0, start_id='0-0', count=BATCH_SIZE)[1]
+            if not events:
+                self.catch_up = False
+                return
+        else:
+            resp = self.redis_client.xreadgroup(
+                GROUP, self.consumer, {QUEUE_EVENTS_KEY: '>'}, count=BATCH_SIZE, block=BLOCK_MS)
+            events = resp[0][1] if resp else []
+        if events:
+            self._apply(events)
+
+    def _apply(self, events):
+        # Collapse the batch to the last event per user, then one read and one
+        # commit for all of them.
+        latest = {}
+        for _, fields in events:
+            if not fields:
+                continue
+            latest[fields['user_id']] = fields
+            if fields['type'] == 'matched':
+                latest[fields['opponent_id']] = fields
+
+        rows = {row.user_id: row for row in MatchQueue.query.filter(MatchQueue.user_id.in_(list(latest)))}
+        for user_id, fields in latest.items():
+            row = rows.get(user_id)
+            if fields['type'] != 'join':
+                if row is not None:
+                    db.session.delete(row)
+                continue
+            if row is None:
+                row = MatchQueue(user_id=user_id)
+                db.session.add(row)
+            row.elo = int(fields['elo'])
+            row.game_speed = fields['game_speed']
+            row.min_elo = int(fields['min_elo'])
+            row.max_elo = int(fields['max_elo'])
+            row.joined_at = datetime.utcfromtimestamp(float(fields['joined_at']))
+        db.session.commit()
+        self.redis_client.xack(QUEUE_EVENTS_KEY, GROUP, *[event_id for event_id, _ in events])
@@ -0,0 +1,172 @@
+"""
+In-memory view of the matchmaking queue, one ELO-sorted structure per game
+speed. The matcher keeps it up to date from join/leave events, so finding an
+opponent for a new entrant is a search of its ELO window (O(log n + k))
+rather than a pass over the whole queue.
+
+Windows widen while a player waits (``WindowSchedule``). The widening is
+worked out whenever two entries are compared, from ``joined_at`` and the
+current queue depth, so nothing stored ever has to be rewritten.
+"""
+import bisect
+import time
+
+from sortedcontainers import SortedKeyList
+
+# Cap on the ELO gap of any pairing, on top of the players' own ranges.
+# It widens along with the players' windows.
+MAX_ELO_GAP = 300
+
+
+class WindowSchedule:
+    """
+    How far (in ELO, on each side) a player's window has widened after
+    waiting. ``steps`` are (seconds waited, extra ELO) pairs, a step function.
+    Queues shallower than ``depth_reference`` run the clock faster, up to
+    ``max_depth_factor`` times, since fewer players means fewer close
+    opponents will ever turn up.
+    """
+
+    def __init__(self, steps=((0, 0),), depth_reference=50, max_depth_factor=3.0):
+        steps = sorted((float(t), int(extra)) for t, extra in steps)
+        self.times = [t for t, _ in steps]
+        self.extras = [extra for _, extra in steps]
+        self.depth_reference = depth_reference
+        self.max_depth_factor = max(1.0, float(max_depth_factor))
+
+    @classmethod
+    def parse(cls, spec, **kwargs):
+        """``"0:0,15:50,30:100"`` -> steps [(0, 0), (15, 50), (30, 100)]."""
+        steps = [tuple(part.split(':')) for part in spec.split(',') if part.strip()]
+        return cls(steps or ((0, 0),), **kwargs)
+
+    def depth_factor(self, depth):
+        if not self.depth_reference:
+            return 1.0
+        return min(self.max_depth_factor, max(1.0, self.depth_reference / max(depth, 1)))
+
+    def widen(self, waited, depth):
+        i = bisect.bisect_right(self.times, waited * self.depth_factor(depth)) - 1
+        return self.extras[i] if i >= 0 else 0
+
+    @property
+    def max_widen(self):
+        return max(self.extras) if self.extras else 0
+
+
+class QueueEntry:
+    __slots__ = ('user_id', 'elo', 'game_speed', 'min_elo', 'max_elo', 'joined_at', 'widen_seen')
+
+    def __init__(self, user_id, elo, game_speed, min_elo, max_elo, joined_at):
+        self.user_id = user_id
+        self.elo = int(elo)
+        self.game_speed = (game_speed or 'standard').lower()
+        self.min_elo = int(min_elo)
+        self.max_elo = int(max_elo)
+        self.joined_at = float(joined_at)  # Epoch seconds
+        self.widen_seen = 0  # Widest window the matcher has searched with
+
+    def accepts(self, other, widen=0):
+        return self.min_elo - widen <= other.elo <= self.max_elo + widen
+
+    def compatible(self, other, widen=0, other_widen=0):
+        return (self.accepts(other, widen) and other.accepts(self, other_widen)
+                and abs(self.elo - other.elo) <= MAX_ELO_GAP + max(widen, other_widen))
+
+    def __repr__(self):
+        return f"<QueueEntry {self.user_id} {self.game_speed} {self.elo} [{self.min_elo}-{self.max_elo}]>"
+
+
+class SpeedQueue:
+    """Entries of one game speed, ordered by ELO."""
+
+    def __init__(self, schedule=None):
+        self._entries = SortedKeyList(key=lambda e: e.elo)
+        self._by_user = {}
+        self.schedule = schedule or WindowSchedule()
+
+    def __len__(self):
+        return len(self._by_user)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def add(self, entry):
+        self.remove(entry.user_id)
+        self._entries.add(entry)
+        self._by_user[entry.user_id] = entry
+
+    def remove(self, user_id):
+        entry = self._by_user.pop(user_id, None)
+        if entry is not None:
+            self._entries.remove(entry)
+        return entry
+
+    def get(self, user_id):
+        return self._by_user.get(user_id)
+
+    def widen(self, entry, now=None):
+        now = time.time() if now is None else now
+        return self.schedule.widen(now - entry.joined_at, len(self))
+
+    def compatible(self, a, b, now=None):
+        now = time.time() if now is None else now
+        return a.compatible(b, self.widen(a, now), self.widen(b, now))
+
+    def best_opponent(self, entry, now=None):
+        """
+        The compatible entry closest in ELO to ``entry``, or None; ties go to
+        the longest waiting. Walks outwards from ``entry.elo`` on both sides
+        and stops past the first compatible ELO on each, so the cost is the
+        number of incompatible entries passed over, not the queue size.
+        """
+        now = time.time() if now is None else now
+        widen = self.widen(entry, now)
+        reach = MAX_ELO_GAP + self.schedule.max_widen
+        lo = max(entry.min_elo - widen, entry.elo - reach)
+        hi = min(entry.max_elo + widen, entry.elo + reach)
+        best = None
+        for candidates in (
+            self._entries.irange_key(lo, entry.elo, reverse=True),
+            self._entries.irange_key(entry.elo, hi),
+        ):
+            nearest = None
+            for other in candidates:
+                if nearest is not None and other.elo != nearest.elo:
+                    break
+                if other is entry or not entry.compatible(other, widen, self.widen(other, now)):
+                    continue
+                # Equal ELOs are in insertion order, not joined_at order
+                if nearest is None or other.joined_at < nearest.joined_at:
+                    nearest = other
+            if nearest is not None and (best is None or (abs(nearest.elo - entry.elo), nearest.joined_at)
+                                        < (abs(best.elo - entry.elo), best.joined_at)):
+                best = nearest
+        return best
+
+
+class QueueIndex:
+    def __init__(self, schedule=None):
+        self.speeds = {}
+        self.schedule = schedule
+
+    def __len__(self):
+        return sum(len(q) for q in self.speeds.values())
+
+    def queue(self, speed):
+        speed = (speed or 'standard').lower()
+        if speed not in self.speeds:
+            self.speeds[speed] = SpeedQueue(self.schedule)
+        return self.speeds[speed]
+
+    def add(self, entry):
+        # A re-join may change speed: drop the old entry wherever it is.
+        self.remove(entry.user_id)
+        self.queue(entry.game_speed).add(entry)
+
+    def remove(self, user_id):
+        for q in self.speeds.values():
+            entry = q.remove(user_id)
+            if entry is not None:
+                return entry
+        return None
@@ -0,0 +1,307 @@
+"""
+Redis-backed matchmaking queue.
+
+Each game speed has a sorted set ``mmq:{speed}`` of user ids scored by ELO,
+and each queued player a hash ``mmq:entry:{user_id}`` with their search
+parameters. Joining, leaving and claiming a pair are Lua scripts, so every
+change is atomic and is appended to the ``matchmaking:queue_events`` stream
+in the same step. Matcher workers follow that stream to keep their in-memory
+index current; the claim script is what stops two workers from matching the
+same player. ``match_queue`` in Postgres is only a mirror (see mirror.py).
+"""
+import json
+import threading
+import time
+
+import redis
+
+from config import Config
+from queue_index import MAX_ELO_GAP, QueueEntry
+
+KEY_QUEUE = "mmq:{speed}"
+KEY_ENTRY = "mmq:entry:{user_id}"
+KEY_SPEEDS = "mmq:speeds"  # Every speed that has ever had a queue
+KEY_QUALITY = "mmq:quality:{speed}"  # Running match quality totals
+KEY_WAITS = "mmq:waits:{speed}"  # Histogram of wait at match
+KEY_WAITING = "mmq:waiting"  # Per speed: snapshot of who is waiting now (JSON)
+KEY_STATUS = "mmq:status"  # Per speed: depth and wait estimate (JSON), for /queue/status
+WAIT_BUCKETS = (5, 10, 20, 30, 60, 120, 300)  # Seconds
+QUEUE_EVENTS_KEY = "matchmaking:queue_events"
+QUEUE_EVENTS_MAXLEN = 10000
+SCRIPT_ATTEMPTS = 5  # Join/leave tries while the entry keeps changing speed
+
+_redis = None
+_redis_lock = threading.Lock()
+
+def get_queue_redis():
+    """Matchmaking Redis, one client (and connection pool) per process."""
+    global _redis
+    if _redis is None:
+        with _redis_lock:
+            if _redis is None:
+                _redis = redis.from_url(Config.REDIS_URL, decode_responses=True)
+    return _redis
+
+
+def normalize_speed(speed):
+    return (speed or 'standard').lower()
+
+
+# Keys: entry hash, stream, new speed's set, current speed's set (the one
+# the caller read from the entry; the new one if not queued), speeds set.
+# Args: user_id, elo, speed, min_elo, max_elo, joined_at ('' = now), maxlen,
+# current speed ('' = not queued). A re-join replaces the old entry (possibly
+# in another speed's set). Returns false, changing nothing, if the entry's
+# speed is no longer the one read.
+LUA_JOIN = """
+local old_speed = redis.call('HGET', KEYS[1], 'game_speed') or ''
+if old_speed ~= ARGV[8] then return false end
+if old_speed ~= '' then redis.call('ZREM', KEYS[4], ARGV[1]) end
+local joined_at = ARGV[6]
+if joined_at == '' then
+    local t = redis.call('TIME')
+    joined_at = t[1] .. '.' .. string.format('%06d', tonumber(t[2]))
+end
+redis.call('HSET', KEYS[1], 'user_id', ARGV[1], 'elo', ARGV[2], 'game_speed', ARGV[3],
+           'min_elo', ARGV[4], 'max_elo', ARGV[5], 'joined_at', joined_at)
+redis.call('ZADD', KEYS[3], ARGV[2], ARGV[1])
+redis.call('SADD', KEYS[5], ARGV[3])
+redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[7], '*', 'type', 'join', 'user_id', ARGV[1],
+           'elo', ARGV[2], 'game_speed', ARGV[3], 'min_elo', ARGV[4], 'max_elo', ARGV[5],
+           'joined_at', joined_at)
+return joined_at
+"""
+
+# Keys: entry hash, stream, current speed's set. Args: user_id, maxlen,
+# current speed ('' = not queued). Returns 1, 0 if not queued, or false if
+# the entry's speed is no longer the one read.
+LUA_LEAVE = """
+local speed = redis.call('HGET', KEYS[1], 'game_speed') or ''
+if speed ~= ARGV[3] then return false end
+if speed == '' then return 0 end
+redis.call('ZREM', KEYS[3], ARGV[1])
+redis.call('DEL', KEYS[1])
+redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[2], '*', 'type', 'leave', 'user_id', ARGV[1])
+return 1
+"""
+
+# Keys: entry hash a, entry hash b, stream, speed's set. Args: user a,
+# user b, max gap, maxlen, widen a, widen b, speed. Takes both players out
+# of the queue only if both are still queued in that speed and still accept
+# each other, with each window widened by the amount the matcher worked out
+# for it. Returns 1 or 0.
+LUA_CLAIM_PAIR = """
+local a = redis.call('HMGET', KEYS[1], 'elo', 'game_speed', 'min_elo', 'max_elo')
+local b = redis.call('HMGET', KEYS[2], 'elo', 'game_speed', 'min_elo', 'max_elo')
+if not a[1] or not b[1] or a[2] ~= ARGV[7] or b[2] ~= ARGV[7] then return 0 end
+local a_elo, b_elo = tonumber(a[1]), tonumber(b[1])
+local wa, wb = tonumber(ARGV[5]), tonumber(ARGV[6])
+if b_elo < tonumber(a[3]) - wa or b_elo > tonumber(a[4]) + wa then return 0 end
+if a_elo < tonumber(b[3]) - wb or a_elo > tonumber(b[4]) + wb then return 0 end
+if math.abs(a_elo - b_elo) > tonumber(ARGV[3]) + math.max(wa, wb) then return 0 end
+redis.call('ZREM', KEYS[4], ARGV[1], ARGV[2])
+redis.call('DEL', KEYS[1], KEYS[2])
+redis.call('XADD', KEYS[3], 'MAXLEN', '~', ARGV[4], '*', 'type', 'matched',
+           'user_id', ARGV[1], 'opponent_id', ARGV[2])
+return 1
+"""
+
+_scripts = {}
+
+def _script(name):
+    # redis-py Script objects run EVALSHA and reload on NOSCRIPT themselves.
+    if name not in _scripts:
+        source = {'join': LUA_JOIN, 'leave': LUA_LEAVE, 'claim_pair': LUA_CLAIM_PAIR}[name]
+        _scripts[name] = get_queue_redis().register_script(source)
+    return _scripts[name]
+
+
+def _run_on_entry(name, user_id, keys, args):
+    """
+    Run a script that needs the set of the speed ``user_id`` is queued in.
+    Every key a script touches is passed in KEYS, so that speed is read
+    first and the script refuses (returns None) if it changed meanwhile.
+    """
+    r = get_queue_redis()
+    entry_key = KEY_ENTRY.format(user_id=user_id)
+    for _ in range(SCRIPT_ATTEMPTS):
+        current = r.hget(entry_key, 'game_speed') or ''
+        result = _script(name)(keys=[entry_key] + keys(current), args=args + [current])
+        if result is not None:
+            return result
+    raise redis.WatchError(f"Queue entry of {user_id} kept changing")
+
+
+def join(user_id, elo, game_speed, min_elo, max_elo, joined_at=None):
+    """Queue (or re-queue) a player; returns their joined_at (epoch seconds)."""
+    speed = normalize_speed(game_speed)
+    joined = _run_on_entry(
+        'join', user_id,
+        lambda current: [QUEUE_EVENTS_KEY, KEY_QUEUE.format(speed=speed),
+                         KEY_QUEUE.format(speed=current or speed), KEY_SPEEDS],
+        [user_id, int(elo), speed, int(min_elo), int(max_elo),
+         '' if joined_at is None else repr(float(joined_at)), QUEUE_EVENTS_MAXLEN],
+    )
+    return float(joined)
+
+
+def leave(user_id):
+    """Remove a player from the queue; False if they were not queued."""
+    return bool(_run_on_entry(
+        'leave', user_id,
+        lambda current: [QUEUE_EVENTS_KEY, KEY_QUEUE.format(speed=current or normalize_speed(None))],
+        [user_id, QUEUE_EVENTS_MAXLEN],
+    ))
+
+
+def claim_pair(a, b, widen_a=0, widen_b=0):
+    """Atomically take two compatible players out of the queue."""
+    return bool(_script('claim_pair')(
+        keys=[KEY_ENTRY.format(user_id=a.user_id), KEY_ENTRY.format(user_id=b.user_id), QUEUE_EVENTS_KEY,
+              KEY_QUEUE.format(speed=a.game_speed)],
+        args=[a.user_id, b.user_id, MAX_ELO_GAP, QUEUE_EVENTS_MAXLEN, int(widen_a), int(widen_b), a.game_speed],
+    ))
+
+
+def requeue(entry):
+    """Put a claimed player back (game creation failed), keeping their place."""
+    join(entry.user_id, entry.elo, entry.game_speed, entry.min_elo, entry.max_elo, entry.joined_at)
+
+
+def is_queued(user_ids):
+    pipe = get_queue_redis().pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.exists(KEY_ENTRY.format(user_id=user_id))
+    return dict(zip(user_ids, (bool(n) for n in pipe.execute())))
+
+
+def speeds():
+    return sorted(get_queue_redis().smembers(KEY_SPEEDS))
+
+
+def queue_sizes():
+    names = speeds()
+    pipe = get_queue_redis().pipeline(transaction=False)
+    for speed in names:
+        pipe.zcard(KEY_QUEUE.format(speed=speed))
+    return dict(zip(names, pipe.execute()))
+
+
+def record_quality(speed, quality):
+    """Add one pass's ``pairing.match_quality`` to the per-speed totals."""
+    if not quality['matches']:
+        return
+    key = KEY_QUALITY.format(speed=speed)
+    pipe = get_queue_redis().pipeline(transaction=False)
+    pipe.hincrby(key, 'matches', quality['matches'])
+    pipe.hincrbyfloat(key, 'elo_gap_sum', quality['avg_elo_gap'] * quality['matches'])
+    pipe.hincrbyfloat(key, 'wait_seconds_sum', quality['avg_wait_seconds'] * quality['matches'])
+    pipe.execute()
+
+
+def quality_summary():
+    """Per speed: matches made, mean ELO gap and mean wait at match."""
+    names = speeds()
+    pipe = get_queue_redis().pipeline(transaction=False)
+    for speed in names:
+        pipe.hgetall(KEY_QUALITY.format(speed=speed))
+    summary = {}
+    for speed, totals in zip(names, pipe.execute()):
+        matches = int(totals.get('matches', 0))
+        summary[speed] = {
+            'matches': matches,
+            'avg_elo_gap': float(totals.get('elo_gap_sum', 0)) / matches if matches else None,
+            'avg_wait_seconds': float(totals.get('wait_seconds_sum', 0)) / matches if matches else None,
+        }
+    return summary
+
+
+def _bucket(seconds):
+    for bound in WAIT_BUCKETS:
+        if seconds <= bound:
+            return f"le_{bound}"
+    return "le_inf"
+
+
+def record_waits(speed, waits):
+    """Add the waits (seconds) of newly matched players to the histogram."""
+    if not waits:
+        return
+    key = KEY_WAITS.format(speed=speed)
+    counts = {}
+    for seconds in waits:
+        counts[_bucket(seconds)] = counts.get(_bucket(seconds), 0) + 1
+    pipe = get_queue_redis().pipeline(transaction=False)
+    for field, n in counts.items():
+        pipe.hincrby(key, field, n)
+    pipe.hincrby(key, 'count', len(waits))
+    pipe.hincrbyfloat(key, 'sum', sum(waits))
+    pipe.execute()
+
+
+def publish_waiting(snapshots):
+    """Replace the per-speed snapshots of the players still waiting."""
+    if snapshots:
+        get_queue_redis().hset(KEY_WAITING, mapping={speed: json.dumps(snap) for speed, snap in snapshots.items()})
+
+
+def publish_status(by_speed):
+    """Replace the status of the given speeds (each worker writes its own)."""
+    if by_speed:
+        now = time.time()
+        get_queue_redis().hset(KEY_STATUS, mapping={
+            speed: json.dumps(dict(status, updated_at=now)) for speed, status in by_speed.items()
+        })
+
+
+def status_snapshot():
+    """Per speed, the matchers' last status; None if none was written yet."""
+    raw = get_queue_redis().hgetall(KEY_STATUS)
+    return {speed: json.loads(status) for speed, status in raw.items()} if raw else None
+
+
+def wait_metrics():
+    """Per speed: wait-at-match histogram and the current waiting snapshot."""
+    names = speeds()
+    r = get_queue_redis()
+    pipe = r.pipeline(transaction=False)
+    for speed in names:
+        pipe.hgetall(KEY_WAITS.format(speed=speed))
+    pipe.hgetall(KEY_WAITING)
+    *histograms, waiting = pipe.execute()
+
+    metrics = {}
+    for speed, hist in zip(names, histograms):
+        count = int(hist.get('count', 0))
+        buckets = {f"le_{bound}": int(hist.get(f"le_{bound}", 0)) for bound in WAIT_BUCKETS}
+        buckets['le_inf'] = int(hist.get('le_inf', 0))
+        metrics[speed] = {
+            'matched': {
+                'count': count,
+                'avg_wait_seconds': float(hist.get('sum', 0)) / count if count else None,
+                'buckets': buckets,  # Per bucket, not cumulative
+            },
+            'waiting': json.loads(waiting[speed]) if speed in waiting else None,
+        }
+    return metrics
+
+
+def entry_from_fields(fields):
+    return QueueEntry(
+        fields['user_id'], fields['elo'], fields['game_speed'],
+        fields['min_elo'], fields['max_elo'], fields['joined_at'],
+    )
+
+
+def load_entries(batch_size=500):
+    """Every queued entry, read in pipelined batches (matcher startup)."""
+    r = get_queue_redis()
+    for speed in speeds():
+        user_ids = r.zrange(KEY_QUEUE.format(speed=speed), 0, -1)
+        for i in range(0, len(user_ids), batch_size):
+            pipe = r.pipeline(transaction=False)
+            for user_id in user_ids[i:i + batch_size]:
+                pipe.hgetall(KEY_ENTRY.format(user_id=user_id))
+            for fields in pipe.execute():
+                if fields:
+                    yield entry_from_fields(fields)
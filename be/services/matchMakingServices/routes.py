@@ -1,9 +1,13 @@
 from flask import Blueprint, request, jsonify
-from extensions import db
-from db.models.queue import MatchQueue
+import requests
+from config import Config
+import queue_store
 
 matchmaking_bp = Blueprint('matchmaking', __name__)
 
+# Kept-alive connections to the game service for the join pre-check
+game_service = requests.Session()
+
 @matchmaking_bp.route('/queue/join', methods=['POST'])
 def join_queue():
     data = request.json
@@ -18,14 +22,11 @@ def join_queue():
 
     # 0. Check if user is already in an active game
     try:
-        from config import Config
-        import requests
-        # Call Game Service
-        game_url = f"{Config.GAME_SERVICE_URL}/games/active/{user_id}"
-        response = requests.get(game_url, timeout=2)
+        # Call Game Service (Redis set lookup on its side, no DB query)
+        game_url = f"{Config.GAME_SERVICE_URL}/games/active/{user_id}/exists"
+        response = game_service.get(game_url, timeout=2)
         if response.status_code == 200:
-            active_games = response.json()
-            if active_games and len(active_games) > 0:
+            if response.json().get('active'):
                  return jsonify({'error': 'User already in an active game', 'code': 'ACTIVE_GAME'}), 400
     except Exception as e:
         # Log error but maybe allow queueing if game service is down? 
@@ -35,29 +36,12 @@ def join_queue():
         # return jsonify({'error': 'Failed to verify game status'}), 500
         pass
 
-    # check if user already in queue
-    existing = MatchQueue.query.filter_by(user_id=user_id).first()
-    if existing:
-         existing.elo = elo # Update elo if changed
-         existing.game_speed = game_speed
-         existing.min_elo = min_elo
-         existing.max_elo = max_elo
-         existing.joined_at = db.func.now() # Refresh timestamp
-    else:
-        new_entry = MatchQueue(
-            user_id=user_id, 
-            elo=elo,
-            game_speed=game_speed,
-            min_elo=min_elo,
-            max_elo=max_elo
-        )
-        db.session.add(new_entry)
-    
+    # Queue in Redis (re-joining updates the entry and its join time).
+    # match_queue in Postgres follows asynchronously via the mirror.
     try:
-        db.session.commit()
+        queue_store.join(user_id, elo, game_speed, min_elo, max_elo)
         return jsonify({'message': 'Joined queue', 'status': 'queued'}), 200
     except Exception as e:
-        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @matchmaking_bp.route('/queue/leave', methods=['POST'])
@@ -68,15 +52,29 @@ def leave_queue():
     if not user_id:
          return jsonify({'error': 'Missing user_id'}), 400
 
-    entry = MatchQueue.query.filter_by(user_id=user_id).first()
-    if entry:
-        db.session.delete(entry)
-        db.session.commit()
+    if queue_store.leave(user_id):
         return jsonify({'message': 'Left queue', 'status': 'removed'}), 200
     
     return jsonify({'message': 'User not in queue'}), 404
 
 @matchmaking_bp.route('/queue/status', methods=['GET'])
 def get_status():
-    count = MatchQueue.query.count()
-    return jsonify({'queue_size': count}), 200
+    # The matchers' snapshot from their last tick (waiting players also get
+    # it pushed as queue_status events). Live depths only until one has run.
+    by_speed = queue_store.status_snapshot()
+    if by_speed is None:
+        by_speed = {
+            speed: {'depth': depth, 'estimated_wait_seconds': None, 'updated_at': None}
+            for speed, depth in queue_store.queue_sizes().items()
+        }
+    return jsonify({'queue_size': sum(s['depth'] for s in by_speed.values()), 'by_speed': by_speed}), 200
+
+@matchmaking_bp.route('/queue/metrics', methods=['GET'])
+def get_metrics():
+    # Wait-time distribution per speed: waits at match (histogram) and the
+    # players still waiting (snapshot from the matcher's last tick)
+    return jsonify({
+        'wait_buckets_seconds': list(queue_store.WAIT_BUCKETS),
+        'speeds': queue_store.wait_metrics(),
+        'match_quality': queue_store.quality_summary(),
+    }), 200
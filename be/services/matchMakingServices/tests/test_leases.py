@@ -0,0 +1,51 @@
+import fakeredis
+import pytest
+
+import queue_store
+from leases import KEY_LEASE, KEY_WORKERS, SpeedLeases
+
+
+@pytest.fixture
+def r(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(queue_store, '_redis', client)
+    client.sadd(queue_store.KEY_SPEEDS, 'blitz', 'standard', 'extended', 'bullet')
+    return client
+
+
+def test_single_worker_takes_every_speed(r):
+    worker = SpeedLeases()
+    assert worker.refresh() == {'blitz', 'standard', 'extended', 'bullet'}
+    assert r.get(KEY_LEASE.format(speed='blitz')) == worker.node_id
+
+
+def test_speeds_rebalance_across_workers(r):
+    a, b = SpeedLeases(), SpeedLeases()
+    a.refresh()
+    b.refresh()
+    a.refresh()
+    b.refresh()
+    assert len(a.owned) == len(b.owned) == 2
+    assert a.owned.isdisjoint(b.owned)
+
+    a.release_all()
+    assert r.zscore(KEY_WORKERS, a.node_id) is None
+    assert len(b.refresh()) == 4
+
+
+def test_pinned_worker_only_takes_its_speeds(r):
+    pinned = SpeedLeases(speeds=['blitz'])
+    other = SpeedLeases()
+    assert pinned.refresh() == {'blitz'}
+    assert other.refresh() == {'standard', 'extended', 'bullet'}
+    assert r.zscore(KEY_WORKERS, pinned.node_id) is None
+
+
+def test_lost_lease_is_dropped_and_left_alone(r):
+    a, b = SpeedLeases(), SpeedLeases()
+    a.refresh()
+    r.set(KEY_LEASE.format(speed='blitz'), b.node_id)  # a stalled past its TTL
+    assert 'blitz' not in a.refresh()
+    a.release_all()
+    assert r.get(KEY_LEASE.format(speed='blitz')) == b.node_id
+    assert r.get(KEY_LEASE.format(speed='standard')) is None
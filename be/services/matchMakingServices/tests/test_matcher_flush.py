@@ -0,0 +1,169 @@
+import json
+import time
+
+import fakeredis
+import pytest
+import redis
+from flask import Flask
+
+import matcher as matcher_module
+import queue_store
+from matcher import CREATE_MAX_ATTEMPTS, CREATE_RETRY_DELAY, Matcher, pair_key
+from queue_index import QueueEntry
+
+
+class Response:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body or {}
+        self.text = json.dumps(self.body)
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+
+class FakeGameService:
+    """Answers POST /games/bulk from ``outcomes`` in turn, remembering every game it created."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.games = {}  # key -> game id
+        self.posts = []
+
+    def post(self, url, json, timeout):
+        self.posts.append(json['games'])
+        outcome = self.outcomes.pop(0) if self.outcomes else 'ok'
+        if outcome == 'reject':
+            return Response(400, {'error': 'bad'})
+        if outcome == 'error':
+            return Response(500)
+        for game in json['games']:
+            self.games.setdefault(game['key'], f"game-{len(self.games) + 1}")
+        if outcome == 'timeout':
+            raise TimeoutError('read timed out')  # Committed, but the answer was lost
+        games = [{'id': self.games[game['key']], 'key': game['key']} for game in json['games']]
+        if outcome == 'partial':
+            games = games[:1]
+        return Response(201, {'games': games})
+
+    def get(self, url, timeout):
+        user_id = url.split('/')[-2]
+        game_ids = [game_id for key, game_id in self.games.items() if user_id in key.split(':')]
+        return Response(200, {'active': bool(game_ids), 'game_ids': game_ids})
+
+
+@pytest.fixture
+def matcher(monkeypatch):
+    monkeypatch.setattr(redis, 'from_url', lambda *a, **kw: fakeredis.FakeRedis())
+    monkeypatch.setattr(queue_store, '_redis', fakeredis.FakeRedis(decode_responses=True))
+    requeued = []
+    monkeypatch.setattr(queue_store, 'requeue', requeued.append)
+    m = Matcher(Flask(__name__), strategy=None)
+    m.requeued = requeued
+    m.found = []
+    monkeypatch.setattr(m, '_queue_match_found', lambda p1, p2, game_id: m.found.append((p1.user_id, p2.user_id, game_id)))
+    monkeypatch.setattr(m, '_record', lambda speed, pairs, claimed_at: 'ok')
+    return m
+
+
+def pairs(n, claimed_at=300.0):
+    return [(QueueEntry(f"a{i}", 1200, 'blitz', 0, 3000, 100.0 + i),
+             QueueEntry(f"b{i}", 1210, 'blitz', 0, 3000, 200.0 + i), claimed_at) for i in range(n)]
+
+
+def flush_until_done(m, rounds=10):
+    for _ in range(rounds):
+        if not m.pending:
+            return
+        m._flush()
+
+
+def test_timeout_after_commit_is_retried_with_the_same_keys(matcher):
+    matcher.game_service = FakeGameService('timeout')
+    matcher.pending = pairs(2)
+    flush_until_done(matcher)
+
+    assert matcher.requeued == []
+    assert [g['key'] for g in matcher.game_service.posts[0]] == [g['key'] for g in matcher.game_service.posts[1]]
+    assert len(matcher.game_service.games) == 2
+    assert sorted(game_id for _, _, game_id in matcher.found) == ['game-1', 'game-2']
+
+
+def test_partial_response_starts_the_returned_games(matcher):
+    matcher.game_service = FakeGameService('partial')
+    matcher.pending = pairs(3)
+    matcher._flush()
+
+    assert matcher.found == [('a0', 'b0', 'game-1')]
+    assert [p1.user_id for p1, _, _ in matcher.pending] == ['a1', 'a2']
+    flush_until_done(matcher)
+    assert len(matcher.found) == 3
+    assert matcher.requeued == []
+
+
+def test_rejected_request_requeues_both_players(matcher):
+    matcher.game_service = FakeGameService('reject')
+    matcher.pending = pairs(1)
+    matcher._flush()
+
+    assert [e.user_id for e in matcher.requeued] == ['a0', 'b0']
+    assert matcher.pending == [] and matcher.found == []
+
+
+def test_unanswered_creation_is_reconciled_before_requeueing(matcher):
+    matcher.game_service = FakeGameService(*['error'] * CREATE_MAX_ATTEMPTS)
+    matcher.pending = pairs(1)
+    flush_until_done(matcher)
+
+    assert [e.user_id for e in matcher.requeued] == ['a0', 'b0']
+    assert matcher.create_attempts == {}
+
+
+def test_game_found_on_reconcile_is_announced(matcher):
+    matcher.game_service = FakeGameService(*['timeout'] * CREATE_MAX_ATTEMPTS)
+    matcher.pending = pairs(1)
+    flush_until_done(matcher)
+
+    assert matcher.requeued == []
+    assert matcher.found == [('a0', 'b0', 'game-1')]
+
+
+def test_pair_key_is_unique_per_claim():
+    (p1, p2, _), = pairs(1)
+    again = QueueEntry('a0', 1300, 'blitz', 0, 3000, 150.0)
+    assert pair_key(p1, p2) == pair_key(p1, p2)
+    assert pair_key(p1, p2) != pair_key(again, p2)
+
+
+def test_failed_chunk_defers_the_rest_instead_of_sleeping(matcher, monkeypatch):
+    def no_sleep(seconds):
+        raise AssertionError('the matcher loop must not sleep on a failed creation')
+
+    monkeypatch.setattr(matcher_module, 'BULK_CREATE_SIZE', 2)
+    monkeypatch.setattr(matcher_module.time, 'sleep', no_sleep)
+    matcher.game_service = FakeGameService('ok', 'error')
+    matcher.pending = pairs(5)
+    before = time.time()
+    matcher._flush()
+
+    assert len(matcher.found) == 2 and len(matcher.game_service.posts) == 2
+    # The failed chunk and the one never sent wait for next_flush
+    assert [p1.user_id for p1, _, _ in matcher.pending] == ['a2', 'a3', 'a4']
+    assert before + CREATE_RETRY_DELAY <= matcher.next_flush <= time.time() + CREATE_RETRY_DELAY
+    flush_until_done(matcher)
+    assert len(matcher.found) == 5 and matcher.requeued == []
+
+
+def test_claim_records_its_own_time(matcher, monkeypatch):
+    a = QueueEntry('a', 1200, 'blitz', 0, 3000, 100.0)
+    b = QueueEntry('b', 1210, 'blitz', 0, 3000, 90.0)
+    queue = matcher.index.queue('blitz')
+    queue.add(a)
+    queue.add(b)
+    monkeypatch.setattr(queue_store, 'claim_pair', lambda *args: True)
+    assert matcher._claim(queue, a, b, now=150.0)
+    assert matcher.pending == [(b, a, 150.0)]  # Longest waiting first
@@ -0,0 +1,105 @@
+import json
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+import redis
+from flask import Flask
+
+import matcher as matcher_module
+import queue_store
+from matcher import STATUS_MIN_INTERVAL, WAIT_EWMA_ALPHA, Matcher
+from queue_index import QueueEntry
+from queue_store import KEY_STATUS
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock(1000.0)
+    monkeypatch.setattr(matcher_module, 'time', SimpleNamespace(time=clock.time, sleep=lambda s: None))
+    return clock
+
+
+@pytest.fixture
+def matcher(monkeypatch, clock):
+    bus = fakeredis.FakeRedis()
+    monkeypatch.setattr(redis, 'from_url', lambda *a, **kw: bus)
+    monkeypatch.setattr(queue_store, '_redis', fakeredis.FakeRedis(decode_responses=True))
+    m = Matcher(Flask(__name__), strategy=None)
+    m.updates = bus.pubsub(ignore_subscribe_messages=True)
+    m.updates.subscribe('matchmaking_updates')
+    return m
+
+
+def sent(m):
+    messages = []
+    for _ in range(20):
+        message = m.updates.get_message(timeout=0.01)
+        if message:
+            messages.append(json.loads(message['data']))
+    return {msg['room']: msg['data'] for msg in messages}
+
+
+def join(m, user_id, joined_at, speed='blitz'):
+    entry = QueueEntry(user_id, 1200, speed, 0, 3000, joined_at)
+    m.index.queue(speed).add(entry)
+    return entry
+
+
+def test_wait_estimate_counts_to_the_claim_not_the_flush(matcher, clock):
+    a, b = join(matcher, 'a', 100.0), join(matcher, 'b', 120.0)
+    matcher._record('blitz', [(a, b)], [150.0])  # Game created long after, at 1000
+
+    assert matcher.wait_estimate['blitz'] == pytest.approx(50 + WAIT_EWMA_ALPHA * (30 - 50))
+    histogram = queue_store.get_queue_redis().hgetall(queue_store.KEY_WAITS.format(speed='blitz'))
+    assert (histogram['count'], float(histogram['sum'])) == ('2', 80.0)
+
+
+def test_status_goes_out_on_change_at_most_once_a_second(matcher, clock):
+    join(matcher, 'first', 990.0)
+    join(matcher, 'second', 995.0)
+    matcher.wait_estimate['blitz'] = 30.0
+    matcher._publish_status()
+    assert sent(matcher) == {
+        'first': {'game_speed': 'blitz', 'position': 1, 'queue_size': 2, 'waited_seconds': 10, 'estimated_wait_seconds': 20},
+        'second': {'game_speed': 'blitz', 'position': 2, 'queue_size': 2, 'waited_seconds': 5, 'estimated_wait_seconds': 25},
+    }
+
+    # 'second' moves up, but heard from us too recently
+    matcher.index.remove('first')
+    clock.now += STATUS_MIN_INTERVAL / 2
+    matcher._publish_status()
+    assert sent(matcher) == {}
+    assert set(matcher.status_sent) == {'second'}  # Players who left are forgotten
+
+    clock.now += STATUS_MIN_INTERVAL / 2
+    matcher._publish_status()
+    assert sent(matcher)['second']['position'] == 1
+
+    # Nothing changed: nothing sent, however long it has been
+    clock.now += 5 * STATUS_MIN_INTERVAL
+    matcher._publish_status()
+    assert sent(matcher) == {}
+
+
+def test_status_hash_has_depth_and_estimate_per_speed(matcher, clock):
+    join(matcher, 'a', 990.0)
+    join(matcher, 'b', 990.0, speed='bullet')
+    join(matcher, 'c', 991.0, speed='bullet')
+    matcher.wait_estimate['bullet'] = 12.4
+    matcher._publish_status()
+
+    status = queue_store.status_snapshot()
+    assert {speed: (s['depth'], s['estimated_wait_seconds']) for speed, s in status.items()} == {
+        'blitz': (1, None), 'bullet': (2, 12),
+    }
+    assert set(json.loads(queue_store.get_queue_redis().hget(KEY_STATUS, 'blitz'))) == {
+        'depth', 'estimated_wait_seconds', 'updated_at'}
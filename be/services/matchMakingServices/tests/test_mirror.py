@@ -0,0 +1,74 @@
+import fakeredis
+import pytest
+from flask import Flask
+
+import queue_store
+from db.models.queue import MatchQueue
+from extensions import db
+from mirror import GROUP, KEY_MIRROR_LEASE, QueueMirror
+from queue_store import QUEUE_EVENTS_KEY
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(queue_store, '_redis', fakeredis.FakeRedis(decode_responses=True))
+    monkeypatch.setattr(queue_store, '_scripts', {})
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        queue_store.get_queue_redis().xgroup_create(QUEUE_EVENTS_KEY, GROUP, id='0', mkstream=True)
+        yield app
+        db.drop_all()
+
+
+def rows():
+    return {row.user_id: row.elo for row in MatchQueue.query}
+
+
+def test_only_the_lease_holder_mirrors(app):
+    first, second = QueueMirror(app), QueueMirror(app)
+    assert first._hold_lease() is True
+    assert second._hold_lease() is False
+
+    queue_store.get_queue_redis().delete(KEY_MIRROR_LEASE)  # first stalled past its TTL
+    assert second._hold_lease() is True
+    assert first._hold_lease() is False
+
+
+def test_pending_events_are_applied_before_newer_ones(app):
+    r = queue_store.get_queue_redis()
+    stalled, mirror = QueueMirror(app), QueueMirror(app)
+    queue_store.join('u1', 1200, 'blitz', 0, 3000)
+    # A previous leader read the join and died before applying it
+    r.xreadgroup(GROUP, stalled.consumer, {QUEUE_EVENTS_KEY: '>'}, count=10)
+    queue_store.leave('u1')
+    queue_store.join('u2', 1300, 'blitz', 0, 3000)
+
+    assert mirror._hold_lease()
+    for _ in range(3):
+        mirror.step()
+    assert rows() == {'u2': 1300}
+    assert r.xpending(QUEUE_EVENTS_KEY, GROUP)['pending'] == 0
+
+
+def test_failed_batch_is_retried_before_reading_on(app, monkeypatch):
+    mirror = QueueMirror(app)
+    assert mirror._hold_lease()
+    mirror.step()  # Nothing pending
+    queue_store.join('u1', 1200, 'blitz', 0, 3000)
+
+    apply = mirror._apply
+    monkeypatch.setattr(mirror, '_apply', lambda events: (_ for _ in ()).throw(RuntimeError('db down')))
+    with pytest.raises(RuntimeError):
+        mirror.step()
+    mirror.catch_up = True  # What _run does on an error
+    monkeypatch.setattr(mirror, '_apply', apply)
+    queue_store.leave('u1')
+
+    mirror.step()
+    assert rows() == {'u1': 1200}
+    mirror.step()
+    mirror.step()
+    assert rows() == {}
@@ -0,0 +1,100 @@
+import random
+
+import pytest
+
+from pairing import BandMaxWeight, WindowedGreedy, get_strategy, match_quality
+from queue_index import QueueEntry
+
+NOW = 10000.0
+
+
+def random_entries(rng, n):
+    entries = []
+    for i in range(n):
+        elo = rng.randint(1000, 1600)
+        entries.append(QueueEntry(f"u{i}", elo, 'blitz', elo - rng.randint(50, 300), elo + rng.randint(50, 300),
+                                  NOW - rng.uniform(0, 90)))
+    return sorted(entries, key=lambda e: e.elo)
+
+
+def total(strategy, pairs):
+    return sum(strategy.weight(a, b, NOW) for a, b in pairs)
+
+
+def brute_force(strategy, entries):
+    """Best total over every matching of the band edges (tiny inputs only)."""
+    weights = strategy._band_weights(entries, NOW)
+
+    def best(i, taken):
+        if i >= len(entries):
+            return 0.0
+        if i in taken:
+            return best(i + 1, taken)
+        top = best(i + 1, taken)
+        for d, w in enumerate(weights[i], start=1):
+            if w > 0 and i + d not in taken:
+                top = max(top, w + best(i + 1, taken | {i + d}))
+        return top
+
+    return best(0, frozenset())
+
+
+def assert_valid(entries, pairs):
+    used = [e.user_id for pair in pairs for e in pair]
+    assert len(used) == len(set(used))
+    for a, b in pairs:
+        assert a.compatible(b)
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_band_max_weight_is_optimal(seed):
+    rng = random.Random(seed)
+    k = rng.randint(1, 4)
+    entries = random_entries(rng, rng.randint(0, 11))
+    strategy = BandMaxWeight(k=k)
+    pairs = strategy.pair(entries, NOW)
+    assert_valid(entries, pairs)
+    assert total(strategy, pairs) == pytest.approx(brute_force(strategy, entries))
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_greedy_is_valid_and_never_beats_the_optimum(seed):
+    rng = random.Random(100 + seed)
+    entries = random_entries(rng, 40)
+    greedy, exact = WindowedGreedy(k=4), BandMaxWeight(k=4)
+    greedy_pairs = greedy.pair(entries, NOW)
+    assert_valid(entries, greedy_pairs)
+    assert total(greedy, greedy_pairs) <= total(exact, exact.pair(entries, NOW)) + 1e-9
+
+
+def test_max_weight_finds_the_matching_greedy_misses():
+    # b-c is the single best pair, but taking it strands a and d
+    a = QueueEntry('a', 1000, 'blitz', 900, 1100, NOW)
+    b = QueueEntry('b', 1090, 'blitz', 900, 1200, NOW)
+    c = QueueEntry('c', 1100, 'blitz', 1000, 1200, NOW)
+    d = QueueEntry('d', 1190, 'blitz', 1100, 1300, NOW)
+    entries = [a, b, c, d]
+    assert len(WindowedGreedy(k=3).pair(entries, NOW)) == 1
+    assert {(x.user_id, y.user_id) for x, y in BandMaxWeight(k=3).pair(entries, NOW)} == {('a', 'b'), ('c', 'd')}
+
+
+def test_custom_compatibility_is_used():
+    entries = random_entries(random.Random(1), 10)
+    assert BandMaxWeight().pair(entries, NOW, compatible=lambda a, b, now: False) == []
+
+
+def test_get_strategy():
+    assert get_strategy('immediate') is None and get_strategy('') is None
+    assert isinstance(get_strategy('max_weight', k=3), BandMaxWeight)
+    assert get_strategy('greedy').k == 4
+    with pytest.raises(ValueError):
+        get_strategy('hungarian')
+
+
+def test_match_quality():
+    a = QueueEntry('a', 1000, 'blitz', 0, 3000, NOW - 10)
+    b = QueueEntry('b', 1100, 'blitz', 0, 3000, NOW - 30)
+    assert match_quality([(a, b)], NOW) == {'matches': 1, 'avg_elo_gap': 100.0, 'max_elo_gap': 100,
+                                            'avg_wait_seconds': 20.0}
+    assert match_quality([(a, b)], None, matched_at=[NOW - 10])['avg_wait_seconds'] == 10.0
+    assert match_quality([], NOW)['matches'] == 0
@@ -0,0 +1,100 @@
+import pytest
+
+from queue_index import QueueEntry, QueueIndex, SpeedQueue, WindowSchedule
+
+NOW = 2000.0
+
+
+def entry(user_id, elo, lo=None, hi=None, joined_at=1000.0, speed='blitz'):
+    return QueueEntry(user_id, elo, speed, elo - 100 if lo is None else lo, elo + 100 if hi is None else hi, joined_at)
+
+
+@pytest.fixture
+def queue():
+    # No widening: windows are exactly the entries' own ranges
+    return SpeedQueue(WindowSchedule(depth_reference=0))
+
+
+def test_empty_queue_has_no_opponent(queue):
+    me = entry('me', 1500)
+    assert queue.best_opponent(me, now=NOW) is None
+    queue.add(me)
+    assert queue.best_opponent(me, now=NOW) is None  # Never yourself
+
+
+def test_same_elo_opponent_is_not_confused_with_yourself(queue):
+    me, twin = entry('me', 1500, joined_at=1001.0), entry('twin', 1500, joined_at=1002.0)
+    queue.add(me)
+    queue.add(twin)
+    assert queue.best_opponent(me, now=NOW) is twin
+    assert queue.best_opponent(twin, now=NOW) is me
+
+
+@pytest.mark.parametrize('elo, found', [(1400, True), (1399, False), (1600, True), (1601, False)])
+def test_own_band_edges_are_inclusive(queue, elo, found):
+    me = entry('me', 1500, 1400, 1600)
+    queue.add(me)
+    queue.add(entry('other', elo, 0, 3000))
+    assert (queue.best_opponent(me, now=NOW) is not None) == found
+
+
+@pytest.mark.parametrize('lo, found', [(1500, True), (1501, False)])
+def test_opponent_band_must_accept_me_too(queue, lo, found):
+    me = entry('me', 1500, 1400, 1600)
+    queue.add(me)
+    queue.add(entry('other', 1450, lo, 1700))
+    assert (queue.best_opponent(me, now=NOW) is not None) == found
+
+
+def test_closest_elo_wins_over_waiting_longer(queue):
+    me = entry('me', 1500)
+    queue.add(me)
+    queue.add(entry('far', 1560, joined_at=1.0))
+    queue.add(entry('near', 1470, joined_at=1999.0))
+    assert queue.best_opponent(me, now=NOW).user_id == 'near'
+
+
+def test_tie_across_sides_goes_to_the_longest_waiting(queue):
+    me = entry('me', 1500)
+    queue.add(me)
+    queue.add(entry('below', 1480, joined_at=1005.0))
+    queue.add(entry('above', 1520, joined_at=1003.0))
+    assert queue.best_opponent(me, now=NOW).user_id == 'above'
+
+
+@pytest.mark.parametrize('elo', [1490, 1510])
+def test_tie_within_a_side_goes_to_the_longest_waiting(queue, elo):
+    me = entry('me', 1500)
+    queue.add(me)
+    # Added in the opposite order to joined_at
+    for user_id, joined_at in (('late', 1009.0), ('mid', 1005.0), ('early', 1002.0)):
+        queue.add(entry(user_id, elo, joined_at=joined_at))
+    assert queue.best_opponent(me, now=NOW).user_id == 'early'
+
+    # An incompatible entry at the same ELO is skipped, not the whole ELO
+    queue.add(entry('earliest', elo, 1501, 1700, joined_at=1000.0))
+    assert queue.best_opponent(me, now=NOW).user_id == 'early'
+
+
+def test_incompatible_nearest_is_passed_over(queue):
+    me = entry('me', 1500)
+    queue.add(me)
+    queue.add(entry('picky', 1501, 1550, 1700))
+    queue.add(entry('ok', 1540))
+    assert queue.best_opponent(me, now=NOW).user_id == 'ok'
+
+
+def test_index_keeps_speeds_apart_and_moves_rejoins():
+    index = QueueIndex(WindowSchedule(depth_reference=0))
+    index.add(entry('a', 1500, speed='blitz'))
+    index.add(entry('b', 1500, speed='bullet'))
+    me = entry('me', 1500, speed='blitz')
+    index.add(me)
+    assert index.queue('blitz').best_opponent(me, now=NOW).user_id == 'a'
+
+    moved = entry('a', 1500, speed='Bullet')
+    index.add(moved)
+    assert len(index) == 3 and index.queue('blitz').get('a') is None
+    assert index.queue('bullet').get('a') is moved
+    assert index.queue('blitz').best_opponent(me, now=NOW) is None
+    assert index.remove('a') is moved and index.remove('a') is None
@@ -0,0 +1,84 @@
+import fakeredis
+import pytest
+import redis
+
+import queue_store
+from queue_store import KEY_ENTRY, KEY_QUEUE, QUEUE_EVENTS_KEY
+
+
+@pytest.fixture
+def r(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(queue_store, '_redis', client)
+    monkeypatch.setattr(queue_store, '_scripts', {})
+    return client
+
+
+def events(r):
+    return [fields['type'] for _, fields in r.xrange(QUEUE_EVENTS_KEY)]
+
+
+def test_join_leave_and_rejoin_in_another_speed(r):
+    assert queue_store.join('u1', 1200, 'Blitz', 1100, 1300, 10.0) == 10.0
+    assert r.zscore(KEY_QUEUE.format(speed='blitz'), 'u1') == 1200
+    assert queue_store.speeds() == ['blitz']
+
+    queue_store.join('u1', 1250, 'standard', 1100, 1400)
+    assert r.zscore(KEY_QUEUE.format(speed='blitz'), 'u1') is None
+    assert r.zscore(KEY_QUEUE.format(speed='standard'), 'u1') == 1250
+
+    assert queue_store.leave('u1') is True
+    assert queue_store.leave('u1') is False
+    assert r.zcard(KEY_QUEUE.format(speed='standard')) == 0
+    assert not r.exists(KEY_ENTRY.format(user_id='u1'))
+    assert events(r) == ['join', 'join', 'leave']
+
+
+def test_script_refuses_when_the_speed_changed_since_it_was_read(r):
+    queue_store.join('u1', 1200, 'blitz', 0, 3000)
+    script = queue_store._script('leave')
+    stale = script(keys=[KEY_ENTRY.format(user_id='u1'), QUEUE_EVENTS_KEY, KEY_QUEUE.format(speed='standard')],
+                   args=['u1', 100, 'standard'])
+    assert stale is None
+    assert r.zscore(KEY_QUEUE.format(speed='blitz'), 'u1') == 1200
+
+
+def test_join_gives_up_if_the_entry_keeps_changing(r, monkeypatch):
+    monkeypatch.setattr(queue_store, '_script', lambda name: lambda keys, args: None)
+    with pytest.raises(redis.WatchError):
+        queue_store.join('u1', 1200, 'blitz', 0, 3000)
+
+
+def entry(r, user_id):
+    return queue_store.entry_from_fields(r.hgetall(KEY_ENTRY.format(user_id=user_id)))
+
+
+def test_claim_pair(r):
+    queue_store.join('a', 1200, 'blitz', 1100, 1300, 1.0)
+    queue_store.join('b', 1250, 'blitz', 1100, 1300, 2.0)
+    a, b = entry(r, 'a'), entry(r, 'b')
+
+    assert queue_store.claim_pair(a, b) is True
+    assert r.zcard(KEY_QUEUE.format(speed='blitz')) == 0
+    assert queue_store.is_queued(['a', 'b']) == {'a': False, 'b': False}
+    assert queue_store.claim_pair(a, b) is False
+    assert events(r)[-1] == 'matched'
+
+
+def test_claim_pair_checks_speed_and_windows(r):
+    queue_store.join('a', 1200, 'blitz', 1100, 1300)
+    queue_store.join('b', 1500, 'blitz', 1400, 1600)
+    queue_store.join('c', 1210, 'standard', 1100, 1300)
+    a, b, c = entry(r, 'a'), entry(r, 'b'), entry(r, 'c')
+
+    assert queue_store.claim_pair(a, c) is False
+    assert queue_store.claim_pair(a, b) is False
+    assert queue_store.claim_pair(a, b, widen_a=200, widen_b=200) is True
+
+
+def test_requeue_keeps_the_join_time(r):
+    queue_store.join('a', 1200, 'blitz', 0, 3000, 5.0)
+    a = entry(r, 'a')
+    queue_store.leave('a')
+    queue_store.requeue(a)
+    assert entry(r, 'a').joined_at == 5.0
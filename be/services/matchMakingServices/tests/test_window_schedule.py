@@ -0,0 +1,55 @@
+import pytest
+
+from queue_index import MAX_ELO_GAP, QueueEntry, SpeedQueue, WindowSchedule
+
+
+def test_parse_sorts_steps():
+    schedule = WindowSchedule.parse('30:100, 0:0,15:50', depth_reference=0)
+    assert schedule.times == [0.0, 15.0, 30.0]
+    assert schedule.extras == [0, 50, 100]
+    assert schedule.max_widen == 100
+    assert WindowSchedule.parse('').extras == [0]
+
+
+@pytest.mark.parametrize('waited, extra', [(0, 0), (14.9, 0), (15, 50), (29, 50), (30, 100), (10000, 100)])
+def test_widen_is_a_step_function(waited, extra):
+    schedule = WindowSchedule.parse('0:0,15:50,30:100', depth_reference=0)
+    assert schedule.widen(waited, depth=1) == extra
+
+
+def test_shallow_queues_run_the_clock_faster():
+    schedule = WindowSchedule.parse('0:0,15:50,30:100', depth_reference=50, max_depth_factor=3.0)
+    assert schedule.depth_factor(50) == schedule.depth_factor(500) == 1.0
+    assert schedule.depth_factor(25) == 2.0
+    assert schedule.depth_factor(1) == schedule.depth_factor(0) == 3.0
+    assert schedule.widen(10, depth=100) == 0
+    assert schedule.widen(10, depth=25) == 50   # 20s on a 2x clock
+    assert schedule.widen(10, depth=1) == 100   # 30s on a 3x clock
+
+
+def test_schedule_without_a_zero_step():
+    schedule = WindowSchedule(((10, 40),), depth_reference=0)
+    assert schedule.widen(5, 1) == 0
+    assert schedule.widen(10, 1) == 40
+
+
+def test_waiting_widens_who_can_be_matched():
+    queue = SpeedQueue(WindowSchedule.parse('0:0,30:150', depth_reference=0))
+    me = QueueEntry('me', 1500, 'blitz', 1400, 1600, joined_at=1000.0)
+    far = QueueEntry('far', 1700, 'blitz', 1600, 1800, joined_at=1000.0)
+    queue.add(me)
+    queue.add(far)
+
+    assert queue.best_opponent(me, now=1010.0) is None
+    assert queue.best_opponent(me, now=1030.0) is far
+    assert queue.compatible(me, far, now=1030.0)
+
+    # Open ranges still stop at the max gap, widened with the window
+    queue = SpeedQueue(WindowSchedule.parse('0:0,30:150', depth_reference=0))
+    me = QueueEntry('me', 1500, 'blitz', 0, 3000, joined_at=1000.0)
+    queue.add(me)
+    queue.add(QueueEntry('too_far', 1500 + MAX_ELO_GAP + 151, 'blitz', 0, 3000, joined_at=1000.0))
+    assert queue.best_opponent(me, now=5000.0) is None
+    queue.add(QueueEntry('just', 1500 + MAX_ELO_GAP + 150, 'blitz', 0, 3000, joined_at=1000.0))
+    assert queue.best_opponent(me, now=1010.0) is None
+    assert queue.best_opponent(me, now=5000.0).user_id == 'just'
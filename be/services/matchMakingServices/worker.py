@@ -0,0 +1,42 @@
+"""
+Standalone matcher worker: python worker.py
+
+Runs the matcher (and the match_queue mirror) outside the API process.
+Start as many as needed; they split the game speeds between them through
+leases (leases.py), or take the speeds in MATCH_SPEEDS. SIGTERM/SIGINT stop
+it after the current round: claimed pairs get their games (or go back in the
+queue) and the leases are released for the other workers.
+"""
+import logging
+import signal
+
+from config import Config
+from main import app
+from matcher import Matcher
+from mirror import QueueMirror
+from leases import SpeedLeases
+
+logger = logging.getLogger("MatcherWorker")
+
+
+def main():
+    leases = SpeedLeases(ttl_ms=Config.MATCH_LEASE_TTL_MS, speeds=Config.MATCH_SPEEDS)
+    matcher = Matcher(app, leases=leases)
+    mirror = QueueMirror(app)
+
+    def shutdown(signum, frame):
+        logger.info(f"Received signal {signum}, stopping matcher.")
+        matcher.stop()
+        mirror.running = False
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    mirror.start()
+    logger.info(f"Matcher worker {leases.node_id} starting (tick {Config.MATCH_TICK_SECONDS}s, "
+                f"speeds {Config.MATCH_SPEEDS or 'balanced'}).")
+    matcher.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+"""Code shared by the services that check Supabase access tokens."""
@@ -0,0 +1,222 @@
+"""
+Local verification of Supabase access tokens.
+
+Replaces a ``supabase.auth.get_user(token)`` round trip per request. Tokens
+are checked here against signing keys we already hold: the project's HS256
+secret (SUPABASE_JWT_SECRET) and the project's JWKS for asymmetric keys. The
+JWKS is only fetched from Supabase when a token names a key id we have not
+seen, and at most once per JWKS_MIN_REFRESH_SECONDS, so forged key ids
+cannot turn into a request flood.
+
+Each key accepts one algorithm, fixed by the key rather than the token
+header: HS256 for the secret, the JWK's ``alg`` (or its kty/crv default) for
+JWKS keys.
+
+Verified claims are cached (bounded LRU, TOKEN_CACHE_SIZE entries) until the
+token expires or TOKEN_CACHE_TTL_SECONDS, whichever comes first. ``revoke``
+drops a token (e.g. on logout) in this process until it expires.
+
+Used by authServices and userProfileServices; installed from be/services/shared.
+
+Set TOKEN_VERIFIER=stub to use StubTokenVerifier instead: it accepts only
+tokens it issued itself and never touches the network, for tests and local
+runs without Supabase.
+"""
+import hashlib
+import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+def token_hash(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class VerifiedUser:
+    """The parts of a Supabase user the routes use, read from token claims."""
+    __slots__ = ('id', 'email', 'user_metadata', 'claims')
+
+    def __init__(self, claims):
+        self.id = claims['sub']
+        self.email = claims.get('email')
+        self.user_metadata = claims.get('user_metadata') or {}
+        self.claims = claims
+
+
+class TokenVerifier:
+    def __init__(self, secret=None, jwks_url=None, audience='authenticated', cache_size=10000,
+                 cache_ttl=300, jwks_min_refresh=60, leeway=0):
+        self.secret = secret
+        self.audience = audience or None
+        self.leeway = leeway
+        self.jwks_client = jwt.PyJWKClient(jwks_url, cache_keys=False) if jwks_url else None
+        self.jwks_min_refresh = jwks_min_refresh
+        self.keys = {}  # kid -> (key, the one algorithm it accepts)
+        self.last_jwks_fetch = 0.0
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.cache = OrderedDict()  # token hash -> (claims, cache until)
+        self.revoked = {}  # token hash -> forget after (the token's exp)
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        url = config.get('SUPABASE_URL')
+        return cls(
+            secret=config.get('SUPABASE_JWT_SECRET'),
+            jwks_url=f"{url.rstrip('/')}/auth/v1/.well-known/jwks.json" if url else None,
+            audience=config.get('SUPABASE_JWT_AUDIENCE'),
+            cache_size=config.get('TOKEN_CACHE_SIZE', 10000),
+            cache_ttl=config.get('TOKEN_CACHE_TTL_SECONDS', 300),
+            jwks_min_refresh=config.get('JWKS_MIN_REFRESH_SECONDS', 60),
+        )
+
+    def verify_user(self, token):
+        """VerifiedUser for a valid token, else None."""
+        claims = self.verify(token)
+        if not claims or not claims.get('sub'):
+            return None
+        return VerifiedUser(claims)
+
+    def verify(self, token):
+        """Claims of a valid token, else None."""
+        if not token:
+            return None
+        digest = token_hash(token)
+        now = time.time()
+        with self.lock:
+            if digest in self.revoked:
+                return None
+            hit = self.cache.get(digest)
+            if hit is not None:
+                claims, until = hit
+                if until > now:
+                    self.cache.move_to_end(digest)
+                    return claims
+                del self.cache[digest]
+
+        claims = self._decode(token)
+        if claims is None:
+            return None
+        until = min(claims.get('exp') or now + self.cache_ttl, now + self.cache_ttl)
+        with self.lock:
+            if digest in self.revoked:
+                return None
+            self.cache[digest] = (claims, until)
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return claims
+
+    def _decode(self, token):
+        try:
+            header = jwt.get_unverified_header(token)
+            alg = header.get('alg')
+            kid = header.get('kid')
+            if alg == 'HS256':
+                if not self.secret:
+                    logger.warning("HS256 token but SUPABASE_JWT_SECRET is not set")
+                    return None
+                key, allowed = self.secret, 'HS256'
+            else:
+                signing_key = self._signing_key(kid)
+                if signing_key is None:
+                    logger.warning(f"No signing key for token (alg={alg}, kid={kid})")
+                    return None
+                key, allowed = signing_key
+                if alg != allowed:
+                    logger.warning(f"Token alg {alg} does not match key {kid} ({allowed})")
+                    return None
+            return jwt.decode(
+                token, key, algorithms=[allowed], audience=self.audience, leeway=self.leeway,
+                options={'verify_aud': self.audience is not None},
+            )
+        except jwt.ExpiredSignatureError:
+            logger.info("Token expired")
+        except jwt.InvalidTokenError as e:
+            logger.warning(f"Invalid token: {e}")
+        except Exception as e:
+            logger.error(f"Token verification error: {e}")
+        return None
+
+    def _signing_key(self, kid):
+        if not kid:
+            return None
+        signing_key = self.keys.get(kid)
+        if signing_key is not None or self.jwks_client is None:
+            return signing_key
+        # Unknown key id: the project may have rotated keys. Refetch, rate limited.
+        with self.lock:
+            if time.time() - self.last_jwks_fetch < self.jwks_min_refresh:
+                return self.keys.get(kid)
+            self.last_jwks_fetch = time.time()
+        try:
+            keys = {k.key_id: (k.key, k.algorithm_name)
+                    for k in self.jwks_client.get_jwk_set(refresh=True).keys if k.key_id}
+        except Exception as e:
+            logger.error(f"JWKS fetch failed: {e}")
+            return None
+        self.keys = keys
+        logger.info(f"Loaded {len(keys)} signing keys from JWKS")
+        return keys.get(kid)
+
+    def revoke(self, token):
+        """Stop accepting ``token`` in this process (until it would have expired)."""
+        digest = token_hash(token)
+        now = time.time()
+        try:
+            # Only decides how long to remember the revocation
+            exp = jwt.decode(token, options={'verify_signature': False}).get('exp')
+        except jwt.InvalidTokenError:
+            exp = None
+        with self.lock:
+            self.cache.pop(digest, None)
+            self.revoked[digest] = exp or now + 86400
+            for stale in [d for d, until in self.revoked.items() if until < now]:
+                del self.revoked[stale]
+
+
+class StubTokenVerifier(TokenVerifier):
+    """Accepts only tokens from ``issue``; no keys, no network."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.issued = {}
+
+    def issue(self, user_id, email=None, ttl=3600, **user_metadata):
+        token = secrets.token_urlsafe(24)
+        self.issued[token] = {
+            'sub': str(user_id),
+            'email': email,
+            'user_metadata': user_metadata,
+            'exp': int(time.time()) + ttl,
+        }
+        return token
+
+    def _decode(self, token):
+        claims = self.issued.get(token)
+        if claims is None or claims['exp'] <= time.time():
+            return None
+        return claims
+
+
+def init_token_verifier(app):
+    if app.config.get('TOKEN_VERIFIER') == 'stub':
+        app.logger.warning("Using stub token verifier; only locally issued tokens are accepted.")
+        verifier = StubTokenVerifier()
+    else:
+        verifier = TokenVerifier.from_config(app.config)
+        if not verifier.secret and not verifier.jwks_client:
+            app.logger.warning("SUPABASE_JWT_SECRET and SUPABASE_URL not set. Auth verification will fail.")
+    app.extensions['token_verifier'] = verifier
+    return verifier
+
+
+def get_token_verifier():
+    return current_app.extensions['token_verifier']
@@ -0,0 +1 @@
+"""Redis leases that split a set of work items between service replicas."""
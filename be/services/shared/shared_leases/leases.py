@@ -0,0 +1,129 @@
+"""
+Ownership of a set of work items (deadline shards, queue speeds) across the
+replicas of a service, each item worked by one replica at a time.
+
+Every replica heartbeats into a members sorted set (scored by when its
+heartbeat expires) and holds a lease on each item it works. A lease is a
+plain ``SET NX PX`` owned by the replica's node id; renewal and release are
+compare-and-set scripts, so a replica can never extend or drop a lease
+someone else took over after it stalled.
+
+Each replica aims for ceil(items / live members) leases: it releases the
+excess when members join and picks up orphaned items (their lease expired)
+when members leave. Items are tried in rendezvous-hash order, so replicas
+prefer different items and ownership stays put across restarts.
+
+A pinned replica takes every one of its own items whose lease is free
+instead, and does not heartbeat, so the balancing replicas split every item
+between them.
+
+Used by gameServices (timeout shards) and matchMakingServices (matcher
+speeds); installed from be/services/shared.
+"""
+import logging
+import math
+import os
+import socket
+import time
+import uuid
+import zlib
+
+logger = logging.getLogger(__name__)
+
+LUA_RENEW_LEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+LUA_RELEASE_LEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def node_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class Leases:
+    """
+    ``items`` returns the current items; ``lease_key`` maps an item to its
+    lease key. ``pinned`` fixes the items this replica works. ``name`` is
+    only used in log messages.
+    """
+
+    def __init__(self, redis_client, members_key, lease_key, items, ttl_ms=10000, pinned=None, name="work"):
+        self.redis = redis_client
+        self.members_key = members_key
+        self.lease_key = lease_key
+        self.items = items
+        self.ttl_ms = ttl_ms
+        self.pinned = set(pinned) if pinned else None
+        self.name = name
+        self.node_id = node_id()
+        self.owned = set()
+        self._renew = self.redis.register_script(LUA_RENEW_LEASE)
+        self._release = self.redis.register_script(LUA_RELEASE_LEASE)
+
+    def _rank(self, item):
+        # Rendezvous order: every replica ranks the items differently.
+        return zlib.crc32(f"{self.node_id}:{item}".encode())
+
+    def refresh(self):
+        """Heartbeat, renew held leases and rebalance. Call well within the TTL."""
+        now_ms = int(time.time() * 1000)
+        pipe = self.redis.pipeline(transaction=False)
+        if self.pinned is None:
+            # Pinned replicas stay out of the count: the balancing replicas
+            # must cover every item the pinned ones don't hold.
+            pipe.zadd(self.members_key, {self.node_id: now_ms + self.ttl_ms})
+        pipe.zremrangebyscore(self.members_key, "-inf", now_ms)
+        pipe.zcard(self.members_key)
+        members = pipe.execute()[-1]
+
+        held = sorted(self.owned)
+        if held:
+            pipe = self.redis.pipeline(transaction=False)
+            for item in held:
+                self._renew(keys=[self.lease_key(item)], args=[self.node_id, self.ttl_ms], client=pipe)
+            lost = {item for item, ok in zip(held, pipe.execute()) if not ok}
+            if lost:
+                logger.warning(f"Lost {self.name} leases {sorted(lost)}")
+            self.owned -= lost
+
+        if self.pinned is not None:
+            candidates = self.pinned
+            target = len(candidates)
+        else:
+            candidates = set(self.items())
+            target = math.ceil(len(candidates) / max(members, 1))
+
+        if len(self.owned) > target:
+            # Hand back the items we like least so a newcomer can take them.
+            self._release_many(sorted(self.owned, key=self._rank)[target:])
+        elif len(self.owned) < target:
+            for item in sorted(candidates, key=self._rank):
+                if len(self.owned) >= target:
+                    break
+                if item in self.owned:
+                    continue
+                if self.redis.set(self.lease_key(item), self.node_id, nx=True, px=self.ttl_ms):
+                    self.owned.add(item)
+        return set(self.owned)
+
+    def release_all(self):
+        self._release_many(list(self.owned))
+        self.redis.zrem(self.members_key, self.node_id)
+
+    def _release_many(self, items):
+        if not items:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        for item in items:
+            self._release(keys=[self.lease_key(item)], args=[self.node_id], client=pipe)
+        pipe.execute()
+        self.owned -= set(items)
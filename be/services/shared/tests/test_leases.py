@@ -0,0 +1,92 @@
+import fakeredis
+import pytest
+
+from shared_leases.leases import Leases
+
+MEMBERS = 'test:members'
+
+
+def lease_key(item):
+    return f"test:lease:{item}"
+
+
+@pytest.fixture
+def r():
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture
+def make(r):
+    items = {'a', 'b', 'c', 'd'}
+
+    def make(**kwargs):
+        return Leases(r, MEMBERS, lease_key, lambda: items, **kwargs)
+
+    make.items = items
+    return make
+
+
+def test_single_replica_takes_every_item(r, make):
+    node = make()
+    assert node.refresh() == {'a', 'b', 'c', 'd'}
+    assert r.get(lease_key('a')).decode() == node.node_id
+    assert 0 < r.pttl(lease_key('a')) <= 10000
+
+
+def test_items_rebalance_when_replicas_join_and_leave(r, make):
+    a, b, c = make(), make(), make()
+    a.refresh()
+    b.refresh()          # Two members now; a still holds everything
+    a.refresh()          # a hands back its excess
+    b.refresh()          # and b picks it up
+    assert len(a.owned) == len(b.owned) == 2
+    assert a.owned.isdisjoint(b.owned)
+
+    for node in (c, a, b, c):
+        node.refresh()
+    # ceil(4 / 3) = 2 each: the two holders keep theirs, nothing is doubled
+    assert all(len(n.owned) <= 2 for n in (a, b, c))
+    assert a.owned | b.owned | c.owned == make.items
+    assert len(a.owned) + len(b.owned) + len(c.owned) == 4
+
+    c.release_all()
+    assert r.zscore(MEMBERS, c.node_id) is None
+    a.refresh()
+    b.refresh()
+    assert a.owned | b.owned == make.items
+
+
+def test_new_items_are_picked_up(make):
+    node = make()
+    node.refresh()
+    make.items.add('e')
+    assert 'e' in node.refresh()
+
+
+def test_lost_lease_is_dropped_and_left_alone(r, make):
+    a, b = make(), make()
+    a.refresh()
+    r.set(lease_key('a'), b.node_id)  # a stalled past its TTL and b took it
+    assert 'a' not in a.refresh()
+    assert r.get(lease_key('a')).decode() == b.node_id
+
+    a.release_all()  # Must not drop b's lease
+    assert r.get(lease_key('a')).decode() == b.node_id
+    assert r.get(lease_key('b')) is None and a.owned == set()
+
+
+def test_renewal_extends_held_leases(r, make):
+    node = make(ttl_ms=10000)
+    node.refresh()
+    r.pexpire(lease_key('a'), 50)
+    node.refresh()
+    assert r.pttl(lease_key('a')) > 5000
+
+
+def test_pinned_replica_takes_only_its_items_and_does_not_count(r, make):
+    pinned = make(pinned=['a'])
+    other = make()
+    assert pinned.refresh() == {'a'}
+    assert other.refresh() == {'b', 'c', 'd'}
+    assert r.zscore(MEMBERS, pinned.node_id) is None
+    assert r.zcard(MEMBERS) == 1
@@ -0,0 +1,135 @@
+import json
+import time
+
+import jwt
+import pytest
+from flask import Flask
+
+from shared_auth.token_verifier import (
+    StubTokenVerifier, TokenVerifier, get_token_verifier, init_token_verifier,
+)
+
+SECRET = 'test-secret-that-is-at-least-32-bytes-long'
+
+
+def claims(sub='u1', **extra):
+    now = int(time.time())
+    return dict({'sub': sub, 'aud': 'authenticated', 'exp': now + 60,
+                 'email': 'a@example.com', 'user_metadata': {'username': 'al'}}, **extra)
+
+
+def hs256(payload, key=SECRET, **kwargs):
+    return jwt.encode(payload, key, algorithm='HS256', **kwargs)
+
+
+class FakeJWKSClient:
+    """Stands in for jwt.PyJWKClient; counts fetches."""
+
+    def __init__(self, jwks):
+        self.jwks = jwks
+        self.fetches = 0
+
+    def get_jwk_set(self, refresh=False):
+        self.fetches += 1
+        return jwt.PyJWKSet.from_dict(self.jwks)
+
+
+@pytest.fixture
+def rsa_key():
+    pytest.importorskip('cryptography')
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private.public_key()))
+    jwk.update(kid='k1', alg='RS256')
+    return private, {'keys': [jwk]}
+
+
+def test_valid_token_gives_user_and_is_cached():
+    verifier = TokenVerifier(secret=SECRET)
+    token = hs256(claims())
+    decodes = []
+    decode = verifier._decode
+    verifier._decode = lambda t: decodes.append(t) or decode(t)
+
+    user = verifier.verify_user(token)
+    assert (user.id, user.email, user.user_metadata) == ('u1', 'a@example.com', {'username': 'al'})
+    assert verifier.verify_user(token).id == 'u1'
+    assert len(decodes) == 1
+
+
+@pytest.mark.parametrize('token', [
+    hs256(claims(exp=int(time.time()) - 5)),
+    hs256(claims(), key='wrong-secret-that-is-also-32-bytes-long'),
+    hs256(claims(aud='someone-else')),
+    jwt.encode(claims(), None, algorithm='none'),
+])
+def test_rejected_tokens(token):
+    assert TokenVerifier(secret=SECRET).verify(token) is None
+
+
+def test_cached_claims_expire_with_cache_ttl():
+    verifier = TokenVerifier(secret=SECRET, cache_ttl=0)
+    token = hs256(claims())
+    decodes = []
+    decode = verifier._decode
+    verifier._decode = lambda t: decodes.append(t) or decode(t)
+
+    assert verifier.verify(token)
+    assert verifier.verify(token)
+    assert len(decodes) == 2  # ttl 0: verified again every time
+
+
+def test_cache_is_bounded():
+    verifier = TokenVerifier(secret=SECRET, cache_size=2)
+    for n in range(5):
+        verifier.verify(hs256(claims(sub=f'u{n}')))
+    assert len(verifier.cache) == 2
+
+
+def test_revoked_token_is_rejected():
+    verifier = TokenVerifier(secret=SECRET)
+    token = hs256(claims())
+    assert verifier.verify(token)
+    verifier.revoke(token)
+    assert verifier.verify(token) is None
+    assert verifier.verify(hs256(claims(sub='u2')))
+
+
+def test_unknown_kid_refetches_jwks_at_most_once_per_interval(rsa_key):
+    private, jwks = rsa_key
+    verifier = TokenVerifier(secret=SECRET, jwks_min_refresh=60)
+    verifier.jwks_client = FakeJWKSClient(jwks)
+
+    token = jwt.encode(claims(), private, algorithm='RS256', headers={'kid': 'k1'})
+    assert verifier.verify(token)['sub'] == 'u1'
+    assert verifier.jwks_client.fetches == 1
+
+    # Known kid: no fetch. Unknown kids: one more fetch, then rate limited.
+    assert verifier.verify(jwt.encode(claims(sub='u2'), private, algorithm='RS256', headers={'kid': 'k1'}))
+    verifier.last_jwks_fetch = 0
+    for n in range(5):
+        forged = jwt.encode(claims(sub=f'x{n}'), private, algorithm='RS256', headers={'kid': f'nope{n}'})
+        assert verifier.verify(forged) is None
+    assert verifier.jwks_client.fetches == 2
+
+
+def test_jwks_key_only_accepts_its_algorithm(rsa_key):
+    private, jwks = rsa_key
+    verifier = TokenVerifier(secret=SECRET)
+    verifier.jwks_client = FakeJWKSClient(jwks)
+    token = jwt.encode(claims(), private, algorithm='RS512', headers={'kid': 'k1'})
+    assert verifier.verify(token) is None
+
+
+def test_stub_verifier_accepts_only_its_own_tokens():
+    app = Flask(__name__)
+    app.config['TOKEN_VERIFIER'] = 'stub'
+    init_token_verifier(app)
+    with app.app_context():
+        stub = get_token_verifier()
+        assert isinstance(stub, StubTokenVerifier)
+        token = stub.issue('u9', email='b@example.com', username='bob')
+        user = stub.verify_user(token)
+        assert (user.id, user.email, user.user_metadata) == ('u9', 'b@example.com', {'username': 'bob'})
+        assert stub.verify_user(hs256(claims())) is None
+        assert stub.verify_user(stub.issue('u9', ttl=-1)) is None
@@ -2,6 +2,9 @@ from flask import Flask
 from config import config
 from extensions import db, migrate, cors, setup_logging, init_supabase
 from routes import profile_bp, internal_bp
+from shared_auth.token_verifier import init_token_verifier
+from profile_cache import init_profile_cache
+from outcome_processor import init_outcome_processor
 import os
 
 def create_app(config_name='default'):
@@ -25,6 +28,9 @@ def create_app(config_name='default'):
     setup_logging(app)
     setup_logging(app)
     init_supabase(app)
+    init_token_verifier(app)
+    init_profile_cache(app)
+    init_outcome_processor(app)
     
     # Initialize Event Listener
     from event_listener import RedisEventListener
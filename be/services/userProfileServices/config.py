@@ -16,9 +16,23 @@ class Config:
     
     SUPABASE_URL = os.getenv('SUPABASE_URL')
     SUPABASE_KEY = os.getenv('SUPABASE_KEY')
+    # Access tokens are verified locally (see shared/shared_auth/token_verifier.py)
+    SUPABASE_JWT_SECRET = os.getenv('SUPABASE_JWT_SECRET')
+    SUPABASE_JWT_AUDIENCE = os.getenv('SUPABASE_JWT_AUDIENCE', 'authenticated')
+    TOKEN_VERIFIER = os.getenv('TOKEN_VERIFIER', 'supabase')  # 'stub' for tests
+    TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+    TOKEN_CACHE_TTL_SECONDS = int(os.getenv('TOKEN_CACHE_TTL_SECONDS', 300))
+    JWKS_MIN_REFRESH_SECONDS = int(os.getenv('JWKS_MIN_REFRESH_SECONDS', 60))
     REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6383/0')
+    # Profile read cache (see profile_cache.py): 'redis' (REDIS_URL) or 'memory'
+    PROFILE_CACHE_BACKEND = os.getenv('PROFILE_CACHE_BACKEND', 'redis')
+    PROFILE_CACHE_TTL_SECONDS = int(os.getenv('PROFILE_CACHE_TTL_SECONDS', 300))
+    PROFILE_CACHE_MAX_SIZE = int(os.getenv('PROFILE_CACHE_MAX_SIZE', 10000))  # memory backend only
     EVENT_BUS_REDIS_URL = os.getenv('EVENT_BUS_REDIS_URL', 'redis://localhost:6382/0')
     INTERNAL_API_KEY = os.getenv('INTERNAL_API_KEY', 'dev_internal_key')
+    # GAME_COMPLETED micro-batches: wait this long for more events, up to this many
+    OUTCOME_BATCH_WINDOW_MS = int(os.getenv('OUTCOME_BATCH_WINDOW_MS', 50))
+    OUTCOME_BATCH_MAX = int(os.getenv('OUTCOME_BATCH_MAX', 200))
 
 class DevelopmentConfig(Config):
     DEBUG = True
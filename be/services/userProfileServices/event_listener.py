@@ -1,10 +1,9 @@
 import redis
 import json
 import threading
+import time
 import logging
-from flask import current_app
-from db.models.user_profile import UserProfile
-from extensions import db
+from outcome_processor import get_outcome_processor
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +11,9 @@ class RedisEventListener(threading.Thread):
     def __init__(self, app, redis_url, channels):
         threading.Thread.__init__(self)
         self.app = app
+        # GAME_COMPLETED events are applied in micro-batches (see outcome_processor.py)
+        self.batch_max = app.config.get('OUTCOME_BATCH_MAX', 200)
+        self.batch_window = app.config.get('OUTCOME_BATCH_WINDOW_MS', 50) / 1000.0
         self.redis = redis.from_url(redis_url)
         self.pubsub = self.redis.pubsub()
         self.pubsub.subscribe(channels)
@@ -19,29 +21,55 @@ class RedisEventListener(threading.Thread):
 
     def run(self):
         logger.info(f"Starting Redis Event Listener on channels: {self.pubsub.channels}")
-        for message in self.pubsub.listen():
-            if message['type'] == 'message':
+        while True:
+            batch = self.drain()
+            if batch:
                 with self.app.app_context():
-                    self.handle_message(message)
+                    self.handle_batch(batch)
 
-    def handle_message(self, message):
-        try:
-            data = json.loads(message['data'])
-            event_type = data.get('event_type')
-            
-            logger.info(f"Received event: {event_type}")
+    def drain(self):
+        """
+        Wait for a message, then collect whatever else arrives within
+        OUTCOME_BATCH_WINDOW_MS, up to OUTCOME_BATCH_MAX messages.
+        """
+        message = self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+        if message is None:
+            return []
+        batch = [message]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_max:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            message = self.pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+            if message is not None:
+                batch.append(message)
+        return batch
 
-            if event_type == 'GAME_COMPLETED':
-                self.handle_game_completed(data['payload'])
-        except Exception as e:
-            logger.error(f"Error handling event: {e}")
-            self.push_to_dlq(message, str(e))
+    def handle_batch(self, batch):
+        games = []  # (message, payload)
+        for message in batch:
+            try:
+                data = json.loads(message['data'])
+                event_type = data.get('event_type')
+                logger.info(f"Received event: {event_type}")
+                if event_type == 'GAME_COMPLETED':
+                    games.append((message, data['payload']))
+            except Exception as e:
+                logger.error(f"Error handling event: {e}")
+                self.push_to_dlq(message, str(e))
+        if games:
+            self.handle_games_completed(games)
 
     def push_to_dlq(self, message, error):
         """Push failed message to Dead Letter Queue"""
         try:
             dlq_entry = {
-                'message': message,
+                # Only what /admin/retry-dlq needs, as text (pubsub gives bytes)
+                'message': {
+                    'channel': message['channel'].decode() if isinstance(message['channel'], bytes) else message['channel'],
+                    'data': message['data'].decode() if isinstance(message['data'], bytes) else message['data'],
+                },
                 'error': error,
                 'timestamp': __import__('datetime').datetime.utcnow().isoformat()
             }
@@ -51,28 +79,16 @@ class RedisEventListener(threading.Thread):
             logger.critical(f"Failed to push to DLQ: {dlq_error}")
 
 
-    def handle_game_completed(self, payload):
-        from routes import process_game_outcome # delayed import to avoid circular dependency
-        
+    def handle_games_completed(self, games):
         # Payload expected: 
         # { 'player1_id': ..., 'player1_outcome': ..., 'player1_elo_change': ..., 
         #   'player2_id': ..., 'player2_outcome': ..., 'player2_elo_change': ... }
-        
         try:
-            if 'player1_id' in payload:
-                process_game_outcome(
-                    payload['player1_id'], 
-                    payload['player1_elo_change'], 
-                    payload['player1_outcome']
-                )
-                
-            if 'player2_id' in payload and payload['player2_id']:
-                process_game_outcome(
-                    payload['player2_id'], 
-                    payload['player2_elo_change'], 
-                    payload['player2_outcome']
-                )
-                
-            logger.info("Successfully processed GAME_COMPLETED event")
+            failed = get_outcome_processor().process_games([payload for _, payload in games])
         except Exception as e:
-            logger.error(f"Failed to process game outcome: {e}")
+            logger.error(f"Failed to process game outcomes: {e}")
+            failed = [payload for _, payload in games]
+        for message, payload in games:
+            if any(payload is f for f in failed):
+                self.push_to_dlq(message, "Failed to process game outcome")
+        logger.info(f"Processed {len(games) - len(failed)}/{len(games)} GAME_COMPLETED events")
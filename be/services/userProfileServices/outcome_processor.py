@@ -0,0 +1,155 @@
+"""
+Applies game outcomes to profiles in batches.
+
+Each outcome is a single atomic UPDATE (``games_played = games_played + 1``
+and so on, the streak worked out from the row's own values), so concurrent
+games for the same player can no longer overwrite each other's stats the
+way a SELECT then read-modify-write then commit did. A whole batch (both
+players of every game in it) commits in one transaction. If that fails,
+the batch is retried one game per transaction so a bad event only fails
+its own game.
+
+After the commit, the cached profiles are dropped and ``elo_updated`` (for
+the leaderboard) and ``profile_updated`` (for the gateway) go out in one
+pipeline, once per player with that player's final numbers.
+"""
+import json
+import logging
+import time
+import uuid
+from datetime import datetime
+
+import redis
+from flask import current_app
+from sqlalchemy import case, update
+
+from extensions import db
+from db.models.user_profile import UserProfile
+from profile_cache import get_profile_cache
+
+logger = logging.getLogger(__name__)
+
+
+def outcomes_from_payload(payload):
+    """(user_id, elo_change, outcome) for each player of a GAME_COMPLETED payload."""
+    outcomes = []
+    for n in (1, 2):
+        user_id = payload.get(f'player{n}_id')
+        if user_id:
+            outcomes.append((user_id, payload[f'player{n}_elo_change'], payload[f'player{n}_outcome']))
+    return outcomes
+
+
+class OutcomeProcessor:
+    def __init__(self, event_bus):
+        self.event_bus = event_bus
+
+    def process_games(self, payloads):
+        """Apply a batch of GAME_COMPLETED payloads; returns the ones that failed."""
+        if not payloads:
+            return []
+        try:
+            rows = self.apply([o for payload in payloads for o in outcomes_from_payload(payload)])
+            self.publish(rows)
+            return []
+        except Exception as e:
+            logger.error(f"Batch of {len(payloads)} games failed, retrying one by one: {e}")
+
+        failed = []
+        rows = []
+        for payload in payloads:
+            try:
+                rows.extend(self.apply(outcomes_from_payload(payload)))
+            except Exception as e:
+                logger.error(f"Failed to process game {payload.get('game_id')}: {e}")
+                failed.append(payload)
+        self.publish(rows)
+        return failed
+
+    def apply(self, outcomes):
+        """
+        One UPDATE per (user_id, elo_change, outcome), all in one transaction.
+        Returns the updated rows in order; unknown users are skipped.
+        """
+        now = datetime.utcnow()
+        rows = []
+        try:
+            # Same lock order in every transaction. The sort is stable, so one
+            # player's games still apply in the order they came in.
+            for user_id, elo_change, outcome in sorted(outcomes, key=lambda o: str(o[0])):
+                won = outcome == 'win'
+                lost = outcome == 'loss'
+                next_streak = UserProfile.win_streak + 1
+                stmt = (
+                    update(UserProfile)
+                    .where(UserProfile.id == uuid.UUID(str(user_id)))
+                    .values(
+                        elo_rating=UserProfile.elo_rating + elo_change,
+                        games_played=UserProfile.games_played + 1,
+                        games_won=UserProfile.games_won + int(won),
+                        games_lost=UserProfile.games_lost + int(lost),
+                        games_drawn=UserProfile.games_drawn + int(outcome == 'draw'),
+                        # A draw keeps the streak; a loss resets it
+                        win_streak=next_streak if won else (0 if lost else UserProfile.win_streak),
+                        best_win_streak=case(
+                            (next_streak > UserProfile.best_win_streak, next_streak),
+                            else_=UserProfile.best_win_streak,
+                        ) if won else UserProfile.best_win_streak,
+                        updated_at=now,
+                    )
+                    .returning(UserProfile.id, UserProfile.username, UserProfile.elo_rating,
+                               UserProfile.games_played, UserProfile.games_won)
+                    .execution_options(synchronize_session=False)
+                )
+                row = db.session.execute(stmt).first()
+                if row is None:
+                    logger.warning(f"Profile not found for {user_id}, outcome skipped")
+                    continue
+                rows.append(row)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return rows
+
+    def publish(self, rows):
+        if not rows:
+            return
+        latest = {str(row.id): row for row in rows}  # Final numbers per player
+        get_profile_cache().invalidate(*latest)
+        try:
+            pipe = self.event_bus.pipeline(transaction=False)
+            for user_id, row in latest.items():
+                pipe.publish('elo_updated', json.dumps({
+                    'user_id': user_id,
+                    'new_elo': row.elo_rating,
+                    'username': row.username,
+                    'avatar_url': None
+                }))
+                # Also notify Gateway directly so frontend knows to refresh stats
+                pipe.publish('game_updates', json.dumps({
+                    'event': 'profile_updated',
+                    'data': {
+                        'user_id': user_id,
+                        'new_elo': row.elo_rating,
+                        'games_played': row.games_played,
+                        'games_won': row.games_won
+                    },
+                    'room': user_id,
+                    'published_at': time.time(),
+                }))
+            pipe.execute()
+            logger.info(f"Published elo_updated/profile_updated for {len(latest)} users")
+        except Exception as e:
+            logger.error(f"Failed to publish profile updates: {e}")
+
+
+def init_outcome_processor(app):
+    event_bus = redis.from_url(app.config.get('EVENT_BUS_REDIS_URL', 'redis://localhost:6382/0'))
+    processor = OutcomeProcessor(event_bus)
+    app.extensions['outcome_processor'] = processor
+    return processor
+
+
+def get_outcome_processor():
+    return current_app.extensions['outcome_processor']
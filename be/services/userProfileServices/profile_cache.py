@@ -0,0 +1,148 @@
+"""
+Read-through cache of serialized profiles (``UserProfile.to_dict()``).
+
+Profiles are stored as JSON under ``profile:{user_id}`` in the service's own
+Redis (REDIS_URL) for PROFILE_CACHE_TTL_SECONDS, or in an in-process LRU
+with PROFILE_CACHE_BACKEND=memory. Anything that writes a profile calls
+``invalidate`` after committing; the TTL bounds how long a read that raced
+a write can serve the old copy.
+
+If Redis is unreachable, reads fall through to the database.
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import redis
+from flask import current_app
+
+from db.models.user_profile import UserProfile
+
+logger = logging.getLogger(__name__)
+
+KEY_PROFILE = "profile:{user_id}"
+
+
+def canonical_id(user_id):
+    try:
+        return str(uuid.UUID(str(user_id)))
+    except ValueError:
+        return None
+
+
+class RedisBackend:
+    def __init__(self, redis_url, ttl):
+        self.redis = redis.from_url(redis_url)
+        self.ttl = ttl
+
+    def get_many(self, user_ids):
+        values = self.redis.mget([KEY_PROFILE.format(user_id=u) for u in user_ids])
+        return {u: v for u, v in zip(user_ids, values) if v is not None}
+
+    def set_many(self, items):
+        pipe = self.redis.pipeline(transaction=False)
+        for user_id, value in items.items():
+            pipe.set(KEY_PROFILE.format(user_id=user_id), value, ex=self.ttl)
+        pipe.execute()
+
+    def delete(self, user_ids):
+        self.redis.delete(*[KEY_PROFILE.format(user_id=u) for u in user_ids])
+
+
+class MemoryBackend:
+    def __init__(self, ttl, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()  # user_id -> (value, expires at)
+        self.lock = threading.Lock()
+
+    def get_many(self, user_ids):
+        now = time.time()
+        found = {}
+        with self.lock:
+            for user_id in user_ids:
+                entry = self.entries.get(user_id)
+                if entry is None:
+                    continue
+                if entry[1] <= now:
+                    del self.entries[user_id]
+                    continue
+                self.entries.move_to_end(user_id)
+                found[user_id] = entry[0]
+        return found
+
+    def set_many(self, items):
+        expires = time.time() + self.ttl
+        with self.lock:
+            for user_id, value in items.items():
+                self.entries[user_id] = (value, expires)
+                self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, user_ids):
+        with self.lock:
+            for user_id in user_ids:
+                self.entries.pop(user_id, None)
+
+
+class ProfileCache:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get_profile(self, user_id):
+        """Profile dict for one user, or None if there is no profile."""
+        return next(iter(self.get_profiles([user_id]).values()), None)
+
+    def get_profiles(self, user_ids):
+        """
+        {user_id: profile dict} for the ids that have a profile: one MGET,
+        then one IN query for the misses. Ids are returned in canonical UUID
+        form; ones that are not UUIDs are skipped.
+        """
+        ids = list(dict.fromkeys(filter(None, map(canonical_id, user_ids))))
+        if not ids:
+            return {}
+        try:
+            cached = self.backend.get_many(ids)
+        except Exception as e:
+            logger.error(f"Profile cache read failed: {e}")
+            cached = {}
+        profiles = {user_id: json.loads(value) for user_id, value in cached.items()}
+
+        misses = [uuid.UUID(user_id) for user_id in ids if user_id not in profiles]
+        if misses:
+            loaded = {str(p.id): p.to_dict() for p in UserProfile.query.filter(UserProfile.id.in_(misses)).all()}
+            profiles.update(loaded)
+            if loaded:
+                try:
+                    self.backend.set_many({user_id: json.dumps(p) for user_id, p in loaded.items()})
+                except Exception as e:
+                    logger.error(f"Profile cache write failed: {e}")
+        return profiles
+
+    def invalidate(self, *user_ids):
+        if not user_ids:
+            return
+        try:
+            self.backend.delete([canonical_id(u) or str(u) for u in user_ids])
+        except Exception as e:
+            logger.error(f"Profile cache invalidation failed for {user_ids}: {e}")
+
+
+def init_profile_cache(app):
+    ttl = app.config.get('PROFILE_CACHE_TTL_SECONDS', 300)
+    if app.config.get('PROFILE_CACHE_BACKEND') == 'memory':
+        backend = MemoryBackend(ttl, max_size=app.config.get('PROFILE_CACHE_MAX_SIZE', 10000))
+    else:
+        backend = RedisBackend(app.config.get('REDIS_URL'), ttl)
+    cache = ProfileCache(backend)
+    app.extensions['profile_cache'] = cache
+    return cache
+
+
+def get_profile_cache():
+    return current_app.extensions['profile_cache']
@@ -1,12 +1,15 @@
 from flask import Blueprint, request, jsonify, current_app
-from extensions import db, supabase
+from extensions import db
+from shared_auth.token_verifier import get_token_verifier
+from profile_cache import get_profile_cache, canonical_id
+from outcome_processor import get_outcome_processor
 from db.models.user_profile import UserProfile
 from sqlalchemy import or_
 
 profile_bp = Blueprint('profile', __name__)
 
 def get_user_from_token():
-    """Helper to verify token and get user ID from Supabase."""
+    """Helper to verify the access token (locally, see shared_auth.token_verifier) and get the user."""
     # Try getting from cookie first (common in this project)
     token = request.cookies.get('access_token_cookie')
     # Or Authorization header
@@ -17,13 +20,8 @@ def get_user_from_token():
 
     if not token:
         return None
-    
-    try:
-        res = supabase.auth.get_user(token)
-        return res.user
-    except Exception as e:
-        current_app.logger.error(f"Token verification failed: {e}")
-        return None
+
+    return get_token_verifier().verify_user(token)
 
 @profile_bp.route('/me', methods=['GET'])
 def get_my_profile():
@@ -31,7 +29,7 @@ def get_my_profile():
     if not user:
         return jsonify({"message": "Unauthorized"}), 401
 
-    profile = UserProfile.query.filter_by(id=user.id).first()
+    profile = get_profile_cache().get_profile(user.id)
     
     if not profile:
         # Auto-create profile if checks fail but auth passes? 
@@ -39,7 +37,7 @@ def get_my_profile():
         # Typically better to return 404 if not found.
         return jsonify({"message": "Profile not found"}), 404
         
-    return jsonify(profile.to_dict()), 200
+    return jsonify(profile), 200
 
 @profile_bp.route('/me', methods=['PUT'])
 def update_my_profile():
@@ -65,6 +63,7 @@ def update_my_profile():
     
     try:
         db.session.commit()
+        get_profile_cache().invalidate(user.id)
         return jsonify(profile.to_dict()), 200
     except Exception as e:
         db.session.rollback()
@@ -72,10 +71,37 @@ def update_my_profile():
 
 @profile_bp.route('/<uuid:user_id>', methods=['GET'])
 def get_user_profile(user_id):
-    profile = UserProfile.query.filter_by(id=user_id).first()
+    profile = get_profile_cache().get_profile(user_id)
     if not profile:
         return jsonify({"message": "Profile not found"}), 404
-    return jsonify(profile.to_dict()), 200
+    return jsonify(profile), 200
+
+MAX_BATCH_PROFILES = 100
+
+@profile_bp.route('/batch', methods=['POST'])
+def get_profiles_batch():
+    """
+    Several profiles in one call (e.g. both players at game start).
+    Expects: { "user_ids": ["<uuid>", ...] }
+    Returns: { "profiles": [...], "not_found": [...] } in request order.
+    """
+    data = request.get_json(silent=True) or {}
+    user_ids = data.get('user_ids')
+    if not isinstance(user_ids, list) or not user_ids:
+        return jsonify({"message": "user_ids must be a non-empty list"}), 400
+    if len(user_ids) > MAX_BATCH_PROFILES:
+        return jsonify({"message": f"At most {MAX_BATCH_PROFILES} user_ids per request"}), 400
+
+    found = get_profile_cache().get_profiles(user_ids)
+    profiles = []
+    not_found = []
+    for user_id in user_ids:
+        profile = found.get(canonical_id(user_id))
+        if profile:
+            profiles.append(profile)
+        else:
+            not_found.append(user_id)
+    return jsonify({'profiles': profiles, 'not_found': not_found}), 200
 
 @profile_bp.route('/', methods=['GET'])
 def list_profiles():
@@ -206,66 +232,10 @@ def update_elo():
         return jsonify({"message": str(e)}), 500
 
 def process_game_outcome(user_id, elo_change, outcome):
-    import redis
-    import json
-    
-    profile = UserProfile.query.filter_by(id=user_id).first()
-    if not profile:
+    """Apply one player's outcome (see outcome_processor.py) and return the updated profile."""
+    processor = get_outcome_processor()
+    rows = processor.apply([(user_id, elo_change, outcome)])
+    if not rows:
         raise ValueError("Profile not found")
-
-    # Update stats
-    profile.elo_rating += elo_change
-    profile.games_played += 1
-    
-    if outcome == 'win':
-        profile.games_won += 1
-        profile.win_streak += 1
-        if profile.win_streak > profile.best_win_streak:
-            profile.best_win_streak = profile.win_streak
-    elif outcome == 'loss':
-        profile.games_lost += 1
-        profile.win_streak = 0
-    elif outcome == 'draw':
-        profile.games_drawn += 1
-        # Win streak might or might not reset on draw depending on rules. Let's keep it.
-    
-    try:
-        db.session.commit()
-        
-        # Publish event to Redis (Event Bus)
-        try:
-            redis_url = current_app.config.get('EVENT_BUS_REDIS_URL', 'redis://localhost:6382/0')
-            r = redis.from_url(redis_url)
-            event = {
-                'user_id': user_id,
-                'new_elo': profile.elo_rating,
-                'username': profile.username,
-                'avatar_url': profile.avatar_url if hasattr(profile, 'avatar_url') else None
-            }
-            r.publish('elo_updated', json.dumps(event))
-            current_app.logger.info(f"Published elo_updated for {user_id}")
-        except Exception as re:
-            current_app.logger.error(f"Failed to publish Redis event: {re}")
-
-        return profile
-    except Exception as e:
-        db.session.rollback()
-        raise e
-    finally:
-         # Also notify Gateway directly so frontend knows to refresh stats (Avoiding race condition)
-        try:
-            redis_url = current_app.config.get('EVENT_BUS_REDIS_URL', 'redis://localhost:6382/0')
-            r = redis.from_url(redis_url)
-            gateway_message = {
-                'event': 'profile_updated',
-                'data': {
-                    'user_id': user_id,
-                    'new_elo': profile.elo_rating,
-                    'games_played': profile.games_played,
-                    'games_won': profile.games_won
-                },
-                'room': str(user_id)
-            }
-            r.publish('game_updates', json.dumps(gateway_message))
-        except Exception as gw_e:
-            current_app.logger.error(f"Failed to publish to Gateway: {gw_e}")
+    processor.publish(rows)
+    return db.session.get(UserProfile, rows[0].id)
@@ -4,6 +4,7 @@ from sqlalchemy import create_engine, text
 from extensions import db
 from db.models.user_profile import UserProfile
 from routes import process_game_outcome
+from profile_cache import get_profile_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -106,6 +107,7 @@ class SyncManager:
             # We will leave streak as-is or reset if inconsistent. Leaving as-is for safety.
             
             db.session.commit()
+            get_profile_cache().invalidate(user_id)
         except Exception as e:
             db.session.rollback()
             logger.error(f"Failed to update profile for {user_id}: {e}")
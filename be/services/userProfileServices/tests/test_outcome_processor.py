@@ -0,0 +1,118 @@
+import json
+import uuid
+
+import fakeredis
+import pytest
+from flask import Flask
+
+from db.models.user_profile import UserProfile
+from extensions import db
+from outcome_processor import OutcomeProcessor, outcomes_from_payload
+from profile_cache import MemoryBackend, ProfileCache
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    app.extensions['profile_cache'] = ProfileCache(MemoryBackend(ttl=60))
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def bus():
+    return fakeredis.FakeRedis()
+
+
+def add_profile(username, **stats):
+    defaults = dict(elo_rating=1200, games_played=0, games_won=0, games_lost=0, games_drawn=0,
+                    win_streak=0, best_win_streak=0)
+    profile = UserProfile(uuid.uuid4(), username=username, email=f"{username}@example.com", **dict(defaults, **stats))
+    db.session.add(profile)
+    db.session.commit()
+    return str(profile.id)
+
+
+def game(p1, p2, p1_outcome, change=10):
+    opposite = {'win': 'loss', 'loss': 'win', 'draw': 'draw'}
+    change = 0 if p1_outcome == 'draw' else change
+    return {
+        'game_id': str(uuid.uuid4()),
+        'player1_id': p1, 'player1_elo_change': change if p1_outcome == 'win' else -change,
+        'player1_outcome': p1_outcome,
+        'player2_id': p2, 'player2_elo_change': -change if p1_outcome == 'win' else change,
+        'player2_outcome': opposite[p1_outcome],
+    }
+
+
+def stats(user_id):
+    db.session.expire_all()
+    p = db.session.get(UserProfile, uuid.UUID(user_id))
+    return (p.elo_rating, p.games_played, p.games_won, p.games_lost, p.games_drawn, p.win_streak, p.best_win_streak)
+
+
+def published(pubsub):
+    messages = []
+    # get_message returns None for the (ignored) subscribe confirmations too
+    for _ in range(20):
+        message = pubsub.get_message(timeout=0.01)
+        if message:
+            messages.append((message['channel'].decode(), json.loads(message['data'])))
+    return messages
+
+
+def test_batch_accumulates_per_player_and_tracks_streaks(app, bus):
+    a, b = add_profile('a', best_win_streak=1), add_profile('b', win_streak=3, best_win_streak=3)
+    failed = OutcomeProcessor(bus).process_games([
+        game(a, b, 'win'), game(a, b, 'win'), game(b, a, 'draw'),
+    ])
+    assert failed == []
+    assert stats(a) == (1220, 3, 2, 0, 1, 2, 2)
+    assert stats(b) == (1180, 3, 0, 2, 1, 0, 3)
+
+
+def test_publishes_final_numbers_once_per_player(app, bus):
+    a, b = add_profile('a'), add_profile('b')
+    pubsub = bus.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe('elo_updated', 'game_updates')
+
+    OutcomeProcessor(bus).process_games([game(a, b, 'win'), game(a, b, 'win', change=5)])
+    messages = published(pubsub)
+    elo = {m['user_id']: m['new_elo'] for channel, m in messages if channel == 'elo_updated'}
+    assert elo == {a: 1215, b: 1185}
+    updates = [m for channel, m in messages if channel == 'game_updates']
+    assert sorted(m['room'] for m in updates) == sorted([a, b])
+    assert all(m['event'] == 'profile_updated' for m in updates)
+
+
+def test_cached_profiles_are_invalidated(app, bus):
+    a, b = add_profile('a'), add_profile('b')
+    cache = app.extensions['profile_cache']
+    assert cache.get_profile(a)['games_played'] == 0
+    OutcomeProcessor(bus).process_games([game(a, b, 'loss')])
+    assert cache.get_profile(a)['games_played'] == 1
+
+
+def test_bad_game_only_fails_itself(app, bus):
+    a, b = add_profile('a'), add_profile('b')
+    bad = game(a, b, 'win')
+    del bad['player2_elo_change']
+    good = game(a, b, 'draw')
+
+    assert OutcomeProcessor(bus).process_games([bad, good]) == [bad]
+    assert stats(a)[1] == 1 and stats(b)[1] == 1
+
+
+def test_unknown_player_is_skipped(app, bus):
+    a = add_profile('a')
+    assert OutcomeProcessor(bus).process_games([game(a, str(uuid.uuid4()), 'win')]) == []
+    assert stats(a)[:3] == (1210, 1, 1)
+
+
+def test_outcomes_from_payload_skips_missing_players():
+    payload = game('p1', None, 'win')
+    assert outcomes_from_payload(payload) == [('p1', 10, 'win')]
@@ -0,0 +1,91 @@
+import json
+import uuid
+
+import fakeredis
+import pytest
+import redis
+from flask import Flask
+
+import profile_cache
+from db.models.user_profile import UserProfile
+from extensions import db
+from profile_cache import KEY_PROFILE, MemoryBackend, ProfileCache, RedisBackend, canonical_id
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    monkeypatch.setattr(redis, 'from_url', lambda *a, **kw: fakeredis.FakeRedis())
+    return RedisBackend('redis://unused', ttl=60)
+
+
+def add_profile(username, **stats):
+    profile = UserProfile(uuid.uuid4(), username=username, email=f"{username}@example.com", **stats)
+    db.session.add(profile)
+    db.session.commit()
+    return str(profile.id)
+
+
+def test_read_through_and_invalidate(app, backend):
+    cache = ProfileCache(backend)
+    user_id = add_profile('alice', elo_rating=1300)
+
+    assert cache.get_profile(user_id)['elo_rating'] == 1300
+    assert json.loads(backend.redis.get(KEY_PROFILE.format(user_id=user_id)))['username'] == 'alice'
+
+    # Served from the cache until invalidated
+    UserProfile.query.filter_by(username='alice').update({'elo_rating': 1400})
+    db.session.commit()
+    assert cache.get_profile(user_id)['elo_rating'] == 1300
+    cache.invalidate(user_id.upper())
+    assert cache.get_profile(user_id)['elo_rating'] == 1400
+
+
+def test_get_profiles_mixes_hits_misses_and_bad_ids(app, backend):
+    cache = ProfileCache(backend)
+    a, b = add_profile('a'), add_profile('b')
+    cache.get_profile(a)
+    missing = str(uuid.uuid4())
+
+    profiles = cache.get_profiles([a.upper(), b, missing, 'not-a-uuid', a])
+    assert set(profiles) == {a, b}
+    assert profiles[b]['username'] == 'b'
+    assert canonical_id('not-a-uuid') is None
+
+
+def test_unreachable_redis_falls_through_to_the_database(app):
+    class Down:
+        def get_many(self, user_ids):
+            raise redis.ConnectionError('down')
+        set_many = delete = get_many
+
+    cache = ProfileCache(Down())
+    user_id = add_profile('carol')
+    assert cache.get_profile(user_id)['username'] == 'carol'
+    cache.invalidate(user_id)  # Logged, not raised
+
+
+def test_memory_backend_lru_and_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(profile_cache.time, 'time', lambda: now[0])
+    backend = MemoryBackend(ttl=10, max_size=2)
+    backend.set_many({'a': '1', 'b': '2'})
+    assert backend.get_many(['a']) == {'a': '1'}  # a is now the most recent
+    backend.set_many({'c': '3'})
+    assert backend.get_many(['a', 'b', 'c']) == {'a': '1', 'c': '3'}
+
+    now[0] += 11
+    assert backend.get_many(['a', 'c']) == {}
+    backend.set_many({'d': '4'})
+    backend.delete(['d', 'missing'])
+    assert backend.get_many(['d']) == {}
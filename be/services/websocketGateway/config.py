@@ -6,8 +6,15 @@ load_dotenv()
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev_secret_key')
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'jwt_secret_key')
+    # Public keys for asymmetric tokens, loaded once at startup (see token_verifier.py)
+    JWKS_PATH = os.getenv('JWKS_PATH', '')
+    JWKS_JSON = os.getenv('JWKS_JSON', '')
+    JWT_AUDIENCE = os.getenv('JWT_AUDIENCE', '')
+    TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
     REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6382/0')
     PORT = int(os.getenv('PORT', 5005))
+    # Used to fetch full game state when a client asks for a resync
+    GAME_SERVICE_URL = os.getenv('GAME_SERVICE_URL', 'http://localhost:5002')
     
     # CORS
     FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:4028')
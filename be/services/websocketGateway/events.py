@@ -2,22 +2,40 @@ from flask import request, session
 from flask_socketio import emit, join_room, leave_room, disconnect
 import logging
 import redis
+import requests
 from config import Config
-from auth import validate_token
+from auth import validate_token, bare_token, verifier
+from token_verifier import token_hash
+from presence import Presence
 
 logger = logging.getLogger(__name__)
 
-# Initialize Redis client for tracking online users
+# Initialize Redis client (ready state)
 redis_client = redis.from_url(Config.REDIS_URL)
 
-def broadcast_online_count(socketio):
-    try:
-        count = redis_client.scard('online_users')
-        socketio.emit('online_users_update', {'count': count}, broadcast=True)
-    except Exception as e:
-        logger.error(f"Failed to broadcast online count: {e}")
+# Online users across sockets and gateway nodes (see presence.py)
+presence = Presence(Config.REDIS_URL)
+
+# Keep-alive session for resync fetches from the Game Service
+game_service = requests.Session()
+
+# sid -> (user_id, token hash, iat) for sockets on this node, so revoked
+# tokens can be kicked
+sockets = {}
 
 def register_events(socketio):
+    # The online count goes out on a fixed interval, not per connect/disconnect
+    presence.start(socketio)
+
+    def on_revoke(revoked):
+        for sid, (user_id, digest, iat) in list(sockets.items()):
+            if revoked(user_id, digest, iat):
+                logger.info(f"Disconnecting {user_id} ({sid}): token revoked")
+                socketio.server.disconnect(sid, namespace='/', ignore_queue=True)
+
+    verifier.on_revoke = on_revoke
+    verifier.listen(Config.REDIS_URL)
+
     @socketio.on('connect')
     def on_connect():
         token = request.args.get('token')
@@ -40,27 +58,29 @@ def register_events(socketio):
 
         # Store user_id in session for disconnect handler
         session['user_id'] = user_id
+        sockets[request.sid] = (user_id, token_hash(bare_token(token)), payload.get('iat'))
 
         # Join a room specific to this user for targeted messages
         join_room(user_id)
         
-        # Add to online users set
+        # Mark online (one more socket for this user)
         try:
-            redis_client.sadd('online_users', user_id)
-            broadcast_online_count(socketio)
+            presence.connect(user_id)
         except Exception as e:
             logger.error(f"Redis error on connect: {e}")
 
         logger.info(f"User connected: {user_id}")
         emit('connection_response', {'status': 'success', 'user_id': user_id})
+        # Current count for this client; everyone else gets the next interval's
+        emit('online_users_update', {'count': presence.online_count})
 
     @socketio.on('disconnect')
     def on_disconnect():
         user_id = session.get('user_id')
         if user_id:
+            sockets.pop(request.sid, None)
             try:
-                redis_client.srem('online_users', user_id)
-                broadcast_online_count(socketio)
+                presence.disconnect(user_id)
             except Exception as e:
                 logger.error(f"Redis error on disconnect: {e}")
             logger.info(f"User disconnected: {user_id}")
@@ -86,6 +106,29 @@ def register_events(socketio):
             logger.info(f"Client left game room: game_{game_id}")
             emit('left_game', {'game_id': game_id})
 
+    @socketio.on('request_resync')
+    def on_request_resync(data):
+        """
+        Client detected a gap in game_update move_seq and needs the full state.
+        data: { 'game_id': str, 'last_seq': int }
+        """
+        game_id = data.get('game_id')
+        if not game_id:
+            return
+
+        try:
+            resp = game_service.get(f"{Config.GAME_SERVICE_URL}/games/{game_id}", timeout=3)
+        except requests.RequestException as e:
+            logger.error(f"Resync fetch failed for game {game_id}: {e}")
+            return
+
+        if resp.status_code != 200:
+            logger.warning(f"Resync for game {game_id} failed with status {resp.status_code}")
+            return
+
+        logger.info(f"Resync sent for game {game_id} (client was at seq {data.get('last_seq')})")
+        emit('resync', resp.json())
+
     @socketio.on('player_ready')
     def on_player_ready(data):
         """
@@ -0,0 +1,174 @@
+"""
+Pub/Sub -> Socket.IO fan-out for events published by the other services.
+
+Every gateway node subscribes to the service channels itself, so each one
+only has to reach its own clients: events are emitted with
+``ignore_queue=True`` instead of going back out through the Socket.IO
+message queue (another Redis publish, then every node decoding it again).
+
+Messages are drained in batches. Within a batch, status-style events
+(``LATEST_ONLY_EVENTS``) keep only the newest message per room, since
+clients only ever show the latest value. Per-channel counters are kept for
+the /metrics endpoint; lag is measured from the ``published_at`` epoch
+timestamp publishers put in the message to the emit, so it includes Redis
+and batching delay (and any clock skew between hosts).
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import redis
+
+logger = logging.getLogger("WebSocketGateway.fanout")
+
+CHANNELS = ('game_updates', 'notifications', 'matchmaking_updates')
+BATCH_MAX = int(os.getenv('FANOUT_BATCH_MAX', 500))
+LOG_SAMPLE_EVERY = int(os.getenv('FANOUT_LOG_SAMPLE_EVERY', 100))
+# Only the newest of these per room within a batch is delivered
+LATEST_ONLY_EVENTS = {'online_users_update', 'queue_status'}
+
+
+class ChannelStats:
+    __slots__ = ('received', 'emitted', 'dropped', 'errors', 'untimed', 'lag_ms_total', 'lag_ms_max', 'last_batch')
+
+    def __init__(self):
+        self.received = 0
+        self.emitted = 0
+        self.dropped = 0  # Superseded within a batch (LATEST_ONLY_EVENTS)
+        self.errors = 0
+        self.untimed = 0  # Emitted without a published_at, not in the lag
+        self.lag_ms_total = 0.0
+        self.lag_ms_max = 0.0
+        self.last_batch = 0
+
+    def to_dict(self):
+        timed = self.emitted - self.untimed
+        return {
+            'received': self.received,
+            'emitted': self.emitted,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'untimed': self.untimed,
+            # Time from the publisher's published_at to the emit
+            'lag_ms_avg': round(self.lag_ms_total / timed, 3) if timed else None,
+            'lag_ms_max': round(self.lag_ms_max, 3),
+            'last_batch': self.last_batch,
+        }
+
+
+class PubSubFanout:
+    def __init__(self, redis_url, socketio, channels=CHANNELS):
+        self.redis_url = redis_url
+        self.socketio = socketio
+        self.channels = channels
+        self.stats = {channel: ChannelStats() for channel in channels}
+        self.started_at = time.time()
+        self.running = False
+        self._seen = 0
+
+    def start(self):
+        self.running = True
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+
+    def _run(self):
+        while self.running:
+            try:
+                pubsub = redis.from_url(self.redis_url).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(*self.channels)
+                logger.info(f"Connected to Redis at {self.redis_url} and subscribed to channels.")
+                while self.running:
+                    batch = self._drain(pubsub)
+                    if batch:
+                        self._deliver(batch)
+                        # Let socket greenlets run between batches
+                        self.socketio.sleep(0)
+            except Exception as e:
+                logger.error(f"Redis listener failed: {e}")
+                time.sleep(1)
+
+    def _drain(self, pubsub):
+        # Block (briefly) for the first message, then take whatever else is
+        # already buffered, up to BATCH_MAX.
+        message = pubsub.get_message(timeout=1.0)
+        if message is None:
+            return []
+        batch = [message]
+        while len(batch) < BATCH_MAX:
+            message = pubsub.get_message(timeout=0)
+            if message is None:
+                break
+            batch.append(message)
+        return batch
+
+    def _deliver(self, batch):
+        decoded = []
+        latest = {}
+        for message in batch:
+            channel = message['channel']
+            channel = channel.decode('utf-8') if isinstance(channel, bytes) else channel
+            stats = self.stats.setdefault(channel, ChannelStats())
+            stats.received += 1
+            try:
+                data = json.loads(message['data'])
+            except (TypeError, ValueError):
+                stats.errors += 1
+                logger.error("Failed to decode JSON from Redis message")
+                continue
+            if not isinstance(data, dict) or not data.get('event') or not data.get('data'):
+                continue
+
+            self._seen += 1
+            if logger.isEnabledFor(logging.DEBUG) and self._seen % LOG_SAMPLE_EVERY == 0:
+                logger.debug(f"Received Redis message on {channel} (1 in {LOG_SAMPLE_EVERY}): {data}")
+
+            if data['event'] in LATEST_ONLY_EVENTS:
+                key = (data['event'], data.get('room'))
+                if key in latest:
+                    stats.dropped += 1
+                    decoded[latest[key]] = None
+                latest[key] = len(decoded)
+            decoded.append((channel, data))
+
+        sizes = {}
+        for item in decoded:
+            if item is None:
+                continue
+            channel, data = item
+            stats = self.stats[channel]
+            try:
+                # Every gateway node receives the service channels itself, so
+                # deliver to this node's clients only.
+                if data.get('room'):
+                    self.socketio.emit(data['event'], data['data'], room=data['room'], ignore_queue=True)
+                else:
+                    # Broadcast to all if no room specified (Use with caution)
+                    self.socketio.emit(data['event'], data['data'], ignore_queue=True)
+            except Exception as e:
+                stats.errors += 1
+                logger.error(f"Error processing Redis message: {e}")
+                continue
+            stats.emitted += 1
+            published_at = data.get('published_at')
+            if isinstance(published_at, (int, float)):
+                lag_ms = max(time.time() - published_at, 0.0) * 1000
+                stats.lag_ms_total += lag_ms
+                stats.lag_ms_max = max(stats.lag_ms_max, lag_ms)
+            else:
+                stats.untimed += 1
+            sizes[channel] = sizes.get(channel, 0) + 1
+        for channel, size in sizes.items():
+            self.stats[channel].last_batch = size
+
+    def metrics(self):
+        uptime = max(time.time() - self.started_at, 1e-9)
+        return {
+            'uptime_seconds': round(uptime, 1),
+            'channels': {
+                channel: dict(stats.to_dict(), emitted_per_second=round(stats.emitted / uptime, 3))
+                for channel, stats in self.stats.items()
+            },
+        }
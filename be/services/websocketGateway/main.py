@@ -1,16 +1,14 @@
 from gevent import monkey
 monkey.patch_all()
 
-from flask import Flask
+from flask import Flask, jsonify
 from flask_socketio import SocketIO
 from flask_cors import CORS
-import redis
 import logging
-import threading
-import json
 import os
 from config import Config
 from events import register_events
+from fanout import PubSubFanout
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -30,52 +28,14 @@ socketio = SocketIO(app, cors_allowed_origins="*", async_mode='gevent', message_
 
 register_events(socketio)
 
-def redis_listener(redis_url, socketio_instance):
-    """
-    Listens to Redis Pub/Sub channels and broadcasts messages to SocketIO clients.
-    """
-    try:
-        r = redis.from_url(redis_url)
-        pubsub = r.pubsub()
-        
-        # Subscribe to relevant channels
-        # 'game_updates': General updates for games
-        # 'notifications': General user notifications
-        pubsub.subscribe('game_updates', 'notifications', 'matchmaking_updates')
-        
-        logger.info(f"Connected to Redis at {redis_url} and subscribed to channels.")
+# Fan events from the other services (Redis Pub/Sub) out to Socket.IO clients
+fanout = PubSubFanout(Config.REDIS_URL, socketio)
+fanout.start()
 
-        for message in pubsub.listen():
-            if message['type'] == 'message':
-                try:
-                    channel = message['channel'].decode('utf-8')
-                    data = json.loads(message['data'].decode('utf-8'))
-                    
-                    logger.info(f"Received Redis message on {channel}: {data}")
-
-                    # Determine target room
-                    # Expecting data format: {'event': 'event_name', 'data': {...}, 'room': 'target_room'}
-                    event_name = data.get('event')
-                    event_data = data.get('data')
-                    room = data.get('room')
-
-                    if event_name and event_data:
-                        if room:
-                            socketio_instance.emit(event_name, event_data, room=room)
-                        else:
-                            # Broadcast to all if no room specified (Use with caution)
-                             socketio_instance.emit(event_name, event_data)
-                except json.JSONDecodeError:
-                    logger.error("Failed to decode JSON from Redis message")
-                except Exception as e:
-                    logger.error(f"Error processing Redis message: {e}")
-    except Exception as e:
-        logger.error(f"Redis listener failed: {e}")
-
-# Start Redis listener in a background thread
-redis_thread = threading.Thread(target=redis_listener, args=(Config.REDIS_URL, socketio))
-redis_thread.daemon = True
-redis_thread.start()
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Per-channel throughput and lag of the Pub/Sub fan-out
+    return jsonify(fanout.metrics())
 
 if __name__ == '__main__':
     port = Config.PORT
@@ -0,0 +1,173 @@
+"""
+Presence: who is online, across sockets and gateway nodes.
+
+Users are spread over PRESENCE_BUCKETS buckets (crc32 of the user id). Each
+bucket has a sorted set ``presence:{bucket}`` of online users scored by when
+their presence expires, and a hash ``presence:refs:{bucket}`` counting their
+open sockets across all nodes. Connect/disconnect are Lua scripts, so a user
+with several tabs (or sockets on several nodes) only goes offline when the
+last one closes.
+
+Each node re-scores the users it has sockets for every HEARTBEAT_INTERVAL.
+If a node dies without disconnecting its sockets, its users simply stop being
+refreshed and drop out once their entry expires; whichever node sweeps next
+removes them.
+
+The online count is the number of unexpired entries over all buckets (one
+pipelined ZCOUNT per bucket). Every COUNT_BROADCAST_INTERVAL one node (the
+first to take ``presence:count:lock``) recounts and stores the result in
+``presence:count``; the others just read it. Each node sends the count to its
+own clients if it changed, instead of broadcasting on every connect and
+disconnect.
+"""
+import logging
+import os
+import threading
+import time
+import zlib
+
+import redis
+
+logger = logging.getLogger("WebSocketGateway.presence")
+
+PRESENCE_BUCKETS = int(os.getenv('PRESENCE_BUCKETS', 64))  # Same on every service that reads presence
+KEY_PRESENCE = "presence:{bucket}"
+KEY_REFS = "presence:refs:{bucket}"
+KEY_COUNT = "presence:count"
+KEY_COUNT_LOCK = "presence:count:lock"
+PRESENCE_TTL_SECONDS = int(os.getenv('PRESENCE_TTL_SECONDS', 30))
+HEARTBEAT_INTERVAL = int(os.getenv('PRESENCE_HEARTBEAT_INTERVAL', 10))
+COUNT_BROADCAST_INTERVAL = float(os.getenv('ONLINE_COUNT_BROADCAST_INTERVAL', 5))
+
+# Keys: presence zset, refs hash. Args: user_id, expires_at_ms.
+LUA_CONNECT = """
+redis.call('HINCRBY', KEYS[2], ARGV[1], 1)
+local current = tonumber(redis.call('ZSCORE', KEYS[1], ARGV[1]) or '0')
+if tonumber(ARGV[2]) > current then
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+end
+return 1
+"""
+
+# Keys: presence zset, refs hash. Args: user_id. Returns 1 if the user went
+# offline.
+LUA_DISCONNECT = """
+local refs = redis.call('HINCRBY', KEYS[2], ARGV[1], -1)
+if refs > 0 then return 0 end
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('ZREM', KEYS[1], ARGV[1])
+return 1
+"""
+
+# Keys: presence zset, refs hash. Args: now_ms. Drops expired users (and
+# their socket counts, which belonged to a node that is gone).
+LUA_SWEEP = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 500)
+for _, user_id in ipairs(expired) do
+    redis.call('ZREM', KEYS[1], user_id)
+    redis.call('HDEL', KEYS[2], user_id)
+end
+return #expired
+"""
+
+
+def bucket_of(user_id):
+    return zlib.crc32(str(user_id).encode()) % PRESENCE_BUCKETS
+
+
+def _keys(user_id):
+    bucket = bucket_of(user_id)
+    return [KEY_PRESENCE.format(bucket=bucket), KEY_REFS.format(bucket=bucket)]
+
+
+class Presence:
+    def __init__(self, redis_url):
+        self.redis = redis.from_url(redis_url)
+        self._connect = self.redis.register_script(LUA_CONNECT)
+        self._disconnect = self.redis.register_script(LUA_DISCONNECT)
+        self._sweep = self.redis.register_script(LUA_SWEEP)
+        self.local = {}  # user_id -> sockets open on this node
+        self.lock = threading.Lock()
+        self.online_count = 0
+        self.running = False
+
+    def connect(self, user_id):
+        with self.lock:
+            self.local[user_id] = self.local.get(user_id, 0) + 1
+        self._connect(keys=_keys(user_id), args=[user_id, self._expires_at()])
+
+    def disconnect(self, user_id):
+        with self.lock:
+            left = self.local.get(user_id, 0) - 1
+            if left > 0:
+                self.local[user_id] = left
+            else:
+                self.local.pop(user_id, None)
+        return bool(self._disconnect(keys=_keys(user_id), args=[user_id]))
+
+    def is_online(self, user_ids):
+        now_ms = int(time.time() * 1000)
+        pipe = self.redis.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.zscore(_keys(user_id)[0], user_id)
+        return {user_id: score is not None and score > now_ms
+                for user_id, score in zip(user_ids, pipe.execute())}
+
+    def count(self):
+        """Online users; recounted by one node per COUNT_BROADCAST_INTERVAL."""
+        interval_ms = int(COUNT_BROADCAST_INTERVAL * 1000)
+        if not self.redis.set(KEY_COUNT_LOCK, 1, nx=True, px=interval_ms):
+            cached = self.redis.get(KEY_COUNT)
+            if cached is not None:
+                return int(cached)
+        total = self._count_buckets()
+        self.redis.set(KEY_COUNT, total, px=3 * interval_ms)
+        return total
+
+    def _count_buckets(self):
+        now_ms = int(time.time() * 1000)
+        pipe = self.redis.pipeline(transaction=False)
+        for bucket in range(PRESENCE_BUCKETS):
+            pipe.zcount(KEY_PRESENCE.format(bucket=bucket), f"({now_ms}", "+inf")
+        return sum(pipe.execute())
+
+    def _expires_at(self):
+        return int((time.time() + PRESENCE_TTL_SECONDS) * 1000)
+
+    def heartbeat(self):
+        """Keep this node's users alive and sweep everyone else's expired ones."""
+        with self.lock:
+            users = list(self.local)
+        expires_at = self._expires_at()
+        pipe = self.redis.pipeline(transaction=False)
+        for user_id in users:
+            pipe.zadd(_keys(user_id)[0], {user_id: expires_at}, gt=True)
+        if users:
+            pipe.execute()
+        now_ms = int(time.time() * 1000)
+        pipe = self.redis.pipeline(transaction=False)
+        for bucket in range(PRESENCE_BUCKETS):
+            self._sweep(keys=[KEY_PRESENCE.format(bucket=bucket), KEY_REFS.format(bucket=bucket)], args=[now_ms], client=pipe)
+        pipe.execute()
+
+    def start(self, socketio):
+        self.running = True
+        thread = threading.Thread(target=self._run, args=(socketio,))
+        thread.daemon = True
+        thread.start()
+
+    def _run(self, socketio):
+        next_heartbeat = 0.0
+        while self.running:
+            try:
+                if time.time() >= next_heartbeat:
+                    self.heartbeat()
+                    next_heartbeat = time.time() + HEARTBEAT_INTERVAL
+                count = self.count()
+                if count != self.online_count:
+                    self.online_count = count
+                    # Every node sends to its own clients
+                    socketio.emit('online_users_update', {'count': count}, ignore_queue=True)
+            except Exception as e:
+                logger.error(f"Presence update failed: {e}")
+            time.sleep(COUNT_BROADCAST_INTERVAL)
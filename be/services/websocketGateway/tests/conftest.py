@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Modules import each other by top-level name (``from extensions import db``),
+# so run the tests with the service directory on the path, as the service is.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,98 @@
+import json
+
+import fakeredis
+import pytest
+
+import fanout
+from fanout import PubSubFanout
+
+
+class FakeSocketIO:
+    def __init__(self):
+        self.emitted = []
+
+    def emit(self, event, data, room=None, ignore_queue=False):
+        assert ignore_queue
+        self.emitted.append((event, data, room))
+
+
+@pytest.fixture
+def hub():
+    return PubSubFanout('redis://unused', FakeSocketIO())
+
+
+def message(channel, event, data, room=None, **extra):
+    payload = dict({'event': event, 'data': data}, **extra)
+    if room is not None:
+        payload['room'] = room
+    return {'type': 'message', 'channel': channel.encode(), 'data': json.dumps(payload)}
+
+
+def test_only_the_last_latest_only_event_per_room_is_emitted(hub):
+    hub._deliver([
+        message('matchmaking_updates', 'queue_status', {'position': 3}, 'u1'),
+        message('matchmaking_updates', 'queue_status', {'position': 5}, 'u2'),
+        message('matchmaking_updates', 'match_found', {'game_id': 'a'}, 'u1'),
+        message('matchmaking_updates', 'queue_status', {'position': 2}, 'u1'),
+        message('matchmaking_updates', 'queue_status', {'position': 1}, 'u1'),
+        message('notifications', 'online_users_update', {'count': 7}),
+        message('notifications', 'online_users_update', {'count': 8}),
+    ])
+
+    assert hub.socketio.emitted == [
+        ('queue_status', {'position': 5}, 'u2'),
+        ('match_found', {'game_id': 'a'}, 'u1'),
+        ('queue_status', {'position': 1}, 'u1'),
+        ('online_users_update', {'count': 8}, None),
+    ]
+    mm = hub.stats['matchmaking_updates']
+    assert (mm.received, mm.emitted, mm.dropped, mm.last_batch) == (5, 3, 2, 3)
+    assert hub.stats['notifications'].dropped == 1
+
+
+def test_other_events_are_not_coalesced(hub):
+    hub._deliver([message('game_updates', 'move_made', {'move_seq': n}, 'game_g') for n in (1, 2, 3)]
+                 + [message('game_updates', 'dashboard_update', {'n': n}, 'u1') for n in (1, 2)])
+
+    assert [data for _, data, _ in hub.socketio.emitted] == [
+        {'move_seq': 1}, {'move_seq': 2}, {'move_seq': 3}, {'n': 1}, {'n': 2}]
+    assert hub.stats['game_updates'].dropped == 0
+
+
+def test_bad_messages_are_counted_and_skipped(hub):
+    hub._deliver([
+        {'type': 'message', 'channel': b'game_updates', 'data': b'not json'},
+        message('game_updates', 'move_made', {}, 'game_g'),  # No data, not emitted
+        message('game_updates', 'move_made', {'move_seq': 1}, 'game_g'),
+    ])
+    stats = hub.stats['game_updates']
+    assert (stats.received, stats.errors, stats.emitted) == (3, 1, 1)
+
+
+def test_lag_is_measured_from_published_at(hub, monkeypatch):
+    monkeypatch.setattr(fanout.time, 'time', lambda: 1000.0)
+    hub._deliver([
+        message('game_updates', 'move_made', {'n': 1}, 'game_g', published_at=999.75),
+        message('game_updates', 'move_made', {'n': 2}, 'game_g', published_at=999.95),
+        message('game_updates', 'move_made', {'n': 3}, 'game_g'),  # Publisher without a timestamp
+    ])
+
+    stats = hub.stats['game_updates'].to_dict()
+    assert stats['emitted'] == 3 and stats['untimed'] == 1
+    assert stats['lag_ms_avg'] == pytest.approx(150.0)
+    assert stats['lag_ms_max'] == pytest.approx(250.0)
+
+
+def test_drain_takes_at_most_batch_max(hub, monkeypatch):
+    monkeypatch.setattr(fanout, 'BATCH_MAX', 10)
+    r = fakeredis.FakeRedis()
+    pubsub = r.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe('game_updates')
+    assert pubsub.get_message(timeout=0.1) is None  # The (ignored) subscribe reply
+    for n in range(13):
+        r.publish('game_updates', json.dumps({'event': 'move_made', 'data': {'n': n}}))
+
+    first = hub._drain(pubsub)
+    second = hub._drain(pubsub)
+    assert len(first) == 10 and len(second) == 3
+    assert [json.loads(m['data'])['data']['n'] for m in first + second] == list(range(13))
@@ -0,0 +1,89 @@
+import fakeredis
+import pytest
+
+import presence
+from presence import KEY_COUNT_LOCK, Presence
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(presence.time, 'time', clock.time)
+    return clock
+
+
+@pytest.fixture
+def nodes(monkeypatch, clock):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(presence.redis, 'from_url', lambda url: fakeredis.FakeRedis(server=server))
+    return Presence('redis://a'), Presence('redis://b')
+
+
+def recount(node):
+    node.redis.delete(KEY_COUNT_LOCK)  # As if the interval had passed
+    return node.count()
+
+
+def test_user_stays_online_until_the_last_socket_closes(nodes):
+    a, b = nodes
+    a.connect('u1')
+    a.connect('u1')
+    b.connect('u1')
+    assert a.is_online(['u1']) == {'u1': True}
+    assert recount(a) == 1
+
+    assert a.disconnect('u1') is False
+    assert a.disconnect('u1') is False
+    assert a.local == {} and b.local == {'u1': 1}
+    assert b.is_online(['u1']) == {'u1': True}
+
+    assert b.disconnect('u1') is True
+    assert a.is_online(['u1']) == {'u1': False}
+    assert recount(a) == 0
+    assert not a.redis.hget(presence._keys('u1')[1], 'u1')
+
+
+def test_users_of_a_dead_node_expire_and_are_swept(nodes, clock):
+    a, b = nodes
+    a.connect('gone')   # Node a dies without disconnecting
+    b.connect('alive')
+    clock.now += presence.PRESENCE_TTL_SECONDS / 2
+    b.heartbeat()
+    assert recount(b) == 2
+
+    clock.now += presence.PRESENCE_TTL_SECONDS / 2 + 1
+    assert b.is_online(['gone', 'alive']) == {'gone': False, 'alive': True}
+    assert recount(b) == 1  # Expired entries are not counted even before a sweep
+
+    b.heartbeat()
+    zset, refs = presence._keys('gone')
+    assert b.redis.zscore(zset, 'gone') is None
+    assert b.redis.hget(refs, 'gone') is None
+    # Reconnecting later starts from a clean socket count
+    b.connect('gone')
+    assert b.disconnect('gone') is True
+
+
+def test_one_node_recounts_per_interval_the_rest_read_it(nodes):
+    a, b = nodes
+    a.connect('u1')
+    assert a.count() == 1
+    b.connect('u2')
+    assert b.count() == 1  # Cached by a within the interval
+    assert recount(b) == 2
+    assert a.count() == 2
+
+
+def test_count_falls_back_to_buckets_without_a_cached_value(nodes):
+    a, _ = nodes
+    a.connect('u1')
+    a.redis.set(KEY_COUNT_LOCK, 1)
+    assert a.count() == 1
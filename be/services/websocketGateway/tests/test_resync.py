@@ -0,0 +1,75 @@
+import pytest
+import requests
+from flask import Flask
+from flask_socketio import SocketIO
+
+import events
+from config import Config
+
+STATE = {'status': 'active', 'move_seq': 7, 'board': [None] * 169, 'current_player_id': 'u2'}
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+class FakeGameService:
+    def __init__(self, response):
+        self.response = response
+        self.urls = []
+
+    def get(self, url, timeout=None):
+        self.urls.append(url)
+        if isinstance(self.response, Exception):
+            raise self.response
+        return self.response
+
+
+@pytest.fixture
+def connect(monkeypatch):
+    monkeypatch.setattr(events.presence, 'start', lambda socketio: None)
+    monkeypatch.setattr(events.presence, 'connect', lambda user_id: None)
+    monkeypatch.setattr(events.presence, 'disconnect', lambda user_id: None)
+    monkeypatch.setattr(events.verifier, 'listen', lambda redis_url: None)
+    monkeypatch.setattr(events, 'validate_token', lambda token: {'sub': 'u1', 'iat': 0})
+    app = Flask(__name__)
+    socketio = SocketIO(app, async_mode='threading')
+    events.register_events(socketio)
+
+    def connect(response):
+        game_service = FakeGameService(response)
+        monkeypatch.setattr(events, 'game_service', game_service)
+        client = socketio.test_client(app, query_string='token=t')
+        assert client.is_connected()
+        client.get_received()  # connection_response, online_users_update
+        return client, game_service
+
+    yield connect
+    events.sockets.clear()
+
+
+def test_resync_returns_the_full_state(connect):
+    client, game_service = connect(FakeResponse(200, STATE))
+    client.emit('request_resync', {'game_id': 'g1', 'last_seq': 4})
+
+    received = client.get_received()
+    assert [(m['name'], m['args']) for m in received] == [('resync', [STATE])]
+    assert game_service.urls == [f"{Config.GAME_SERVICE_URL}/games/g1"]
+
+
+@pytest.mark.parametrize('response', [FakeResponse(404), requests.ConnectionError('down')])
+def test_failed_resync_sends_nothing(connect, response):
+    client, _ = connect(response)
+    client.emit('request_resync', {'game_id': 'g1', 'last_seq': 4})
+    assert client.get_received() == []
+
+
+def test_resync_without_game_id_is_ignored(connect):
+    client, game_service = connect(FakeResponse(200, STATE))
+    client.emit('request_resync', {'last_seq': 4})
+    assert client.get_received() == [] and game_service.urls == []
@@ -0,0 +1,94 @@
+import time
+
+import jwt
+import pytest
+
+from token_verifier import TokenVerifier, token_hash
+
+SECRET = 'test-secret-that-is-at-least-32-bytes-long'
+
+
+def sign(claims, key=SECRET, algorithm='HS256', **kwargs):
+    return jwt.encode(claims, key, algorithm=algorithm, **kwargs)
+
+
+def claims(sub='u1', **extra):
+    now = int(time.time())
+    return dict({'sub': sub, 'iat': now - 10, 'exp': now + 60}, **extra)
+
+
+def test_valid_token_is_verified_once_then_cached():
+    verifier = TokenVerifier(secret=SECRET)
+    token = sign(claims())
+    calls = []
+    decode = verifier._decode
+    verifier._decode = lambda t: calls.append(t) or decode(t)
+
+    assert verifier.verify(token)['sub'] == 'u1'
+    assert verifier.verify(token)['sub'] == 'u1'
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize('token', [
+    sign(claims(), key='wrong-secret-that-is-also-32-bytes-long'),
+    sign(dict(claims(), exp=int(time.time()) - 5)),
+    jwt.encode(claims(), None, algorithm='none'),
+    # Right secret, but an algorithm the secret is not pinned to
+    sign(claims(), algorithm='HS512'),
+])
+def test_rejected_tokens(token):
+    assert TokenVerifier(secret=SECRET).verify(token) is None
+
+
+def test_audience_is_checked_when_configured():
+    verifier = TokenVerifier(secret=SECRET, audience='authenticated')
+    assert verifier.verify(sign(claims(aud='authenticated')))
+    assert verifier.verify(sign(claims(aud='other'))) is None
+
+
+def test_token_hash_revocation_kicks_only_that_token():
+    verifier = TokenVerifier(secret=SECRET)
+    token, other = sign(claims()), sign(claims(jti='2'))
+    verifier.verify(token)
+    kicked = []
+    verifier.on_revoke = kicked.append
+
+    verifier.revoke(token_hash=token_hash(token))
+
+    assert verifier.verify(token) is None
+    assert verifier.verify(other)
+    revoked = kicked[0]
+    assert revoked('u1', token_hash(token), 0)
+    assert not revoked('u1', token_hash(other), 0)
+
+
+def test_subject_revocation_only_covers_tokens_issued_before():
+    verifier = TokenVerifier(secret=SECRET)
+    now = int(time.time())
+    old, new = sign(claims(iat=now - 100)), sign(claims(iat=now - 10))
+    verifier.verify(old)
+    kicked = []
+    verifier.on_revoke = kicked.append
+
+    verifier.revoke(sub='u1', before=now - 50)
+
+    assert verifier.verify(old) is None
+    assert verifier.verify(new)
+    revoked = kicked[0]
+    assert revoked('u1', token_hash(old), now - 100)
+    assert not revoked('u1', token_hash(new), now - 10)
+    assert not revoked('u2', 'x', now - 100)
+
+
+def test_jwks_key_accepts_only_its_own_algorithm():
+    pytest.importorskip('cryptography')
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    import json
+
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private.public_key()))
+    jwk.update(kid='k1', alg='RS256')
+    verifier = TokenVerifier(secret=SECRET, jwks={'keys': [jwk]})
+
+    assert verifier.verify(sign(claims(), key=private, algorithm='RS256', headers={'kid': 'k1'}))
+    assert verifier.verify(sign(claims(), key=private, algorithm='RS512', headers={'kid': 'k1'})) is None
@@ -0,0 +1,173 @@
+"""
+Local JWT verification with a cache of verified claims.
+
+Signatures are checked against keys held in process: the HS256 secret
+(JWT_SECRET_KEY, Supabase's project JWT secret) and, for asymmetric tokens,
+a JWKS loaded once from JWKS_PATH or JWKS_JSON. Nothing is fetched over the
+network.
+
+Each key accepts exactly one algorithm, fixed by the key and never by the
+token header: HS256 for the secret, and for JWKS keys their ``alg`` (or the
+default for their ``kty``/``crv``). A token whose header names anything else
+is rejected.
+
+Verified claims are kept in an LRU keyed by the token's SHA-256 until the
+token's ``exp``, so a reconnect storm after a deploy verifies each token once.
+Revocations arrive on the ``auth_revocations`` Pub/Sub channel, either
+{"token_hash": ...} for one token or {"sub": ..., "before": <epoch>} for
+every token of a user issued before that time. Both drop matching cache
+entries and are remembered until those tokens would have expired anyway.
+``on_revoke`` is then called with a predicate over (sub, token hash, iat)
+so the gateway can disconnect exactly the sockets using revoked tokens.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+import redis
+
+logger = logging.getLogger("WebSocketGateway.token_verifier")
+
+REVOCATION_CHANNEL = 'auth_revocations'
+NO_EXP_TTL_SECONDS = 300  # Cache lifetime for tokens without exp
+REVOKED_SUBJECT_TTL_SECONDS = 86400  # Longest token lifetime we expect
+
+
+def token_hash(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenVerifier:
+    def __init__(self, secret=None, jwks=None, audience=None, cache_size=10000, leeway=0):
+        self.secret = secret
+        self.audience = audience
+        self.leeway = leeway
+        self.keys = {}  # kid -> (key, the one algorithm it accepts)
+        if jwks:
+            for key in jwt.PyJWKSet.from_dict(jwks).keys:
+                # algorithm_name is the JWK's alg, or the kty/crv default
+                if key.key_id:
+                    self.keys[key.key_id] = (key.key, key.algorithm_name)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # token hash -> (claims, cache until)
+        self.revoked_tokens = {}  # token hash -> forget after
+        self.revoked_subjects = {}  # sub -> (tokens issued before, forget after)
+        self.lock = threading.Lock()
+        self.on_revoke = None  # Called with revoked(sub, token_hash, iat) after each revocation
+
+    @classmethod
+    def from_config(cls, config):
+        jwks = None
+        if config.JWKS_JSON:
+            jwks = json.loads(config.JWKS_JSON)
+        elif config.JWKS_PATH:
+            with open(config.JWKS_PATH) as f:
+                jwks = json.load(f)
+        return cls(secret=config.JWT_SECRET_KEY, jwks=jwks, audience=config.JWT_AUDIENCE or None,
+                   cache_size=config.TOKEN_CACHE_SIZE)
+
+    def verify(self, token):
+        """Claims of a valid token, else None."""
+        digest = token_hash(token)
+        now = time.time()
+        with self.lock:
+            hit = self.cache.get(digest)
+            if hit is not None:
+                claims, until = hit
+                if until > now and not self._is_revoked(digest, claims, now):
+                    self.cache.move_to_end(digest)
+                    return claims
+                del self.cache[digest]
+
+        claims = self._decode(token)
+        if claims is None:
+            return None
+        with self.lock:
+            if self._is_revoked(digest, claims, now):
+                return None
+            self.cache[digest] = (claims, claims.get('exp') or now + NO_EXP_TTL_SECONDS)
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return claims
+
+    def _decode(self, token):
+        try:
+            header = jwt.get_unverified_header(token)
+            alg = header.get('alg')
+            kid = header.get('kid')
+            if kid and kid in self.keys:
+                key, allowed = self.keys[kid]
+            elif self.secret:
+                key, allowed = self.secret, 'HS256'
+            else:
+                logger.warning(f"No local key for token (alg={alg}, kid={kid})")
+                return None
+            if alg != allowed:
+                logger.warning(f"Token alg {alg} does not match its key ({allowed}, kid={kid})")
+                return None
+            return jwt.decode(
+                token, key, algorithms=[allowed], audience=self.audience, leeway=self.leeway,
+                options={'verify_aud': self.audience is not None},
+            )
+        except jwt.ExpiredSignatureError:
+            logger.warning("Token expired")
+        except jwt.InvalidTokenError as e:
+            logger.warning(f"Invalid token: {str(e)}")
+        except Exception as e:
+            logger.error(f"Token validation error: {str(e)}")
+        return None
+
+    def _is_revoked(self, digest, claims, now):
+        if digest in self.revoked_tokens:
+            return True
+        revoked = self.revoked_subjects.get(claims.get('sub'))
+        return revoked is not None and claims.get('iat', 0) < revoked[0]
+
+    def revoke(self, token_hash=None, sub=None, before=None):
+        now = time.time()
+        before = before or now
+        with self.lock:
+            if token_hash:
+                self.revoked_tokens[token_hash] = now + REVOKED_SUBJECT_TTL_SECONDS
+                self.cache.pop(token_hash, None)
+            if sub:
+                self.revoked_subjects[sub] = (before, now + REVOKED_SUBJECT_TTL_SECONDS)
+                for digest in [d for d, (claims, _) in self.cache.items() if claims.get('sub') == sub]:
+                    if self._is_revoked(digest, self.cache[digest][0], now):
+                        del self.cache[digest]
+            # Forget revocations whose tokens have all expired by now
+            for digest in [d for d, until in self.revoked_tokens.items() if until < now]:
+                del self.revoked_tokens[digest]
+            for subject in [s for s, (_, until) in self.revoked_subjects.items() if until < now]:
+                del self.revoked_subjects[subject]
+        if self.on_revoke and (token_hash or sub):
+            def revoked(socket_sub, socket_token_hash, iat):
+                if token_hash and socket_token_hash == token_hash:
+                    return True
+                return bool(sub) and socket_sub == sub and (iat or 0) < before
+            self.on_revoke(revoked)
+
+    def listen(self, redis_url):
+        """Apply revocations published on REVOCATION_CHANNEL (background thread)."""
+        thread = threading.Thread(target=self._listen, args=(redis_url,))
+        thread.daemon = True
+        thread.start()
+
+    def _listen(self, redis_url):
+        while True:
+            try:
+                pubsub = redis.from_url(redis_url).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(REVOCATION_CHANNEL)
+                for message in pubsub.listen():
+                    try:
+                        data = json.loads(message['data'])
+                        self.revoke(token_hash=data.get('token_hash'), sub=data.get('sub'), before=data.get('before'))
+                    except Exception as e:
+                        logger.error(f"Bad revocation message: {e}")
+            except Exception as e:
+                logger.error(f"Revocation listener failed: {e}")
+                time.sleep(1)
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate, useParams } from 'react-router-dom';
 import { useAuth } from '../../contexts/AuthContext';
 import gameService from '../../utils/gameService';
@@ -30,6 +30,9 @@ const ActiveGameBoard = () => {
   const [winningCells, setWinningCells] = useState([]);
   const [gameResult, setGameResult] = useState(null);
   const [moveHistory, setMoveHistory] = useState([]);
+  // Last move_seq applied; game_update deltas must arrive in order
+  const lastSeqRef = useRef(0);
+  const amIPlayer1Ref = useRef(false);
 
   // Player State
   const [isMyTurn, setIsMyTurn] = useState(false); // Validated by backend
@@ -86,12 +89,14 @@ const ActiveGameBoard = () => {
               const game = res.data;
               // Determine my role
               const amIPlayer1 = game.player1_id === user.id;
+              amIPlayer1Ref.current = amIPlayer1;
               const mySym = amIPlayer1 ? 'X' : 'O';
               setMySymbol(mySym);
               
               // Board State
               if (game.board) {
                   setGameState(game.board);
+                  lastSeqRef.current = game.move_seq || 0;
                   // Determine turn
                   const currentTurn = game.current_player_id === user.id;
                   setIsMyTurn(currentTurn);
@@ -160,38 +165,67 @@ const ActiveGameBoard = () => {
       // Real-time updates via Socket
       socketService.joinGame(gameId);
 
-      const onGameUpdate = (data) => {
-          console.log("Game Update:", data);
-          if (data.board) {
-             setGameState(data.board);
+      // game_update carries only what a move changed (position, symbol,
+      // move_seq, clocks, next player, and status once the game ends).
+      const onGameUpdate = (delta) => {
+          if (delta.move_seq <= lastSeqRef.current) {
+              return; // Already applied (e.g. our own move via the HTTP response)
           }
-           // Update turn info
-          const currentTurn = data.current_player_id === user.id;
-          setIsMyTurn(currentTurn);
-          setCurrentPlayer(data.current_player_id === data.player1_id ? 'X' : 'O');
-          
-          // Sync Timer
-          if (data.p1_time !== undefined && data.p2_time !== undefined) {
-               const amIP1 = data.player1_id === user.id;
-               setPlayerTimes({
-                   me: amIP1 ? data.p1_time : data.p2_time,
-                   opponent: amIP1 ? data.p2_time : data.p1_time
-               });
-          } else {
-               // Fallback / legacy support
-               // Default to 30 or whatever settings say if missing
+          if (delta.move_seq > lastSeqRef.current + 1) {
+              // Missed at least one move: ask the gateway for the full state
+              socketService.emit('request_resync', { game_id: gameId, last_seq: lastSeqRef.current });
+              return;
           }
-          
+          lastSeqRef.current = delta.move_seq;
+
+          setGameState(prev => {
+              const next = [...prev];
+              next[delta.position] = delta.symbol;
+              return next;
+          });
+          setMoveHistory(prev => [...prev, "Move"]);
+
+          // Update turn info
+          setIsMyTurn(delta.current_player_id === user.id);
+          setCurrentPlayer(delta.symbol === 'X' ? 'O' : 'X');
+
+          // Sync Timer
+          const amIP1 = amIPlayer1Ref.current;
+          setPlayerTimes({
+              me: amIP1 ? delta.p1_time : delta.p2_time,
+              opponent: amIP1 ? delta.p2_time : delta.p1_time
+          });
+
           // Redundant Game End Check
-          if (data.status === 'completed') {
+          if (delta.status && delta.status !== 'active') {
              console.log("Game completed detected via update");
-             // Force call onGameOver logic if status changed drastically
              if (gameStatus !== 'completed') {
-                 onGameOver(data); 
+                 onGameOver(delta);
              }
           }
       };
 
+      // Full state, sent by the gateway after we reported a move_seq gap
+      const onResync = (state) => {
+          lastSeqRef.current = state.move_seq || 0;
+          if (state.board) {
+              setGameState(state.board);
+              setMoveHistory(Array(state.board.filter(c => c !== null).length).fill("Move"));
+          }
+          setIsMyTurn(state.current_player_id === user.id);
+          setCurrentPlayer(state.current_player_id === state.player1_id ? 'X' : 'O');
+          if (state.p1_time !== undefined && state.p2_time !== undefined) {
+               const amIP1 = state.player1_id === user.id;
+               setPlayerTimes({
+                   me: amIP1 ? state.p1_time : state.p2_time,
+                   opponent: amIP1 ? state.p2_time : state.p1_time
+               });
+          }
+          if (state.status && state.status !== 'active') {
+              onGameOver(state);
+          }
+      };
+
       const onGameOver = (data) => {
           console.log("Game Over:", data);
           setGameStatus(data.status); // completed or abandoned
@@ -213,11 +247,13 @@ const ActiveGameBoard = () => {
 
       socketService.on('game_update', onGameUpdate);
       socketService.on('game_over', onGameOver);
+      socketService.on('resync', onResync);
       
       return () => {
           socketService.leaveGame(gameId);
           socketService.off('game_update', onGameUpdate);
           socketService.off('game_over', onGameOver);
+          socketService.off('resync', onResync);
       };
   }, [gameId, user.id, isConnected]); // Add isConnected dependency to retry join if connection happens late
 
@@ -301,6 +337,7 @@ const ActiveGameBoard = () => {
         // Apply backend state
         const updatedState = res.data;
         setGameState(updatedState.board);
+        lastSeqRef.current = Math.max(lastSeqRef.current, updatedState.move_seq || 0);
         
         // Check game over
         if (updatedState.status === 'completed') {
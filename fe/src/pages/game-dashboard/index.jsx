@@ -75,7 +75,14 @@ const GameDashboard = () => {
       // Fetch Active Games
       const activeRes = await gameService.getActiveGames(user.id);
       if (activeRes.success) {
-        let formattedActive = activeRes.data.map(game => {
+        // Live state (whose turn, last move) of every active game in one request
+        const liveRes = activeRes.data.length
+          ? await gameService.getGames(activeRes.data.map(game => game.id))
+          : null;
+        const live = liveRes?.success ? liveRes.data.games : {};
+        let formattedActive = activeRes.data.map(row => {
+             const state = live[row.id];
+             const game = state ? { ...row, ...state, id: row.id } : row;
              // Basic formatting first
              const isPlayer1 = game.player1_id === user.id;
              // Determine opponent ID locally if needed for fetchOpponentProfiles
@@ -88,7 +95,8 @@ const GameDashboard = () => {
                 elo: 1000
               },
               status: game.current_player_id === user.id ? "your-turn" : "opponent-turn",
-              lastMove: new Date(game.updated_at || game.started_at),
+              // Live state times are epoch seconds, rows are ISO strings
+              lastMove: state?.updated_at ? new Date(state.updated_at * 1000) : new Date(game.started_at),
               eloStakes: 15
             };
         });
@@ -14,16 +14,16 @@ const GameHistory = () => {
     const [games, setGames] = useState([]);
     const [loading, setLoading] = useState(true);
     const [hasMore, setHasMore] = useState(true);
-    const [offset, setOffset] = useState(0);
+    const [cursor, setCursor] = useState(null);
     const LIMIT = 10;
 
     const fetchHistory = async (isLoadMore = false) => {
         if (!user) return;
         try {
             setLoading(true);
-            const currentOffset = isLoadMore ? offset : 0;
-            
-            const response = await gameService.getRecentGames(user.id, LIMIT, currentOffset);
+            const before = isLoadMore ? cursor : null;
+
+            const response = await gameService.getRecentGames(user.id, LIMIT, before);
             
             if (response.success) {
                 const newGames = await Promise.all(response.data.map(async (game) => {
@@ -55,12 +55,9 @@ const GameHistory = () => {
                     };
                 }));
 
-                if (newGames.length < LIMIT) {
-                    setHasMore(false);
-                }
-
+                setHasMore(Boolean(response.nextCursor));
+                setCursor(response.nextCursor);
                 setGames(prev => isLoadMore ? [...prev, ...newGames] : newGames);
-                setOffset(prev => prev + LIMIT);
             }
         } catch (error) {
             console.error("Failed to fetch history", error);
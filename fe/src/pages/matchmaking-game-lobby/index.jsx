@@ -139,6 +139,14 @@ const MatchmakingGameLobbyPage = () => {
         }
     };
 
+    const onQueueStatus = (data) => {
+      // data: { game_speed, position, queue_size, waited_seconds, estimated_wait_seconds }
+      // Pushed by the matcher while we wait (at most once a second)
+      if (data && typeof data.estimated_wait_seconds === 'number') {
+        setEstimatedWaitTime(Math.max(1, data.waited_seconds + data.estimated_wait_seconds));
+      }
+    };
+
     const onOnlineUsersUpdate = (data) => {
       if (data && typeof data.count === 'number') {
         setOnlineUsersCount(data.count);
@@ -147,12 +155,14 @@ const MatchmakingGameLobbyPage = () => {
 
     socketService.on('match_found', onMatchFound);
     socketService.on('online_users_update', onOnlineUsersUpdate);
+    socketService.on('queue_status', onQueueStatus);
     socketService.on('player_ready_update', onPlayerReadyUpdate);
     socketService.on('game_start_countdown', onGameStartCountdown);
 
     return () => {
       socketService.off('match_found', onMatchFound);
       socketService.off('online_users_update', onOnlineUsersUpdate);
+      socketService.off('queue_status', onQueueStatus);
       socketService.off('player_ready_update', onPlayerReadyUpdate);
       socketService.off('game_start_countdown', onGameStartCountdown);
     };
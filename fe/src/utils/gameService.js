@@ -31,10 +31,13 @@ const gameService = {
     }
   },
 
-  getRecentGames: async (userId, limit = 5, offset = 0) => {
+  // Pass the previous page's nextCursor as `before` to page through history
+  // Pass the previous page's nextCursor as `before` to get the next page
+  getRecentGames: async (userId, limit = 5, before = null) => {
     try {
-      const response = await gameClient.get(`/recent/${userId}?limit=${limit}&offset=${offset}`);
-      return { success: true, data: response.data };
+      const params = before ? { limit, before } : { limit };
+      const response = await gameClient.get(`/recent/${userId}`, { params });
+      return { success: true, data: response.data, nextCursor: response.headers['x-next-cursor'] || null };
     } catch (error) {
       console.error('getRecentGames error:', error);
       return { success: false, error: 'Failed to fetch recent games' };
@@ -51,6 +54,17 @@ const gameService = {
     }
   },
 
+  // State for many games in one request (max 200 ids)
+  getGames: async (gameIds) => {
+    try {
+      const response = await gameClient.post('/batch', { game_ids: gameIds });
+      return { success: true, data: response.data };
+    } catch (error) {
+      console.error('getGames error:', error);
+      return { success: false, error: 'Failed to fetch games' };
+    }
+  },
+
   makeMove: async (gameId, cellIndex, userId) => {
     try {
       const response = await gameClient.post(`/${gameId}/move`, { user_id: userId, position: cellIndex });